@@ -0,0 +1,245 @@
+"""
+Admission control - per-endpoint concurrency gates and per-client rate limits
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException, Request
+
+from app.core.config import settings
+from app.core.metrics import ADMISSION_DECISIONS, ADMISSION_IN_FLIGHT, ADMISSION_QUEUED
+
+MAX_RETRY_AFTER_SECONDS = 60
+
+
+class AdmissionRejectedError(RuntimeError):
+    """Raised when a request is shed instead of waiting for an LLM-backed slot"""
+
+    def __init__(self, message: str, reason: str, retry_after: int):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def client_id(request: Request) -> str:
+    """Identity per-client limits are keyed on: the peer address (or first forwarded hop if trusted)"""
+    if settings.ADMISSION_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def too_many_requests(error: AdmissionRejectedError) -> HTTPException:
+    """429 response for a shed request"""
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+class ClientRateLimiter:
+    """
+    Per-client token buckets: `rate_per_minute` sustained with bursts of `burst`
+
+    Buckets of the least recently seen clients are dropped past
+    `max_clients`; a dropped client simply starts again with a full bucket.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, max_clients: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(max(1, burst))
+        self.max_clients = max_clients
+        # client -> [tokens, last refill]
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.limited = 0
+
+    def acquire(self, client: str) -> None:
+        """Take one token for the client; raises AdmissionRejectedError when the bucket is empty"""
+        if self.rate <= 0:
+            return
+
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = [self.capacity, now]
+            self._buckets[client] = bucket
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] < 1:
+            self.limited += 1
+            retry_after = min(MAX_RETRY_AFTER_SECONDS, math.ceil((1 - bucket[0]) / self.rate))
+            raise AdmissionRejectedError(
+                f"Rate limit exceeded for client {client}", "rate_limited", max(1, retry_after)
+            )
+        bucket[0] -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "rate_per_minute": round(self.rate * 60, 2),
+            "burst": int(self.capacity),
+            "clients": len(self._buckets),
+            "limited": self.limited
+        }
+
+
+class AdmissionGate:
+    """
+    Concurrency limit with a bounded wait queue for one LLM-backed endpoint
+
+    Up to `max_concurrent` requests hold a slot at once; up to `max_queue`
+    more wait for one, each for at most `queue_timeout` seconds. Anything
+    beyond that is rejected at once, so latency and pending coroutines stay
+    bounded under bursts. Rejections carry a Retry-After estimated from the
+    average time a slot is held. Every request admitted or queued also
+    spends a token of the caller's per-client bucket so one client cannot
+    take all the slots; a request shed for a full queue does not.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float,
+                 client_limiter: Optional[ClientRateLimiter] = None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.client_limiter = client_limiter
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        self.in_flight = 0
+        self.queued = 0
+        self._hold_seconds_avg = 1.0
+        self._counts: Dict[str, int] = {}
+
+    def _count(self, outcome: str) -> None:
+        self._counts[outcome] = self._counts.get(outcome, 0) + 1
+        ADMISSION_DECISIONS.labels(self.name, outcome).inc()
+
+    def _retry_after(self) -> int:
+        # Time for the queue ahead to drain through the slots
+        waves = (self.queued + 1) / max(1, self.max_concurrent)
+        return max(1, min(MAX_RETRY_AFTER_SECONDS, math.ceil(waves * self._hold_seconds_avg)))
+
+    def _reject(self, reason: str, message: str) -> AdmissionRejectedError:
+        self._count(reason)
+        return AdmissionRejectedError(message, reason, self._retry_after())
+
+    @asynccontextmanager
+    async def admit(self, client: str) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block; raises AdmissionRejectedError when shed"""
+        if not settings.ADMISSION_ENABLED or self.max_concurrent <= 0:
+            yield
+            return
+
+        if self._semaphore.locked() and self.queued >= self.max_queue:
+            raise self._reject("queue_full", f"Too many {self.name} requests in progress")
+
+        # Only requests that get a slot or a place in the queue spend a token
+        if self.client_limiter is not None:
+            try:
+                self.client_limiter.acquire(client)
+            except AdmissionRejectedError:
+                self._count("rate_limited")
+                raise
+
+        if self._semaphore.locked():
+            self.queued += 1
+            ADMISSION_QUEUED.labels(self.name).set(self.queued)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._reject("queue_timeout", f"Timed out waiting for a {self.name} slot")
+            finally:
+                self.queued -= 1
+                ADMISSION_QUEUED.labels(self.name).set(self.queued)
+            self._count("queued")
+        else:
+            await self._semaphore.acquire()
+            self._count("admitted")
+
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.labels(self.name).set(self.in_flight)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._hold_seconds_avg = 0.8 * self._hold_seconds_avg + 0.2 * (time.monotonic() - start)
+            self.in_flight -= 1
+            ADMISSION_IN_FLIGHT.labels(self.name).set(self.in_flight)
+            self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "hold_seconds_avg": round(self._hold_seconds_avg, 4),
+            "decisions": dict(self._counts)
+        }
+
+
+# Singleton instances (one bucket per client, shared by every gate)
+client_rate_limiter = ClientRateLimiter(
+    settings.ADMISSION_CLIENT_RATE_PER_MINUTE, settings.ADMISSION_CLIENT_BURST, settings.ADMISSION_MAX_CLIENTS
+)
+hts_gate = AdmissionGate(
+    "hts", settings.ADMISSION_HTS_CONCURRENCY, settings.ADMISSION_HTS_QUEUE,
+    settings.ADMISSION_QUEUE_TIMEOUT_SECONDS, client_rate_limiter
+)
+ai_search_gate = AdmissionGate(
+    "ai_search", settings.ADMISSION_SEARCH_CONCURRENCY, settings.ADMISSION_SEARCH_QUEUE,
+    settings.ADMISSION_QUEUE_TIMEOUT_SECONDS, client_rate_limiter
+)
+
+
+_bulk_counts: Dict[str, int] = {}
+
+
+def admit_bulk_job(client: str, active_jobs: int) -> None:
+    """
+    Admit a bulk HTS job: one token of the client's bucket and a free job slot
+
+    Jobs run in the background on their own bounded worker pools, so what
+    needs limiting is how many run at once rather than how many requests
+    are in flight. Raises AdmissionRejectedError when shed.
+    """
+    if not settings.ADMISSION_ENABLED:
+        return
+
+    outcome = "admitted"
+    try:
+        if 0 < settings.ADMISSION_BULK_MAX_JOBS <= active_jobs:
+            raise AdmissionRejectedError(
+                f"{active_jobs} bulk HTS jobs already running",
+                "queue_full", settings.ADMISSION_BULK_RETRY_AFTER_SECONDS
+            )
+        client_rate_limiter.acquire(client)
+    except AdmissionRejectedError as e:
+        outcome = e.reason
+        raise
+    finally:
+        _bulk_counts[outcome] = _bulk_counts.get(outcome, 0) + 1
+        ADMISSION_DECISIONS.labels("hts_bulk", outcome).inc()
+
+
+def get_admission_stats() -> Dict[str, Any]:
+    return {
+        "enabled": settings.ADMISSION_ENABLED,
+        "gates": {gate.name: gate.get_stats() for gate in (hts_gate, ai_search_gate)},
+        "bulk_jobs": {
+            "max_jobs": settings.ADMISSION_BULK_MAX_JOBS,
+            "decisions": dict(_bulk_counts)
+        },
+        "clients": client_rate_limiter.get_stats()
+    }
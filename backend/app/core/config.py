@@ -2,7 +2,7 @@
 Configuration settings for APP
 """
 
-from typing import List
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -15,6 +15,106 @@ class Settings(BaseSettings):
 
     # OPENAI API Config
     OPENAI_API_KEY: str = ""
+    OPENAI_BASE_URL: Optional[str] = None  # Point at a local stand-in for tests
+    OPENAI_TIMEOUT_SECONDS: float = 60.0
+    OPENAI_MAX_RETRIES: int = 0  # Retries are handled by the resilience layer below
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    OPENAI_MAX_CONCURRENCY: int = 16  # Concurrent in-flight LLM calls per process
+
+    # Server Config
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    WORKERS: int = 1  # >1 enables the pre-fork multi-worker mode
+    PREFORK_MEMORY_REPORT_SECONDS: int = 60  # 0 disables per-worker memory reports
+
+    # LLM resilience: per-route latency budgets, retries and circuit breaker
+    LLM_HTS_BUDGET_SECONDS: float = 20.0
+    LLM_SEARCH_BUDGET_SECONDS: float = 6.0
+    LLM_HTS_BATCH_BUDGET_SECONDS: float = 60.0  # One batched prompt covers several products
+    # HTS model tiers, cheapest first; a weaker tier escalates below this top confidence
+    HTS_MODEL_TIERS: List[str] = ["gpt-4o-mini", "gpt-4o"]
+    HTS_ESCALATION_CONFIDENCE: float = 0.7
+    LLM_MAX_ATTEMPTS: int = 3
+    LLM_RETRY_BASE_DELAY_SECONDS: float = 0.25
+    LLM_RETRY_MAX_DELAY_SECONDS: float = 2.0
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_BREAKER_RESET_SECONDS: float = 30.0
+    # Hedged requests: duplicate a non-streamed call still running at this percentile of recent latency
+    LLM_HEDGING_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_MAX_RATE: float = 0.05  # Fraction of recent calls that may be hedged
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # Latencies needed per operation and model before hedging
+    LLM_HEDGE_WINDOW: int = 200  # Recent latencies and hedge decisions kept
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 0.1
+
+    # LLM usage budgets per process (0 = unlimited); optional calls are dropped past the degrade ratio
+    LLM_REQUESTS_PER_MINUTE: int = 0
+    LLM_TOKENS_PER_MINUTE: int = 0
+    LLM_BUDGET_DEGRADE_RATIO: float = 0.8
+    LLM_USAGE_RECENT_CALLS: int = 500  # Individual calls kept for the usage endpoint
+
+    # Admission control for LLM-backed endpoints (per process; 0 disables a limit)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_HTS_CONCURRENCY: int = 16  # HTS classifications calling the model at once
+    ADMISSION_HTS_QUEUE: int = 32  # Further requests allowed to wait for a slot
+    ADMISSION_SEARCH_CONCURRENCY: int = 16
+    ADMISSION_SEARCH_QUEUE: int = 32
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 5.0  # Longest wait for a slot before shedding
+    ADMISSION_BULK_MAX_JOBS: int = 4  # Bulk HTS jobs running at once
+    ADMISSION_BULK_RETRY_AFTER_SECONDS: int = 30
+    ADMISSION_CLIENT_RATE_PER_MINUTE: float = 120.0  # Per-client LLM-backed requests (token bucket)
+    ADMISSION_CLIENT_BURST: int = 20
+    ADMISSION_MAX_CLIENTS: int = 10000  # Client buckets kept (least recently seen dropped)
+    ADMISSION_TRUST_FORWARDED_FOR: bool = False  # Key clients on X-Forwarded-For behind a trusted proxy
+
+    # AI search (retrieve-then-rerank)
+    AI_SEARCH_CANDIDATES: int = 30  # Products retrieved locally before LLM reranking
+    AI_SEARCH_PROMPT_TOKEN_BUDGET: int = 2500  # Max tokens of candidate summaries per prompt
+    AI_SEARCH_FANOUT_CONCURRENCY: int = 8  # Catalog chunks ranked in parallel in fan-out mode
+    AI_SEARCH_FANOUT_MAX_CHUNKS: int = 16  # Products past this many chunks are left to local ranking
+    AI_SEARCH_FANOUT_FINAL_TOP_K: int = 5  # Best ids per chunk re-ranked together by a final call (0 disables)
+    PROGRESSIVE_SEARCH_TTL_SECONDS: float = 120.0  # Background AI rankings kept for polling this long
+    PROGRESSIVE_SEARCH_MAX_PENDING: int = 500
+    PROGRESSIVE_SEARCH_MAX_WAIT_SECONDS: float = 20.0  # Longest a single long-poll may block
+
+    # Precomputed "similar products" neighbours
+    SIMILARITY_TOP_K: int = 10  # Neighbours kept per product (the endpoint's maximum limit)
+    SIMILARITY_ATTRIBUTE_WEIGHT: float = 0.6  # Share of attribute overlap in the score; the rest is text
+    SIMILARITY_BLOCK_SIZE: int = 512  # Rows per block of the pairwise similarity computation
+
+    # Semantic cache of AI search rankings
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_SIZE: int = 2000  # Queries remembered (least recently used evicted)
+    SEMANTIC_CACHE_THRESHOLD: float = 0.85  # Minimum cosine similarity to reuse a ranking
+
+    # HTS suggestion cache
+    HTS_CACHE_ENABLED: bool = True
+    HTS_CACHE_FILE: str = "app/data/hts_cache.sqlite3"
+    HTS_INDEX_FILE: str = "app/data/hts_index.sqlite3"  # HTS code/prefix -> product reverse index
+
+    # Rule-based HTS classification (the LLM is consulted only below the threshold)
+    HTS_RULES_ENABLED: bool = True
+    HTS_RULES_CONFIDENCE_THRESHOLD: float = 0.9
+
+    # Bulk HTS jobs
+    HTS_JOBS_FILE: str = "app/data/hts_jobs.sqlite3"
+    HTS_BULK_CONCURRENCY: int = 8  # Concurrent classifications per job
+    HTS_BULK_MAX_PRODUCTS: int = 10000
+    HTS_VALIDATE_MAX_CODES: int = 10000  # Codes per batch validation request
+    HTS_BATCH_SIZE: int = 8  # Products packed into one prompt (1 disables batching)
+    HTS_BATCH_MAX_TOKENS_PER_PRODUCT: int = 400  # Completion tokens reserved per product
+
+    # Observability
+    METRICS_ENABLED: bool = True
+
+    # Search analytics
+    ANALYTICS_BUFFER_SIZE: int = 10000  # Recent searches kept in memory
+    ANALYTICS_TOP_K_CAPACITY: int = 200  # Keys tracked by the heavy-hitters sketch
+    ANALYTICS_TREND_WINDOW_SECONDS: int = 3600
+    ANALYTICS_SNAPSHOT_FILE: Optional[str] = None  # e.g. "app/data/search_analytics.json"
+    ANALYTICS_SNAPSHOT_INTERVAL_SECONDS: int = 300
 
     # CORS Config
     CORS_ORIGINS: List[str] = [
@@ -27,6 +127,9 @@ class Settings(BaseSettings):
     # Data file paths
     DATA_DIR: str = "app/data"
     PRODUCTS_FILE: str = "ductile_iron_fittings.json"
+    HTS_SCHEDULE_FILE: str = "hts_schedule.json"  # USITC JSON or CSV export (excerpt bundled)
+    HTS_SCHEDULE_COMPLETE: bool = False  # The file lists every code (full export): unlisted codes are rejected
+    HTS_RULES_FILE: str = "hts_rules.json"
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,347 @@
+"""
+In-process metrics - counters, gauges and histograms rendered as Prometheus text
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, tuned for a mix of local search (~ms) and LLM calls (~s)
+DEFAULT_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+# Payload size buckets in bytes
+DEFAULT_SIZE_BUCKETS = (
+    128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304
+)
+
+
+class _CounterValue:
+    """Monotonic counter for one label set"""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeValue:
+    """Gauge for one label set"""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramValue:
+    """Fixed-bucket histogram for one label set"""
+
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        # One slot per bucket plus the +Inf overflow slot; counts are per bucket,
+        # made cumulative only when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        # Uncontended on the event loop thread; only guards the rare threadpool caller
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> "_Timer":
+        """Context manager observing the elapsed wall time in seconds"""
+        return _Timer(self)
+
+
+class _Timer:
+    """Observe elapsed time into a histogram on exit"""
+
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: _HistogramValue):
+        self._histogram = histogram
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class MetricFamily:
+    """A named metric with a fixed set of label names"""
+
+    def __init__(self, name: str, help_text: str, metric_type: str,
+                 labelnames: Sequence[str] = (), buckets: Optional[Sequence[float]] = None):
+        self.name = name
+        self.help_text = help_text
+        self.metric_type = metric_type
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if buckets else DEFAULT_LATENCY_BUCKETS
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        if self.metric_type == "counter":
+            return _CounterValue()
+        if self.metric_type == "gauge":
+            return _GaugeValue()
+        return _HistogramValue(self.buckets)
+
+    def labels(self, *values: str):
+        """Get (or create) the child for a label set"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], object]]:
+        """Snapshot of (label values, child) pairs"""
+        return list(self._children.items())
+
+    def render(self) -> List[str]:
+        """Render this family in the Prometheus text exposition format"""
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        for label_values, child in self.samples():
+            pairs = list(zip(self.labelnames, label_values))
+            if self.metric_type == "histogram":
+                cumulative = 0
+                for bound, bucket_count in zip(child.buckets, child.counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(bound))])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', '+Inf')])} {child.count}")
+                lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(child.sum)}")
+                lines.append(f"{self.name}_count{_format_labels(pairs)} {child.count}")
+            else:
+                lines.append(f"{self.name}{_format_labels(pairs)} {_format_value(child.value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Registry of metric families for this process"""
+
+    def __init__(self):
+        self._families: Dict[str, MetricFamily] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name: str, help_text: str, metric_type: str,
+                  labelnames: Sequence[str], buckets: Optional[Sequence[float]] = None) -> MetricFamily:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = MetricFamily(name, help_text, metric_type, labelnames, buckets)
+                self._families[name] = family
+            return family
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._register(name, help_text, "counter", labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._register(name, help_text, "gauge", labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Optional[Sequence[float]] = None) -> MetricFamily:
+        return self._register(name, help_text, "histogram", labelnames, buckets)
+
+    def render(self) -> str:
+        """Render every family as Prometheus text"""
+        lines: List[str] = []
+        for family in list(self._families.values()):
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+# Singleton registry
+metrics = MetricsRegistry()
+
+# HTTP metrics
+HTTP_REQUESTS = metrics.counter(
+    "http_requests_total", "Total HTTP requests", ("method", "route", "status")
+)
+HTTP_REQUEST_DURATION = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = metrics.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("method",)
+)
+HTTP_REQUEST_SIZE = metrics.histogram(
+    "http_request_size_bytes", "HTTP request body size", ("method", "route"), DEFAULT_SIZE_BUCKETS
+)
+HTTP_RESPONSE_SIZE = metrics.histogram(
+    "http_response_size_bytes", "HTTP response body size", ("method", "route"), DEFAULT_SIZE_BUCKETS
+)
+
+# Search metrics
+SEARCH_PHASE_DURATION = metrics.histogram(
+    "search_phase_duration_seconds", "Local search time by phase (filter, score, sort, serialize)", ("phase",)
+)
+
+SEARCH_QUERY_CACHE = metrics.counter(
+    "search_query_cache_lookups_total", "AI search semantic cache lookups by outcome (exact, semantic, miss)",
+    ("outcome",)
+)
+
+SEARCH_PROGRESSIVE = metrics.counter(
+    "search_progressive_total", "Progressive AI search rankings by event (started, ready, pending, recovered, evicted)",
+    ("event",)
+)
+
+# Admission control metrics
+ADMISSION_DECISIONS = metrics.counter(
+    "admission_decisions_total",
+    "LLM-backed requests by admission outcome (admitted, queued, queue_full, queue_timeout, rate_limited)",
+    ("gate", "outcome")
+)
+ADMISSION_IN_FLIGHT = metrics.gauge(
+    "admission_in_flight", "Requests holding an admission slot", ("gate",)
+)
+ADMISSION_QUEUED = metrics.gauge(
+    "admission_queued", "Requests waiting for an admission slot", ("gate",)
+)
+
+# LLM metrics
+LLM_SINGLEFLIGHT_CALLS = metrics.counter(
+    "llm_singleflight_calls_total", "LLM calls by coalescing role (leader executes, follower shares)",
+    ("operation", "role")
+)
+
+LLM_RETRIES = metrics.counter(
+    "llm_retries_total", "LLM call attempts retried after a retryable error", ("operation",)
+)
+LLM_SHORT_CIRCUITED = metrics.counter(
+    "llm_short_circuited_total", "LLM calls rejected by an open circuit breaker", ("operation",)
+)
+LLM_HEDGES = metrics.counter(
+    "llm_hedges_total", "Hedged LLM requests by outcome (fired, won, lost, capped)", ("hedger", "outcome")
+)
+LLM_CIRCUIT_STATE = metrics.gauge(
+    "llm_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ("breaker",)
+)
+LLM_CALLS = metrics.counter(
+    "llm_calls_total", "LLM calls by operation, model and outcome (ok, parse_error, error, shed, fallback)",
+    ("operation", "model", "outcome")
+)
+LLM_TOKENS = metrics.counter(
+    "llm_tokens_total", "LLM tokens used by operation, model and kind (prompt, completion)",
+    ("operation", "model", "kind")
+)
+LLM_CALL_DURATION = metrics.histogram(
+    "llm_call_duration_seconds", "LLM call latency including retries", ("operation", "model")
+)
+LLM_BUDGET_USAGE = metrics.gauge(
+    "llm_budget_usage", "Requests and tokens admitted in the current one-minute budget window", ("kind",)
+)
+LLM_TIER_DURATION = metrics.histogram(
+    "llm_tier_duration_seconds", "LLM call latency per routing tier", ("router", "model")
+)
+LLM_TIER_TOKENS = metrics.counter(
+    "llm_tier_tokens_total", "LLM tokens used per routing tier", ("router", "model", "kind")
+)
+LLM_ESCALATIONS = metrics.counter(
+    "llm_escalations_total", "Answers escalated to the next model tier by reason", ("router", "model", "reason")
+)
+HTS_BATCH_ITEMS = metrics.counter(
+    "hts_batch_items_total", "Products in batched HTS prompts by outcome (batched, escalated, fallback)", ("outcome",)
+)
+HTS_SUGGESTIONS_CHECKED = metrics.counter(
+    "hts_suggestions_checked_total", "LLM-suggested HTS codes checked against the schedule by outcome",
+    ("outcome",)
+)
+HTS_RULE_DECISIONS = metrics.counter(
+    "hts_rule_decisions_total", "HTS classifications answered by rules or escalated to the LLM",
+    ("outcome",)
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status, in-flight and payload sizes"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        state = {"status": 500, "request_bytes": 0, "response_bytes": 0}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["request_bytes"] += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["response_bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+
+            # Label by route template (not raw path) to keep cardinality bounded
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or "unmatched"
+            status = str(state["status"])
+
+            HTTP_REQUESTS.labels(method, route_label, status).inc()
+            HTTP_REQUEST_DURATION.labels(method, route_label, status).observe(elapsed)
+            HTTP_REQUEST_SIZE.labels(method, route_label).observe(state["request_bytes"])
+            HTTP_RESPONSE_SIZE.labels(method, route_label).observe(state["response_bytes"])
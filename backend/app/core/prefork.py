@@ -0,0 +1,168 @@
+"""
+Pre-fork multi-worker server
+
+Loads and indexes the catalog once in the parent, freezes those objects out of
+the garbage collector so the workers' copies of the pages stay shared, then
+forks N uvicorn workers that accept on one inherited listening socket.
+"""
+
+import gc
+import os
+import signal
+import socket
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+
+def get_process_memory(pid: Optional[int] = None) -> Dict[str, int]:
+    """
+    Read RSS, PSS and USS (unique set size) in KiB for a process from /proc
+
+    USS is the memory that would be freed if the process exited, so for
+    forked workers it is the per-worker cost on top of the shared parent pages.
+    """
+    pid = pid or os.getpid()
+    rollup = Path(f"/proc/{pid}/smaps_rollup")
+    if not rollup.exists():
+        return {}
+
+    fields = {}
+    with open(rollup, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+
+    return {
+        "pid": pid,
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "uss_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
+
+
+def preload_catalog() -> None:
+    """Load and index everything workers would otherwise build lazily per process"""
+    from app.services.hts_rules_service import hts_rules_service
+    from app.services.hts_schedule_service import hts_schedule_service
+    from app.services.product_service import product_service
+    from app.services.search_service import search_service
+    from app.services.similarity_service import similarity_service
+    product_service.preload()
+    search_service.build_index()
+    similarity_service.build_index()
+    hts_schedule_service.preload()
+    hts_rules_service.preload(product_service.get_all_products())
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, host: str, port: int) -> None:
+    """Worker process body: serve on the inherited socket, never return"""
+    import uvicorn
+
+    # Restore default handlers; uvicorn installs its own graceful-shutdown handlers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    config = uvicorn.Config(app, host=host, port=port, log_level="info")
+    server = uvicorn.Server(config)
+    exit_code = 0
+    try:
+        server.run(sockets=[sock])
+    except Exception as e:
+        print(f"Worker {os.getpid()} crashed: {e}")
+        exit_code = 1
+    finally:
+        os._exit(exit_code)
+
+
+def _report_memory(workers: Dict[int, int]) -> None:
+    parent = get_process_memory()
+    if not parent:
+        return
+    print(f"[prefork] parent pid={parent['pid']} rss={parent['rss_kb']}KiB uss={parent['uss_kb']}KiB")
+    for pid, index in sorted(workers.items(), key=lambda item: item[1]):
+        usage = get_process_memory(pid)
+        if usage:
+            print(
+                f"[prefork] worker {index} pid={pid} rss={usage['rss_kb']}KiB "
+                f"pss={usage['pss_kb']}KiB uss={usage['uss_kb']}KiB shared={usage['shared_kb']}KiB"
+            )
+
+
+def serve_prefork(app, host: str, port: int, workers: int) -> None:
+    """Preload the catalog, fork `workers` uvicorn processes and supervise them"""
+    if not hasattr(os, "fork"):
+        raise RuntimeError("Pre-fork serving requires a platform with os.fork()")
+
+    start_time = time.time()
+    preload_catalog()
+    print(f"[prefork] catalog preloaded in {int((time.time() - start_time) * 1000)}ms")
+
+    # Move everything allocated so far into the permanent generation so the
+    # collector never touches (and copies) those pages in the workers
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind_socket(host, port)
+    children: Dict[int, int] = {}
+    shutting_down = False
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(app, sock, host, port)
+        children[pid] = index
+
+    for index in range(workers):
+        spawn(index)
+    print(f"[prefork] serving on {host}:{port} with {workers} workers")
+
+    def handle_shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    signal.signal(signal.SIGINT, handle_shutdown)
+
+    report_interval = settings.PREFORK_MEMORY_REPORT_SECONDS
+    next_report = time.time() + min(report_interval, 5)
+
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+
+        if pid:
+            index = children.pop(pid, None)
+            if not shutting_down and index is not None:
+                print(f"[prefork] worker {index} (pid {pid}) exited with status {status}, restarting")
+                spawn(index)
+            continue
+
+        if report_interval > 0 and time.time() >= next_report and not shutting_down:
+            _report_memory(children)
+            next_report = time.time() + report_interval
+
+        time.sleep(0.2)
+
+    sock.close()
+    print("[prefork] all workers stopped")
@@ -0,0 +1,290 @@
+"""
+Resilience utilities - latency budgets, jittered retries, circuit breaking and hedging
+"""
+
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, Type
+
+# Breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+
+class DeadlineExceededError(asyncio.TimeoutError):
+    """Raised when the latency budget is spent before a call succeeds"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds. It then lets a single probe through
+    (half-open); the probe's outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, state_gauge=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        # Optional gauge family labelled (name) exporting the numeric state
+        self.state_gauge = state_gauge
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.total_successes = 0
+        self.total_failures = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self._export_state()
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        self._export_state()
+
+    def _export_state(self) -> None:
+        if self.state_gauge is not None:
+            self.state_gauge.labels(self.name).set(STATE_VALUES[self.state])
+
+    def allow_request(self) -> bool:
+        """Whether a call may proceed right now"""
+        if self.state == CLOSED:
+            return True
+
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self.total_successes += 1
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+            self._set_state(OPEN)
+            self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe slot whose outcome says nothing about health"""
+        self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == OPEN and self.opened_at is not None:
+            retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 2)
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "total_successes": self.total_successes,
+            "total_failures": self.total_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "probe_in_seconds": retry_in
+        }
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Full-jitter exponential backoff for the given (1-based) attempt"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+
+async def call_with_resilience(
+    func: Callable[[float], Awaitable[Any]],
+    *,
+    breaker: CircuitBreaker,
+    budget_seconds: float,
+    max_attempts: int,
+    base_delay: float,
+    max_delay: float,
+    retryable: Tuple[Type[BaseException], ...],
+    on_retry: Optional[Callable[[int, BaseException], None]] = None,
+    report_success: bool = True
+) -> Any:
+    """
+    Call func(timeout) under a total latency budget
+
+    Each attempt gets the remaining budget as its deadline. Retryable errors
+    are retried with jittered backoff while budget remains; every provider
+    failure is reported to the breaker, and an open breaker fails fast with
+    CircuitOpenError. With `report_success` off (a stream still to be read)
+    the caller reports the result's outcome to the breaker once it is known.
+    """
+    deadline = time.monotonic() + budget_seconds
+    attempt = 0
+
+    while True:
+        attempt += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError(f"Latency budget of {budget_seconds}s exhausted")
+
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit '{breaker.name}' is open")
+
+        try:
+            result = await asyncio.wait_for(func(remaining), timeout=remaining)
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            raise
+        except retryable as e:
+            breaker.record_failure()
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if attempt >= max_attempts or time.monotonic() + delay >= deadline:
+                raise
+            if on_retry is not None:
+                on_retry(attempt, e)
+            await asyncio.sleep(delay)
+            continue
+        except Exception:
+            # Non-retryable (bad request, auth): the provider answered, so the
+            # circuit stays as it is
+            breaker.release_probe()
+            raise
+
+        if report_success:
+            breaker.record_success()
+        return result
+
+
+class Hedger:
+    """
+    Hedged requests: duplicate a call that is slower than usual
+
+    Recent latencies are kept per key (e.g. operation and model). Once a key
+    has `min_samples` of them, a call still running at the `percentile`
+    latency gets a duplicate; whichever finishes first successfully wins and
+    the other is cancelled. If one copy fails the other is still awaited.
+    At most `max_rate` of the last `window` calls may be hedged, so a
+    provider that is slow across the board is not sent double the load.
+    """
+
+    def __init__(self, name: str, percentile: float, max_rate: float, min_samples: int,
+                 window: int, min_delay: float = 0.0, counter=None):
+        self.name = name
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        # Optional counter family labelled (name, outcome): fired, won, lost, capped
+        self.counter = counter
+        self._window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._decisions: Deque[bool] = deque(maxlen=window)
+        self._hedged_in_window = 0
+        self._counts = {"calls": 0, "fired": 0, "won": 0, "lost": 0, "capped": 0}
+
+    def _count(self, outcome: str) -> None:
+        self._counts[outcome] += 1
+        if self.counter is not None:
+            self.counter.labels(self.name, outcome).inc()
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """Seconds after which a call for `key` is hedged, or None without enough history"""
+        latencies = self._latencies.get(key)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, math.ceil(self.percentile / 100 * len(ordered)) - 1)
+        return max(self.min_delay, ordered[index])
+
+    def _decide(self, hedged: bool) -> None:
+        if len(self._decisions) == self._decisions.maxlen and self._decisions[0]:
+            self._hedged_in_window -= 1
+        self._decisions.append(hedged)
+        self._hedged_in_window += hedged
+
+    def _record_latency(self, key: str, seconds: float) -> None:
+        latencies = self._latencies.get(key)
+        if latencies is None:
+            latencies = self._latencies[key] = deque(maxlen=self._window)
+        latencies.append(seconds)
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]], allow: bool = True) -> Any:
+        """Await call(), hedging it with a second call(); `allow` False disables the hedge"""
+        self._counts["calls"] += 1
+        delay = self.hedge_delay(key) if allow else None
+        start = time.perf_counter()
+        if delay is None:
+            result = await call()
+            self._record_latency(key, time.perf_counter() - start)
+            return result
+
+        primary = asyncio.ensure_future(call())
+        pending = {primary}
+        hedge = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                if self._hedged_in_window < self.max_rate * (len(self._decisions) + 1):
+                    hedge = asyncio.ensure_future(call())
+                    pending.add(hedge)
+                    self._decide(True)
+                    self._count("fired")
+                else:
+                    self._decide(False)
+                    self._count("capped")
+            else:
+                self._decide(False)
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        # Keep the primary's error if both copies fail
+                        if error is None or task is primary:
+                            error = task.exception()
+                        continue
+                    if hedge is not None:
+                        self._count("won" if task is hedge else "lost")
+                    self._record_latency(key, time.perf_counter() - start)
+                    return task.result()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        fired = self._counts["fired"]
+        return {
+            "percentile": self.percentile,
+            "max_rate": self.max_rate,
+            **self._counts,
+            "hedge_rate": round(fired / self._counts["calls"], 4) if self._counts["calls"] else 0.0,
+            "win_rate": round(self._counts["won"] / fired, 4) if fired else 0.0,
+            "hedge_after_seconds": {
+                key: round(delay, 4)
+                for key, delay in ((key, self.hedge_delay(key)) for key in sorted(self._latencies))
+                if delay is not None
+            }
+        }
@@ -0,0 +1,130 @@
+"""
+Tiered model routing - try the cheapest model first and escalate on weak answers
+"""
+
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from app.core.metrics import LLM_ESCALATIONS, LLM_TIER_DURATION, LLM_TIER_TOKENS
+
+LOW_CONFIDENCE = "low_confidence"
+
+
+class ModelRouter:
+    """
+    Route a request through an ordered list of model tiers
+
+    Each tier is called in turn until one gives an accepted answer. A tier
+    escalates when its answer fails `accept` (reason "low_confidence") or
+    its call raises one of the `escalate_on` errors (reason taken from the
+    mapping, e.g. "parse_error"). Other errors propagate unchanged, since a
+    larger model on the same provider would not fare better. If every tier
+    escalates, the last answer that did arrive is returned anyway.
+
+    Per-tier calls, latency, tokens and escalations are kept for tuning the
+    latency/accuracy trade-off.
+    """
+
+    def __init__(self, name: str, tiers: Sequence[str], escalate_on: Dict[Type[BaseException], str]):
+        if not tiers:
+            raise ValueError("A model router needs at least one tier")
+        self.name = name
+        self.tiers = list(tiers)
+        self.escalate_on = escalate_on
+        self._stats = {
+            model: {
+                "calls": 0,
+                "accepted": 0,
+                "escalated": {},
+                "errors": 0,
+                "latency_seconds_total": 0.0,
+                "latency_seconds_max": 0.0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+            }
+            for model in self.tiers
+        }
+        self.requests = 0
+
+    def _escalation_reason(self, error: BaseException) -> Optional[str]:
+        for error_type, reason in self.escalate_on.items():
+            if isinstance(error, error_type):
+                return reason
+        return None
+
+    def record_call(self, model: str, elapsed: float, usage: Any) -> None:
+        stats = self._stats[model]
+        stats["calls"] += 1
+        stats["latency_seconds_total"] += elapsed
+        stats["latency_seconds_max"] = max(stats["latency_seconds_max"], elapsed)
+        LLM_TIER_DURATION.labels(self.name, model).observe(elapsed)
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            LLM_TIER_TOKENS.labels(self.name, model, "prompt").inc(prompt_tokens)
+            LLM_TIER_TOKENS.labels(self.name, model, "completion").inc(completion_tokens)
+
+    def record_escalation(self, model: str, reason: str) -> None:
+        escalated = self._stats[model]["escalated"]
+        escalated[reason] = escalated.get(reason, 0) + 1
+        LLM_ESCALATIONS.labels(self.name, model, reason).inc()
+
+    async def run(self, call: Callable[[str], Awaitable[Tuple[Any, Any]]],
+                  accept: Callable[[Any], bool], first_tier: int = 0,
+                  max_tiers: Optional[int] = None) -> Tuple[Any, str]:
+        """
+        Run `call(model)` (returning (answer, usage)) tier by tier
+
+        At most `max_tiers` tiers are tried from `first_tier` on. Returns
+        (answer, model) of the accepted answer; raises the last error if no
+        tier produced an answer at all.
+        """
+        self.requests += 1
+        tiers = (self.tiers[first_tier:] or self.tiers[-1:])[:max_tiers]
+        last_answer: Optional[Tuple[Any, str]] = None
+        last_error: Optional[BaseException] = None
+
+        for position, model in enumerate(tiers):
+            is_last = position == len(tiers) - 1
+            start = time.perf_counter()
+            try:
+                answer, usage = await call(model)
+            except Exception as e:
+                self.record_call(model, time.perf_counter() - start, getattr(e, "usage", None))
+                reason = self._escalation_reason(e)
+                if reason is None:
+                    self._stats[model]["errors"] += 1
+                    raise
+                last_error = e
+                if not is_last:
+                    self.record_escalation(model, reason)
+                continue
+
+            self.record_call(model, time.perf_counter() - start, usage)
+            last_answer = (answer, model)
+            if is_last or accept(answer):
+                self._stats[model]["accepted"] += 1
+                return last_answer
+            self.record_escalation(model, LOW_CONFIDENCE)
+
+        if last_answer is not None:
+            return last_answer
+        raise last_error
+
+    def get_stats(self) -> Dict[str, Any]:
+        tiers: List[Dict[str, Any]] = []
+        for model in self.tiers:
+            stats = self._stats[model]
+            escalations = sum(stats["escalated"].values())
+            tiers.append({
+                "model": model,
+                **stats,
+                "escalated": dict(stats["escalated"]),
+                "escalation_rate": round(escalations / stats["calls"], 4) if stats["calls"] else 0.0,
+                "latency_seconds_avg": round(stats["latency_seconds_total"] / stats["calls"], 4) if stats["calls"] else 0.0,
+                "latency_seconds_total": round(stats["latency_seconds_total"], 4),
+                "latency_seconds_max": round(stats["latency_seconds_max"], 4),
+            })
+        return {"requests": self.requests, "tiers": tiers}
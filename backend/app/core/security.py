@@ -2,9 +2,18 @@
 Security utilities and dependencies
 """
 
+import asyncio
+from typing import Optional
+
 from fastapi import HTTPException, status
 from app.core.config import settings
 
+# Process-wide OpenAI client and concurrency gate, created lazily so that each
+# forked worker builds its own connection pool
+_openai_client = None
+_openai_semaphore: Optional[asyncio.Semaphore] = None
+
+
 def verify_api_key(api_key: str) -> bool:
     """Verify API key (placeholder for future authentication)"""
     # For now, just check if OpenAI key is configured
@@ -12,18 +21,56 @@ def verify_api_key(api_key: str) -> bool:
 
 
 def get_openai_client():
-    """Get configured OpenAI client"""
+    """Get the shared AsyncOpenAI client (pooled keep-alive connections)"""
+    global _openai_client
+
     if not settings.OPENAI_API_KEY:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="OpenAI API key not configured"
         )
-    
+
+    if _openai_client is not None:
+        return _openai_client
+
     try:
-        from openai import OpenAI
-        return OpenAI(api_key=settings.OPENAI_API_KEY)
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
     except ImportError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="OpenAI library not installed"
-        )
\ No newline at end of file
+        )
+
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY_SECONDS
+        ),
+        timeout=settings.OPENAI_TIMEOUT_SECONDS
+    )
+    _openai_client = AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        timeout=settings.OPENAI_TIMEOUT_SECONDS,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        http_client=http_client
+    )
+    return _openai_client
+
+
+def get_openai_semaphore() -> asyncio.Semaphore:
+    """Get the semaphore bounding concurrent OpenAI calls in this process"""
+    global _openai_semaphore
+    if _openai_semaphore is None:
+        _openai_semaphore = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENCY)
+    return _openai_semaphore
+
+
+async def close_openai_client() -> None:
+    """Close the shared OpenAI client and its connection pool"""
+    global _openai_client
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
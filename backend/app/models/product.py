@@ -131,6 +131,16 @@ class SearchResponse(BaseModel):
     total_results: int
     results: List[SearchResult]
     search_time_ms: int
+    ai_token: Optional[str] = None  # Set on progressive searches: poll it for the AI ranking
+
+
+class ProgressiveSearchResponse(BaseModel):
+    """AI ranking of a progressive search"""
+    token: str
+    status: str  # pending or ready
+    total_results: int = 0
+    results: List[SearchResult] = []
+    ai_ranked: bool = False  # False when the AI was unavailable and local ranking was kept
 
 
 class HTSCodeSuggestion(BaseModel):
@@ -145,4 +155,6 @@ class HTSCodeResponse(BaseModel):
     """HTS code response model"""
     product_id: str
     suggestions: List[HTSCodeSuggestion]
-    generated_at: str
\ No newline at end of file
+    generated_at: str
+    cached: bool = False
+    source: str = "llm"  # llm, cache, rules or fallback
\ No newline at end of file
@@ -2,89 +2,133 @@
 HTS Code API endpoints
 """
 
-from typing import List
-from datetime import datetime
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+import asyncio
+import json
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Body, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 
+from app.core.admission import AdmissionRejectedError, admit_bulk_job, client_id, hts_gate, too_many_requests
+from app.core.config import settings
 from app.models.product import HTSCodeResponse, HTSCodeSuggestion
 from app.services.openai_service import openai_service
 from app.services.product_service import product_service
+from app.services.hts_cache_service import hts_cache_service
+from app.services.hts_index_service import hts_index_service
+from app.services.hts_job_service import hts_job_service
+from app.services.hts_schedule_service import hts_schedule_service
 
 router = APIRouter()
 
 
 @router.get("/{product_id}", response_model=HTSCodeResponse)
-async def get_hts_codes(product_id: str):
-    """Get HTS code suggestions for a specific product"""
+async def get_hts_codes(
+    request: Request,
+    product_id: str,
+    refresh: bool = Query(default=False, description="Bypass the HTS cache and regenerate")
+):
+    """Get HTS code suggestions for a specific product (429 with Retry-After when shed without a fallback)"""
     try:
         # Get the product
         product = product_service.get_product_by_id(product_id)
         if not product:
             raise HTTPException(status_code=404, detail=f"Product '{product_id}' not found")
         
-        # Generate HTS code suggestions
-        suggestions = await openai_service.generate_hts_codes(product)
-        
-        return HTSCodeResponse(
-            product_id=product_id,
-            suggestions=suggestions,
-            generated_at=datetime.now().isoformat()
+        # Generate HTS code suggestions (cached per product content)
+        return await openai_service.classify_product(
+            product, use_cache=not refresh, admission=hts_gate.admit(client_id(request))
         )
         
+    except AdmissionRejectedError as e:
+        raise too_many_requests(e)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate HTS codes: {str(e)}")
 
 
+@router.get("/cache/stats")
+async def get_hts_cache_stats():
+    """Get HTS cache size and hit rate"""
+    try:
+        return hts_cache_service.get_stats()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get cache stats: {str(e)}")
+
+
+@router.get("/index/stats")
+async def get_hts_index_stats():
+    """Get the size of the HTS code to product index"""
+    try:
+        return await asyncio.to_thread(hts_index_service.get_stats)
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get index stats: {str(e)}")
+
+
+@router.delete("/cache/{product_id}")
+async def invalidate_hts_cache(product_id: str):
+    """Drop cached HTS suggestions for a product"""
+    try:
+        removed = hts_cache_service.invalidate(product_id)
+        return {"product_id": product_id, "removed_entries": removed}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to invalidate cache: {str(e)}")
+
+
 @router.post("/bulk")
 async def generate_bulk_hts_codes(
-    product_ids: List[str],
-    background_tasks: BackgroundTasks
+    request: Request,
+    product_ids: Optional[List[str]] = Body(default=None),
+    all_products: bool = Query(default=False, description="Classify the whole catalog")
 ):
-    """Generate HTS codes for multiple products (async background task)"""
+    """Start a bulk HTS generation job (runs on a bounded worker pool)"""
     try:
-        if len(product_ids) > 20:
-            raise HTTPException(
-                status_code=400, 
-                detail="Maximum 20 products allowed for bulk processing"
-            )
-        
-        # Validate all product IDs exist
-        missing_products = []
-        valid_products = []
-        
-        for product_id in product_ids:
-            product = product_service.get_product_by_id(product_id)
-            if product:
-                valid_products.append(product)
-            else:
-                missing_products.append(product_id)
+        if all_products:
+            valid_products = product_service.get_all_products()
+        else:
+            if not product_ids:
+                raise HTTPException(status_code=400, detail="Provide product_ids or set all_products=true")
+            
+            # Validate all product IDs exist (duplicates are classified once)
+            missing_products = []
+            valid_products = []
+            
+            for product_id in dict.fromkeys(product_ids):
+                product = product_service.get_product_by_id(product_id)
+                if product:
+                    valid_products.append(product)
+                else:
+                    missing_products.append(product_id)
+            
+            if missing_products:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Products not found: {', '.join(missing_products)}"
+                )
         
-        if missing_products:
+        if len(valid_products) > settings.HTS_BULK_MAX_PRODUCTS:
             raise HTTPException(
-                status_code=404,
-                detail=f"Products not found: {', '.join(missing_products)}"
+                status_code=400, 
+                detail=f"Maximum {settings.HTS_BULK_MAX_PRODUCTS} products allowed for bulk processing"
             )
         
-        # Start background task for HTS generation
-        task_id = f"hts_bulk_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        
-        background_tasks.add_task(
-            process_bulk_hts_generation,
-            task_id,
-            valid_products
-        )
+        admit_bulk_job(client_id(request), hts_job_service.active_jobs)
+        task_id = await hts_job_service.submit(valid_products)
         
         return {
             "task_id": task_id,
             "status": "started",
             "products_count": len(valid_products),
-            "estimated_completion": "2-5 minutes",
-            "check_status_url": f"/api/v1/hts-codes/bulk-status/{task_id}"
+            "concurrency": hts_job_service.concurrency,
+            "check_status_url": f"/api/v1/hts-codes/bulk-status/{task_id}",
+            "results_url": f"/api/v1/hts-codes/bulk-results/{task_id}"
         }
         
+    except AdmissionRejectedError as e:
+        raise too_many_requests(e)
     except HTTPException:
         raise
     except Exception as e:
@@ -95,86 +139,175 @@ async def generate_bulk_hts_codes(
 async def get_bulk_status(task_id: str):
     """Get status of bulk HTS code generation"""
     try:
-        # In a real implementation, this would check task status from a queue/database
-        # For now, return a mock response
+        job = await asyncio.to_thread(hts_job_service.get_job, task_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Task '{task_id}' not found")
+        
+        return job
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get task status: {str(e)}")
+
+
+@router.get("/bulk-results/{task_id}")
+async def get_bulk_results(
+    task_id: str,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000),
+    status: Optional[str] = Query(default=None, description="Only items with this status")
+):
+    """Get per-product status and stored suggestions of a bulk job"""
+    try:
+        job = await asyncio.to_thread(hts_job_service.get_job, task_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Task '{task_id}' not found")
+        
+        items = await asyncio.to_thread(hts_job_service.get_results, task_id, offset, limit, status)
+        
         return {
             "task_id": task_id,
-            "status": "in_progress",
-            "progress": "3/5 products completed",
-            "estimated_remaining": "1-2 minutes"
+            "status": job["status"],
+            "total": job["total"],
+            "offset": offset,
+            "items": items
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get task status: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get task results: {str(e)}")
+
+
+@router.delete("/bulk/{task_id}")
+async def cancel_bulk_job(task_id: str):
+    """Cancel a running bulk HTS job"""
+    try:
+        if not hts_job_service.cancel_job(task_id):
+            raise HTTPException(status_code=409, detail=f"Task '{task_id}' is not running in this worker")
+        
+        return {"task_id": task_id, "status": "cancelling"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to cancel task: {str(e)}")
 
 
 @router.get("/search/{hts_code}")
-async def search_by_hts_code(hts_code: str):
-    """Find products that might match a given HTS code"""
+async def search_by_hts_code(
+    hts_code: str,
+    limit: int = Query(default=100, ge=1, le=1000, description="Maximum matching products to return"),
+    similar_limit: int = Query(default=5, ge=0, le=50, description="Maximum similar codes to return")
+):
+    """Find products classified under an HTS code or any code below it"""
     try:
-        # This would typically involve reverse lookup functionality
-        # For now, return a placeholder response
+        validation = hts_schedule_service.validate(hts_code)
+        if "normalized" not in validation:
+            raise HTTPException(status_code=400, detail=validation["error"])
+        
+        matching_products = []
+        for match in await asyncio.to_thread(hts_index_service.find_products, hts_code, limit):
+            product = product_service.get_product_by_id(match["product_id"])
+            if product:
+                matching_products.append({
+                    "product_id": product.id,
+                    "title": product.title,
+                    "product_code": product.product_code,
+                    "hts_code": match["code"],
+                    "confidence": match["confidence"],
+                    "classified_at": match["classified_at"]
+                })
+        
         return {
-            "hts_code": hts_code,
-            "description": "Pipe fittings of iron or steel",
-            "matching_products": [],
-            "similar_codes": [
-                {"code": "7307.99.1000", "description": "Other tube or pipe fittings"},
-                {"code": "8481.80.9090", "description": "Other valves and similar articles"}
-            ]
+            "hts_code": validation["normalized"],
+            "in_schedule": validation["is_valid"] and not validation.get("unverified", False),
+            "description": validation.get("description"),
+            "hierarchy": validation.get("hierarchy", {}),
+            "matching_products": matching_products,
+            "similar_codes": hts_schedule_service.similar_codes(hts_code, limit=similar_limit)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to search by HTS code: {str(e)}")
 
 
-@router.get("/validate/{hts_code}")
-async def validate_hts_code(hts_code: str):
-    """Validate if an HTS code format is correct"""
+@router.post("/validate")
+async def validate_hts_codes(hts_codes: List[str] = Body(..., description="HTS codes to validate")):
+    """Validate a batch of HTS codes against the tariff schedule"""
     try:
-        import re
-        
-        # Basic HTS code validation (US format)
-        # Pattern: NNNN.NN.NNNN
-        hts_pattern = r'^\d{4}\.\d{2}\.\d{4}$'
+        if len(hts_codes) > settings.HTS_VALIDATE_MAX_CODES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Maximum {settings.HTS_VALIDATE_MAX_CODES} codes allowed per validation request"
+            )
         
-        is_valid = bool(re.match(hts_pattern, hts_code))
+        results = [hts_schedule_service.validate(hts_code) for hts_code in hts_codes]
+        valid = sum(1 for result in results if result["is_valid"])
         
-        result = {
-            "hts_code": hts_code,
-            "is_valid": is_valid,
-            "format": "NNNN.NN.NNNN"
+        return {
+            "total": len(results),
+            "valid": valid,
+            "invalid": len(results) - valid,
+            "results": results
         }
         
-        if not is_valid:
-            result["error"] = "HTS code must be in format NNNN.NN.NNNN (e.g., 7307.99.1000)"
-        
-        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to validate HTS codes: {str(e)}")
+
+
+@router.get("/validate/{hts_code}")
+async def validate_hts_code(hts_code: str):
+    """Validate an HTS code against the tariff schedule"""
+    try:
+        return hts_schedule_service.validate(hts_code)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to validate HTS code: {str(e)}")
 
 
-async def process_bulk_hts_generation(task_id: str, products: List):
-    """Background task to process bulk HTS code generation"""
+@router.get("/{product_id}/stream")
+async def stream_hts_codes(
+    request: Request,
+    product_id: str,
+    refresh: bool = Query(default=False, description="Bypass the HTS cache and regenerate")
+):
+    """Stream HTS code suggestions as server-sent events while they are generated"""
     try:
-        # In a real implementation, this would:
-        # 1. Update task status in database
-        # 2. Process each product
-        # 3. Store results
-        # 4. Send notification when complete
-        
-        print(f"Starting bulk HTS generation for task {task_id}")
-        print(f"Processing {len(products)} products...")
-        
-        # Simulate processing
-        for i, product in enumerate(products):
-            print(f"Processing product {i+1}/{len(products)}: {product.title}")
-            # Generate HTS codes for each product
-            suggestions = await openai_service.generate_hts_codes(product)
-            # Store results (would save to database in real implementation)
-            
-        print(f"Completed bulk HTS generation for task {task_id}")
+        product = product_service.get_product_by_id(product_id)
+        if not product:
+            raise HTTPException(status_code=404, detail=f"Product '{product_id}' not found")
+        
+        events = openai_service.stream_hts_codes(
+            product, use_cache=not refresh, admission=hts_gate.admit(client_id(request))
+        )
+        try:
+            # Admission is decided before the first event, while a 429 can still be sent
+            first_event = await events.__anext__()
+        except AdmissionRejectedError as e:
+            raise too_many_requests(e)
         
+        async def event_stream():
+            try:
+                event, data = first_event
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                async for event, data in events:
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            finally:
+                await events.aclose()
+        
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+        
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in bulk HTS generation: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to stream HTS codes: {str(e)}")
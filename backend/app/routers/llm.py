@@ -0,0 +1,36 @@
+"""
+LLM monitoring API endpoints
+"""
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.core.admission import get_admission_stats
+from app.services.llm_usage_service import llm_usage_service
+from app.services.openai_service import openai_service
+from app.services.progressive_search_service import progressive_search_service
+
+router = APIRouter()
+
+
+@router.get("/stats")
+async def get_llm_stats():
+    """Get LLM call coalescing statistics"""
+    try:
+        return {
+            **openai_service.get_stats(),
+            "progressive_search": progressive_search_service.get_stats(),
+            "admission": get_admission_stats()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get LLM stats: {str(e)}")
+
+
+@router.get("/usage")
+async def get_llm_usage(recent: int = Query(20, ge=0, le=500, description="Most recent calls to include")):
+    """Get LLM token usage, latency and outcomes per operation and model, and the per-minute budget"""
+    try:
+        return llm_usage_service.get_stats(recent=recent)
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get LLM usage: {str(e)}")
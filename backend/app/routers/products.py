@@ -4,11 +4,12 @@ Product API endpoints
 
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from app.models.product import Product
 from app.services.product_service import product_service
 from app.utils.helpers import validate_filters, format_product_summary
+from app.utils.export import EXPORT_MEDIA_TYPES, iter_products_export
 
 router = APIRouter()
 
@@ -47,6 +48,38 @@ async def get_all_products(
         raise HTTPException(status_code=500, detail=f"Failed to retrieve products: {str(e)}")
 
 
+@router.get("/export")
+async def export_products(
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv)$"),
+    product_code: Optional[str] = Query(default=None),
+    joint_type: Optional[str] = Query(default=None),
+    body_design: Optional[str] = Query(default=None)
+):
+    """Stream the (optionally filtered) catalog as NDJSON or CSV"""
+    try:
+        filters = {}
+        if product_code:
+            filters["product_code"] = product_code
+        if joint_type:
+            filters["joint_type"] = joint_type
+        if body_design:
+            filters["body_design"] = body_design
+
+        if filters:
+            products = product_service.filter_products(validate_filters(filters))
+        else:
+            products = product_service.get_all_products()
+
+        return StreamingResponse(
+            iter_products_export(products, format),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="products.{format}"'}
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to export products: {str(e)}")
+
+
 @router.get("/{product_id}", response_model=Product)
 async def get_product(product_id: str):
     """Get a specific product by ID"""
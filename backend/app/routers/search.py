@@ -2,23 +2,33 @@
 Search API endpoints
 """
 
+import time
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, HTTPException, Query, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Query, Depends, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from app.models.product import SearchQuery, SearchResponse, SearchResult
+from app.core.admission import ai_search_gate, client_id
+from app.core.config import settings
+from app.models.product import SearchQuery, SearchResponse, SearchResult, ProgressiveSearchResponse
 from app.services.search_service import search_service
-from app.services.openai_service import openai_service
+from app.services.openai_service import openai_service, AI_MATCH_REASON
+from app.services.progressive_search_service import progressive_search_service
+from app.services.similarity_service import similarity_service, ATTRIBUTE_WEIGHTS
+from app.services.analytics_service import analytics_service
 from app.utils.helpers import clean_query, validate_filters, calculate_search_metrics
+from app.utils.export import EXPORT_MEDIA_TYPES, iter_search_results_export
 
 router = APIRouter()
 
 
 @router.get("/", response_model=SearchResponse)
 async def search_products(
+    request: Request,
     q: str = Query(..., description="Search query"),
     limit: Optional[int] = Query(default=10, ge=1, le=50),
     enhanced: Optional[bool] = Query(default=False, description="Use AI-enhanced search"),
+    fanout: Optional[bool] = Query(default=False, description="With enhanced, let the AI rank the whole catalog in parallel chunks"),
+    progressive: Optional[bool] = Query(default=False, description="With enhanced, return local results at once and poll /ai/{ai_token} for the AI ranking"),
     product_code: Optional[str] = Query(default=None),
     joint_type: Optional[str] = Query(default=None),
     body_design: Optional[str] = Query(default=None),
@@ -48,21 +58,39 @@ async def search_products(
         validated_filters = validate_filters(filters)
         
         # Perform search
-        if enhanced:
-            # Use AI-enhanced search
-            results = await openai_service.enhanced_search(cleaned_query, limit)
-            search_time_ms = 0  # AI search doesn't track time the same way
+        ai_token = None
+        if enhanced and progressive:
+            # Local results now, AI ranking in the background
+            results, search_time_ms = search_service.search_products(
+                cleaned_query, limit, validated_filters
+            )
+            ai_token = progressive_search_service.start(
+                cleaned_query, limit, bool(fanout), validated_filters, client_id(request)
+            )
+        elif enhanced:
+            # Use AI-enhanced search (wall time includes the LLM round trip);
+            # when the AI search gate sheds the request it falls back to local ranking
+            start_time = time.perf_counter()
+            results = await openai_service.enhanced_search(
+                cleaned_query, limit, fanout=bool(fanout), admission=ai_search_gate.admit(client_id(request))
+            )
+            search_time_ms = int((time.perf_counter() - start_time) * 1000)
         else:
             # Use basic search
             results, search_time_ms = search_service.search_products(
                 cleaned_query, limit, validated_filters
             )
         
+        analytics_service.record_search(
+            cleaned_query, validated_filters, len(results), search_time_ms, bool(enhanced)
+        )
+        
         return SearchResponse(
             query=cleaned_query,
             total_results=len(results),
             results=results,
-            search_time_ms=search_time_ms
+            search_time_ms=search_time_ms,
+            ai_token=ai_token
         )
         
     except HTTPException:
@@ -71,6 +99,33 @@ async def search_products(
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
 
+@router.get("/ai/{token}", response_model=ProgressiveSearchResponse)
+async def get_progressive_search_results(
+    request: Request,
+    token: str,
+    wait: Optional[float] = Query(default=10.0, ge=0, description="Seconds to wait for the ranking before answering pending")
+):
+    """Long-poll the AI ranking of a progressive search"""
+    try:
+        timeout = min(wait, settings.PROGRESSIVE_SEARCH_MAX_WAIT_SECONDS)
+        results = await progressive_search_service.wait(token, timeout, client_id(request))
+        if results is None:
+            return ProgressiveSearchResponse(token=token, status="pending")
+        
+        return ProgressiveSearchResponse(
+            token=token,
+            status="ready",
+            total_results=len(results),
+            results=results,
+            ai_ranked=any(result.match_reason == AI_MATCH_REASON for result in results)
+        )
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get AI search results: {str(e)}")
+
+
 @router.post("/", response_model=SearchResponse)
 async def search_products_post(search_query: SearchQuery):
     """Search products using POST with request body"""
@@ -87,6 +142,10 @@ async def search_products_post(search_query: SearchQuery):
             validated_filters
         )
         
+        analytics_service.record_search(
+            cleaned_query, validated_filters, len(results), search_time_ms, False
+        )
+        
         return SearchResponse(
             query=cleaned_query,
             total_results=len(results),
@@ -100,6 +159,51 @@ async def search_products_post(search_query: SearchQuery):
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
 
+@router.get("/export")
+async def export_search_results(
+    q: str = Query(..., description="Search query"),
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv)$"),
+    limit: Optional[int] = Query(default=None, ge=1, description="Omit to export every match"),
+    product_code: Optional[str] = Query(default=None),
+    joint_type: Optional[str] = Query(default=None),
+    body_design: Optional[str] = Query(default=None),
+    min_pressure: Optional[int] = Query(default=None),
+    max_pressure: Optional[int] = Query(default=None)
+):
+    """Stream ranked search results as NDJSON or CSV"""
+    try:
+        cleaned_query = clean_query(q)
+        if not cleaned_query:
+            raise HTTPException(status_code=400, detail="Search query cannot be empty")
+
+        filters = {}
+        if product_code:
+            filters["product_code"] = product_code
+        if joint_type:
+            filters["joint_type"] = joint_type
+        if body_design:
+            filters["body_design"] = body_design
+        if min_pressure:
+            filters["min_pressure"] = min_pressure
+        if max_pressure:
+            filters["max_pressure"] = max_pressure
+
+        results, _ = search_service.search_products(
+            cleaned_query, limit, validate_filters(filters)
+        )
+
+        return StreamingResponse(
+            iter_search_results_export(results, format),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="search_results.{format}"'}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search export failed: {str(e)}")
+
+
 @router.get("/suggestions")
 async def get_search_suggestions(
     q: str = Query(..., description="Partial search query"),
@@ -122,44 +226,36 @@ async def get_search_suggestions(
 
 
 @router.get("/analytics")
-async def get_search_analytics():
+async def get_search_analytics(
+    top: Optional[int] = Query(default=5, ge=1, le=50),
+    recent: Optional[int] = Query(default=5, ge=1, le=100)
+):
     """Get search analytics and popular terms"""
     try:
-        # This would typically connect to analytics storage
-        # For now, return sample data
-        return {
-            "popular_searches": [
-                {"query": "mechanical joint", "count": 45},
-                {"query": "C153", "count": 38},
-                {"query": "push-on", "count": 32},
-                {"query": "ductile iron", "count": 28},
-                {"query": "flanged", "count": 24}
-            ],
-            "recent_searches": [
-                "6 inch mechanical joint",
-                "C110 flanged fittings",
-                "high pressure fittings",
-                "compact body design",
-                "AWWA C153"
-            ],
-            "search_trends": {
-                "mechanical_joint": 35.2,
-                "push_on": 28.7,
-                "flanged": 18.9,
-                "compact": 17.2
-            }
-        }
+        return analytics_service.get_analytics(top_n=top, recent_n=recent)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get analytics: {str(e)}")
 
 
+@router.get("/analytics/recent")
+async def get_recent_searches(
+    limit: Optional[int] = Query(default=100, ge=1, le=1000)
+):
+    """Get the most recent raw search events"""
+    try:
+        return {"events": analytics_service.get_recent_events(limit)}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get recent searches: {str(e)}")
+
+
 @router.get("/similar/{product_id}")
 async def get_similar_products(
     product_id: str,
     limit: Optional[int] = Query(default=5, ge=1, le=10)
 ):
-    """Find products similar to the given product"""
+    """Find products similar to the given product (precomputed neighbours)"""
     try:
         from app.services.product_service import product_service
         
@@ -168,29 +264,20 @@ async def get_similar_products(
         if not reference_product:
             raise HTTPException(status_code=404, detail=f"Product '{product_id}' not found")
         
-        # Create a search query based on the product characteristics
-        search_terms = [
-            reference_product.product_code,
-            reference_product.joint_type,
-            reference_product.body_design
-        ]
-        
-        # Search for similar products
-        results, _ = search_service.search_products(
-            " ".join(search_terms), 
-            limit + 1  # +1 to account for the original product
-        )
-        
-        # Filter out the original product
-        similar_products = [
-            result for result in results 
-            if result.product.id != product_id
-        ][:limit]
+        # Neighbours are precomputed per catalog version: this is a lookup
+        similar_products = []
+        for product, similarity in await similarity_service.get_similar(product_id, limit):
+            shared = similarity_service.shared_attributes(product_id, product.id)
+            similar_products.append(SearchResult(
+                product=product,
+                score=round(similarity * 100, 1),
+                match_reason="Shared " + (", ".join(shared) if shared else "description terms")
+            ))
         
         return {
             "reference_product_id": product_id,
             "similar_products": similar_products,
-            "similarity_criteria": search_terms
+            "similarity_criteria": list(ATTRIBUTE_WEIGHTS) + ["description"]
         }
         
     except HTTPException:
@@ -0,0 +1,254 @@
+"""
+Search analytics service - bounded recent-search log and streaming heavy-hitter counters
+"""
+
+import asyncio
+import heapq
+import json
+import os
+import threading
+import time
+from collections import deque
+from itertools import islice
+from pathlib import Path
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+
+class SearchEvent(NamedTuple):
+    """A single recorded search"""
+    timestamp: float
+    query: str
+    filters: Dict[str, Any]
+    result_count: int
+    latency_ms: int
+    enhanced: bool
+
+
+class SpaceSavingCounter:
+    """
+    Space-Saving heavy-hitters sketch (Metwally et al.)
+
+    Tracks at most `capacity` keys. Any key whose true frequency exceeds
+    total / capacity is guaranteed to be present; each count overestimates
+    the true frequency by at most its recorded error. Keys are grouped into
+    buckets of equal count (the "stream summary"), so add() is O(1).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.total = 0
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        # count -> keys with that count (dict used as an insertion-ordered set)
+        self._buckets: Dict[int, Dict[str, None]] = {}
+        self._min_count = 0
+
+    def _move(self, key: str, old_count: int, new_count: int) -> None:
+        if old_count:
+            bucket = self._buckets[old_count]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[old_count]
+                if self._min_count == old_count:
+                    self._min_count = new_count
+        self._buckets.setdefault(new_count, {})[key] = None
+        self._counts[key] = new_count
+
+    def add(self, key: str) -> None:
+        """Count one occurrence of key"""
+        self.total += 1
+        count = self._counts.get(key)
+        if count is not None:
+            self._move(key, count, count + 1)
+            return
+
+        if len(self._counts) < self.capacity:
+            self._errors[key] = 0
+            self._move(key, 0, 1)
+            self._min_count = 1
+            return
+
+        # Replace the oldest key holding the minimum count; the newcomer inherits
+        # that count as its error bound
+        floor = self._min_count
+        victim = next(iter(self._buckets[floor]))
+        del self._counts[victim]
+        del self._errors[victim]
+        self._errors[key] = floor
+        self._buckets[floor][key] = self._buckets[floor].pop(victim)
+        self._counts[key] = floor
+        self._move(key, floor, floor + 1)
+
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        """Top-k keys by estimated count"""
+        return heapq.nlargest(k, self._counts.items(), key=lambda item: item[1])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"capacity": self.capacity, "total": self.total,
+                "counts": dict(self._counts), "errors": dict(self._errors)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SpaceSavingCounter":
+        counter = cls(int(data.get("capacity", 100)))
+        counter.total = int(data.get("total", 0))
+        errors = data.get("errors", {})
+        for key, count in data.get("counts", {}).items():
+            counter._errors[key] = int(errors.get(key, 0))
+            counter._move(key, 0, int(count))
+        counter._min_count = min(counter._buckets) if counter._buckets else 0
+        return counter
+
+
+class SearchAnalyticsService:
+    """Service for recording searches and summarizing popular and trending queries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events: Deque[SearchEvent] = deque(maxlen=settings.ANALYTICS_BUFFER_SIZE)
+        self._popular = SpaceSavingCounter(settings.ANALYTICS_TOP_K_CAPACITY)
+        # Trending compares the current window against the previous one
+        self._window_seconds = settings.ANALYTICS_TREND_WINDOW_SECONDS
+        self._window_started = time.time()
+        self._current_window = SpaceSavingCounter(settings.ANALYTICS_TOP_K_CAPACITY)
+        self._previous_window = SpaceSavingCounter(settings.ANALYTICS_TOP_K_CAPACITY)
+        self._total_searches = 0
+        self._enhanced_searches = 0
+        self._zero_result_searches = 0
+        self._total_latency_ms = 0
+        self.snapshot_file = Path(settings.ANALYTICS_SNAPSHOT_FILE) if settings.ANALYTICS_SNAPSHOT_FILE else None
+
+    def record_search(self, query: str, filters: Optional[Dict[str, Any]], result_count: int,
+                      latency_ms: int, enhanced: bool) -> None:
+        """Record one search; O(1) amortized, called after the response is computed"""
+        now = time.time()
+        key = query.lower()
+        event = SearchEvent(now, query, dict(filters or {}), result_count, latency_ms, enhanced)
+
+        with self._lock:
+            self._events.append(event)
+            self._popular.add(key)
+            self._rotate_window(now)
+            self._current_window.add(key)
+            self._total_searches += 1
+            self._total_latency_ms += latency_ms
+            if enhanced:
+                self._enhanced_searches += 1
+            if result_count == 0:
+                self._zero_result_searches += 1
+
+    def _rotate_window(self, now: float) -> None:
+        """Roll the trending window forward (caller holds the lock)"""
+        elapsed = now - self._window_started
+        if elapsed < self._window_seconds:
+            return
+        if elapsed < 2 * self._window_seconds:
+            self._previous_window = self._current_window
+        else:
+            # Idle for more than a full window: nothing recent to compare against
+            self._previous_window = SpaceSavingCounter(self._popular.capacity)
+        self._current_window = SpaceSavingCounter(self._popular.capacity)
+        self._window_started = now
+
+    def get_analytics(self, top_n: int = 5, recent_n: int = 5) -> Dict[str, Any]:
+        """Summarize popular, recent and trending searches"""
+        with self._lock:
+            self._rotate_window(time.time())
+            popular = self._popular.top(top_n)
+            recent = [event.query for event in islice(reversed(self._events), recent_n)]
+            current = self._current_window
+            previous = self._previous_window
+            trending = current.top(top_n)
+            window_total = current.total
+            totals = {
+                "total_searches": self._total_searches,
+                "enhanced_searches": self._enhanced_searches,
+                "zero_result_searches": self._zero_result_searches,
+                "average_latency_ms": round(self._total_latency_ms / self._total_searches, 2)
+                if self._total_searches else 0
+            }
+            previous_counts = dict(previous.top(previous.capacity))
+
+        return {
+            "popular_searches": [{"query": query, "count": count} for query, count in popular],
+            "recent_searches": recent,
+            # Share of searches in the current window, as a percentage
+            "search_trends": {
+                query: round(count / window_total * 100, 1) for query, count in trending
+            } if window_total else {},
+            "trend_growth": {
+                query: count - previous_counts.get(query, 0) for query, count in trending
+            },
+            "trend_window_seconds": self._window_seconds,
+            **totals
+        }
+
+    def get_recent_events(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent raw search events, newest first"""
+        with self._lock:
+            events = list(self._events)[-limit:]
+        return [event._asdict() for event in reversed(events)]
+
+    def save_snapshot(self) -> None:
+        """Write counters and the recent-search buffer to the snapshot file"""
+        if not self.snapshot_file:
+            return
+
+        with self._lock:
+            snapshot = {
+                "saved_at": time.time(),
+                "popular": self._popular.to_dict(),
+                "events": [event._asdict() for event in self._events],
+                "totals": {
+                    "total_searches": self._total_searches,
+                    "enhanced_searches": self._enhanced_searches,
+                    "zero_result_searches": self._zero_result_searches,
+                    "total_latency_ms": self._total_latency_ms
+                }
+            }
+
+        self.snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.snapshot_file.with_suffix(f"{self.snapshot_file.suffix}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        tmp_file.replace(self.snapshot_file)
+
+    def load_snapshot(self) -> None:
+        """Restore counters from the snapshot file, if present"""
+        if not self.snapshot_file or not self.snapshot_file.exists():
+            return
+
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+
+            with self._lock:
+                self._popular = SpaceSavingCounter.from_dict(snapshot.get("popular", {}))
+                self._events.extend(SearchEvent(**event) for event in snapshot.get("events", []))
+                totals = snapshot.get("totals", {})
+                self._total_searches = totals.get("total_searches", 0)
+                self._enhanced_searches = totals.get("enhanced_searches", 0)
+                self._zero_result_searches = totals.get("zero_result_searches", 0)
+                self._total_latency_ms = totals.get("total_latency_ms", 0)
+        except Exception as e:
+            print(f"Failed to load analytics snapshot: {e}")
+
+    async def run_snapshots(self) -> None:
+        """Periodically persist a snapshot until cancelled"""
+        interval = settings.ANALYTICS_SNAPSHOT_INTERVAL_SECONDS
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await asyncio.to_thread(self.save_snapshot)
+                except Exception as e:
+                    print(f"Failed to save analytics snapshot: {e}")
+        except asyncio.CancelledError:
+            # Final snapshot on shutdown
+            await asyncio.to_thread(self.save_snapshot)
+            raise
+
+
+# Singleton instance
+analytics_service = SearchAnalyticsService()
@@ -0,0 +1,121 @@
+"""
+HTS cache service - persistent SQLite cache of HTS suggestions keyed by product content
+"""
+
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.product import HTSCodeSuggestion
+from app.utils.sqlite import ProcessLocalSQLite
+
+HTS_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hts_cache (
+    cache_key TEXT PRIMARY KEY,
+    product_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    suggestions TEXT NOT NULL,
+    generated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_hts_cache_product ON hts_cache (product_id);
+"""
+
+
+class HTSCacheService:
+    """Service for caching HTS suggestions across requests and restarts"""
+
+    def __init__(self):
+        self.enabled = settings.HTS_CACHE_ENABLED
+        self._db = ProcessLocalSQLite(settings.HTS_CACHE_FILE, HTS_CACHE_SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(prompt_fields: Dict[str, Any], model: str, prompt_version: str) -> str:
+        """Hash of the prompt fields, prompt template version and model name"""
+        payload = json.dumps(
+            {"fields": prompt_fields, "model": model, "prompt_version": prompt_version},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, cache_key: str) -> Optional[Tuple[List[HTSCodeSuggestion], str]]:
+        """Return (suggestions, generated_at) for a key, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        try:
+            with self._db.lock:
+                row = self._db.connection().execute(
+                    "SELECT suggestions, generated_at FROM hts_cache WHERE cache_key = ?",
+                    (cache_key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"HTS cache read error: {e}")
+            return None
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        suggestions = [HTSCodeSuggestion(**item) for item in json.loads(row[0])]
+        return suggestions, row[1]
+
+    def put(self, cache_key: str, product_id: str, suggestions: List[HTSCodeSuggestion],
+            model: str, prompt_version: str, generated_at: Optional[str] = None) -> None:
+        """Store suggestions, replacing stale entries for the same product/model/prompt"""
+        if not self.enabled:
+            return
+
+        payload = json.dumps([s.model_dump() for s in suggestions])
+        try:
+            with self._db.transaction() as conn:
+                # Product content changed: the old key can never be hit again
+                conn.execute(
+                    "DELETE FROM hts_cache WHERE product_id = ? AND model = ? AND prompt_version = ? AND cache_key != ?",
+                    (product_id, model, prompt_version, cache_key)
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO hts_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    (cache_key, product_id, model, prompt_version, payload,
+                     generated_at or datetime.now().isoformat())
+                )
+        except sqlite3.Error as e:
+            print(f"HTS cache write error: {e}")
+
+    def invalidate(self, product_id: str) -> int:
+        """Drop every cached entry for a product; returns the number removed"""
+        if not self.enabled:
+            return 0
+
+        with self._db.lock:
+            cursor = self._db.connection().execute(
+                "DELETE FROM hts_cache WHERE product_id = ?", (product_id,)
+            )
+        return cursor.rowcount
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Entry count and hit/miss counters for this process"""
+        entries = 0
+        if self.enabled:
+            with self._db.lock:
+                entries = self._db.connection().execute("SELECT COUNT(*) FROM hts_cache").fetchone()[0]
+
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Singleton instance
+hts_cache_service = HTSCacheService()
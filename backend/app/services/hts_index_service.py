@@ -0,0 +1,98 @@
+"""
+HTS index service - persistent reverse index from HTS codes and their prefixes to products
+"""
+
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.models.product import HTSCodeSuggestion
+from app.services.hts_schedule_service import LEVELS, format_hts_code, normalize_hts_code
+from app.utils.sqlite import ProcessLocalSQLite
+
+HTS_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hts_product_index (
+    prefix TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    code TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    classified_at TEXT NOT NULL,
+    PRIMARY KEY (prefix, product_id)
+);
+CREATE INDEX IF NOT EXISTS idx_hts_product_index_product ON hts_product_index (product_id);
+"""
+
+
+class HTSIndexService:
+    """
+    Service mapping HTS codes to the products classified under them
+
+    Every suggested code is stored under each of its prefixes (chapter,
+    heading, subheading, tariff line and the full code), so "which products
+    fall under 7307.19" is a single primary-key lookup. A product keeps
+    one row per prefix: the suggestion with the highest confidence wins.
+    """
+
+    def __init__(self):
+        self._db = ProcessLocalSQLite(settings.HTS_INDEX_FILE, HTS_INDEX_SCHEMA)
+
+    def record(self, product_id: str, suggestions: List[HTSCodeSuggestion],
+               classified_at: Optional[str] = None) -> None:
+        """Replace a product's entries with the codes from its latest classification"""
+        best: Dict[str, tuple] = {}
+        for suggestion in suggestions:
+            digits = normalize_hts_code(suggestion.code)
+            if digits is None:
+                continue
+            for length in LEVELS:
+                if length > len(digits):
+                    break
+                prefix = digits[:length]
+                if prefix not in best or suggestion.confidence > best[prefix][1]:
+                    best[prefix] = (format_hts_code(digits), suggestion.confidence)
+
+        classified_at = classified_at or datetime.now().isoformat()
+        try:
+            with self._db.transaction() as conn:
+                conn.execute("DELETE FROM hts_product_index WHERE product_id = ?", (product_id,))
+                conn.executemany(
+                    "INSERT INTO hts_product_index VALUES (?, ?, ?, ?, ?)",
+                    [(prefix, product_id, code, confidence, classified_at)
+                     for prefix, (code, confidence) in best.items()]
+                )
+        except sqlite3.Error as e:
+            print(f"HTS index write error: {e}")
+
+    def find_products(self, hts_code: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Products classified under a code or any code below it, best match first"""
+        digits = normalize_hts_code(hts_code)
+        if digits is None:
+            return []
+
+        with self._db.lock:
+            rows = self._db.connection().execute(
+                "SELECT product_id, code, confidence, classified_at FROM hts_product_index "
+                "WHERE prefix = ? ORDER BY confidence DESC, product_id LIMIT ?",
+                (digits, limit)
+            ).fetchall()
+
+        return [
+            {"product_id": product_id, "code": code, "confidence": confidence, "classified_at": classified_at}
+            for product_id, code, confidence, classified_at in rows
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Number of indexed products and distinct codes/prefixes"""
+        with self._db.lock:
+            conn = self._db.connection()
+            products = conn.execute("SELECT COUNT(DISTINCT product_id) FROM hts_product_index").fetchone()[0]
+            prefixes = conn.execute("SELECT COUNT(DISTINCT prefix) FROM hts_product_index").fetchone()[0]
+        return {
+            "indexed_products": products,
+            "prefixes": prefixes
+        }
+
+
+# Singleton instance
+hts_index_service = HTSIndexService()
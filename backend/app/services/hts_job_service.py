@@ -0,0 +1,322 @@
+"""
+HTS job service - bulk HTS classification jobs with a bounded async worker pool
+
+Workers take products in chunks of HTS_BATCH_SIZE so each chunk is classified
+with one batched prompt instead of one prompt per product.
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.product import Product
+from app.services.openai_service import openai_service
+from app.utils.sqlite import ProcessLocalSQLite
+
+HTS_JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hts_jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    owner_pid INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS hts_job_items (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    product_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    suggestions TEXT,
+    cached INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    duration_ms INTEGER,
+    PRIMARY KEY (job_id, position)
+);
+"""
+
+# Job statuses
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_CANCELLED = "cancelled"
+JOB_FAILED = "failed"
+JOB_INTERRUPTED = "interrupted"
+JOB_FINAL_STATUSES = {JOB_COMPLETED, JOB_CANCELLED, JOB_FAILED, JOB_INTERRUPTED}
+
+# Item statuses
+ITEM_PENDING = "pending"
+ITEM_RUNNING = "running"
+ITEM_COMPLETED = "completed"
+ITEM_FAILED = "failed"
+ITEM_CANCELLED = "cancelled"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class HTSJobService:
+    """Service for running and tracking bulk HTS classification jobs"""
+
+    def __init__(self):
+        self._db = ProcessLocalSQLite(settings.HTS_JOBS_FILE, HTS_JOBS_SCHEMA)
+        self.concurrency = settings.HTS_BULK_CONCURRENCY
+        self.batch_size = max(1, settings.HTS_BATCH_SIZE)
+        # Strong references so running jobs are not garbage collected
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def active_jobs(self) -> int:
+        """Jobs running in this process"""
+        return len(self._tasks)
+
+    def create_job(self, products: List[Product]) -> str:
+        """Persist a new job with one pending item per product"""
+        job_id = f"hts_bulk_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        with self._db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO hts_jobs (job_id, status, total, owner_pid, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, len(products), os.getpid(), datetime.now().isoformat())
+            )
+            conn.executemany(
+                "INSERT INTO hts_job_items (job_id, position, product_id, status) VALUES (?, ?, ?, ?)",
+                [(job_id, position, product.id, ITEM_PENDING) for position, product in enumerate(products)]
+            )
+        return job_id
+
+    def start_job(self, job_id: str, products: List[Product]) -> None:
+        """Run a created job in the background on the current event loop"""
+        task = asyncio.create_task(self._run_job(job_id, products))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def submit(self, products: List[Product]) -> str:
+        """Create and start a job; returns its id"""
+        job_id = await asyncio.to_thread(self.create_job, products)
+        self.start_job(job_id, products)
+        return job_id
+
+    async def _run_job(self, job_id: str, products: List[Product]) -> None:
+        """
+        Fan the products out to a bounded pool of worker coroutines
+
+        If a worker fails outside the per-chunk error handling, the other
+        workers are cancelled and the job is marked failed rather than left
+        running. SQLite writes run in a thread so they do not block the loop.
+        """
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE hts_jobs SET status = ?, started_at = ? WHERE job_id = ?",
+            (JOB_RUNNING, datetime.now().isoformat(), job_id)
+        )
+
+        queue: asyncio.Queue = asyncio.Queue()
+        items = list(enumerate(products))
+        for start in range(0, len(items), self.batch_size):
+            queue.put_nowait(items[start:start + self.batch_size])
+
+        async def worker():
+            while True:
+                try:
+                    chunk = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._run_chunk(job_id, chunk)
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, queue.qsize()) or 1)]
+        try:
+            await asyncio.gather(*workers)
+            final_status = JOB_COMPLETED
+        except (asyncio.CancelledError, Exception) as e:
+            if isinstance(e, asyncio.CancelledError):
+                final_status = JOB_CANCELLED
+            else:
+                print(f"Bulk HTS job {job_id} failed: {e}")
+                final_status = JOB_FAILED
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await asyncio.to_thread(
+                self._execute,
+                "UPDATE hts_job_items SET status = ? WHERE job_id = ? AND status IN (?, ?)",
+                (ITEM_CANCELLED, job_id, ITEM_PENDING, ITEM_RUNNING)
+            )
+
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE hts_jobs SET status = ?, finished_at = ? WHERE job_id = ?",
+            (final_status, datetime.now().isoformat(), job_id)
+        )
+
+    async def _run_chunk(self, job_id: str, chunk: List[Tuple[int, Product]]) -> None:
+        """Classify a chunk of products with one batched call and store each result"""
+        positions = [position for position, _ in chunk]
+        await asyncio.to_thread(
+            self._execute_many,
+            "UPDATE hts_job_items SET status = ? WHERE job_id = ? AND position = ?",
+            [(ITEM_RUNNING, job_id, position) for position in positions]
+        )
+        start_time = time.perf_counter()
+        try:
+            responses = await openai_service.classify_products_batch([product for _, product in chunk])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Bulk HTS chunk {chunk[0][1].id}..{chunk[-1][1].id} failed: {e}")
+            duration_ms = int((time.perf_counter() - start_time) * 1000)
+            await asyncio.to_thread(
+                self._execute_many,
+                "UPDATE hts_job_items SET status = ?, error = ?, duration_ms = ? WHERE job_id = ? AND position = ?",
+                [(ITEM_FAILED, str(e), duration_ms, job_id, position) for position in positions]
+            )
+            return
+
+        duration_ms = int((time.perf_counter() - start_time) * 1000)
+        completed = []
+        missing = []
+        for position, product in chunk:
+            response = responses.get(product.id)
+            if response is None:
+                missing.append((ITEM_FAILED, "No classification returned", duration_ms, job_id, position))
+                continue
+            completed.append((
+                ITEM_COMPLETED, json.dumps([s.model_dump() for s in response.suggestions]),
+                int(response.cached), duration_ms, job_id, position
+            ))
+
+        await asyncio.to_thread(
+            self._execute_many,
+            "UPDATE hts_job_items SET status = ?, suggestions = ?, cached = ?, duration_ms = ? "
+            "WHERE job_id = ? AND position = ?",
+            completed
+        )
+        await asyncio.to_thread(
+            self._execute_many,
+            "UPDATE hts_job_items SET status = ?, error = ?, duration_ms = ? WHERE job_id = ? AND position = ?",
+            missing
+        )
+
+    def _execute(self, sql: str, params: tuple) -> None:
+        with self._db.lock:
+            self._db.connection().execute(sql, params)
+
+    def _execute_many(self, sql: str, rows: List[tuple]) -> None:
+        if not rows:
+            return
+        with self._db.transaction() as conn:
+            conn.executemany(sql, rows)
+
+    def cancel_job(self, job_id: str) -> bool:
+        """Cancel a job running in this process; returns False if it is not running here"""
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    async def shutdown(self) -> None:
+        """Cancel every job running in this process"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status with real per-status item counts"""
+        with self._db.lock:
+            conn = self._db.connection()
+            row = conn.execute(
+                "SELECT status, total, owner_pid, created_at, started_at, finished_at FROM hts_jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM hts_job_items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+            cached = conn.execute(
+                "SELECT COUNT(*) FROM hts_job_items WHERE job_id = ? AND cached = 1", (job_id,)
+            ).fetchone()[0]
+
+        status, total, owner_pid, created_at, started_at, finished_at = row
+
+        # The owning worker died (restart/crash) before the job finished
+        if status not in JOB_FINAL_STATUSES and not _pid_alive(owner_pid):
+            status = JOB_INTERRUPTED
+            self._execute("UPDATE hts_jobs SET status = ? WHERE job_id = ?", (status, job_id))
+
+        completed = counts.get(ITEM_COMPLETED, 0)
+        failed = counts.get(ITEM_FAILED, 0)
+        done = completed + failed
+
+        elapsed = None
+        remaining = None
+        if started_at:
+            end = datetime.fromisoformat(finished_at) if finished_at else datetime.now()
+            elapsed = (end - datetime.fromisoformat(started_at)).total_seconds()
+            if done and status == JOB_RUNNING:
+                remaining = round(elapsed / done * (total - done), 1)
+
+        return {
+            "task_id": job_id,
+            "status": status,
+            "total": total,
+            "completed": completed,
+            "failed": failed,
+            "running": counts.get(ITEM_RUNNING, 0),
+            "pending": counts.get(ITEM_PENDING, 0),
+            "cancelled": counts.get(ITEM_CANCELLED, 0),
+            "cached": cached,
+            "progress": f"{done}/{total} products completed",
+            "percent_complete": round(done / total * 100, 1) if total else 100.0,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+            "estimated_remaining_seconds": remaining
+        }
+
+    def get_results(self, job_id: str, offset: int = 0, limit: int = 100,
+                    status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Per-item status and stored suggestions, in submission order"""
+        sql = ("SELECT position, product_id, status, suggestions, cached, error, duration_ms "
+               "FROM hts_job_items WHERE job_id = ?")
+        params: list = [job_id]
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        sql += " ORDER BY position LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+
+        with self._db.lock:
+            rows = self._db.connection().execute(sql, params).fetchall()
+
+        return [
+            {
+                "position": position,
+                "product_id": product_id,
+                "status": item_status,
+                "suggestions": json.loads(suggestions) if suggestions else [],
+                "cached": bool(cached),
+                "error": error,
+                "duration_ms": duration_ms
+            }
+            for position, product_id, item_status, suggestions, cached, error, duration_ms in rows
+        ]
+
+
+# Singleton instance
+hts_job_service = HTSJobService()
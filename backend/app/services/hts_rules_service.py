@@ -0,0 +1,255 @@
+"""
+HTS rules service - declarative attribute rules compiled into a decision table
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import HTS_RULE_DECISIONS
+from app.models.product import Product, HTSCodeSuggestion
+from app.services.hts_schedule_service import hts_schedule_service
+
+# Product attributes a rule's "when" clause may test (values are matched as
+# case-insensitive substrings); "keywords" is matched separately against
+# the product's metadata keywords (exact, case-insensitive)
+RULE_ATTRIBUTES = (
+    "material_type",
+    "material_standard",
+    "category",
+    "subcategory",
+    "joint_type",
+    "body_design",
+    "product_code",
+)
+
+MAX_RULE_SUGGESTIONS = 3
+
+
+class RuleMatch(NamedTuple):
+    """Outcome of evaluating the rules for one product"""
+    suggestions: List[HTSCodeSuggestion]
+    confidence: float
+    rule_ids: List[str]
+
+
+NO_MATCH = RuleMatch([], 0.0, [])
+
+
+def product_attributes(product: Product) -> Dict[str, str]:
+    """Lower-cased attribute values the rules are evaluated against"""
+    return {
+        "material_type": product.specifications.material.type.lower(),
+        "material_standard": product.specifications.material.standard.lower(),
+        "category": product.metadata.category.lower(),
+        "subcategory": product.metadata.subcategory.lower(),
+        "joint_type": product.joint_type.lower(),
+        "body_design": product.body_design.lower(),
+        "product_code": product.product_code.lower(),
+    }
+
+
+class HTSRulesService:
+    """
+    Service answering HTS classifications from declarative rules
+
+    Each rule in HTS_RULES_FILE has a "when" clause (attribute -> accepted
+    substrings, plus optional "keywords") and the suggestions it implies.
+    At load the rules become bit positions and every attribute a decision
+    table column: for each distinct attribute value the set of rules it
+    satisfies is computed once and kept as a bitmask. Evaluating a product
+    is then one dict lookup and an AND per attribute, and the merged
+    suggestions for each resulting rule set are memoized as well.
+
+    When several rules match, a code keeps the highest confidence any of
+    them gives it. Classifications whose best confidence reaches
+    HTS_RULES_CONFIDENCE_THRESHOLD skip the LLM entirely.
+    """
+
+    def __init__(self):
+        self.enabled = settings.HTS_RULES_ENABLED
+        self.threshold = settings.HTS_RULES_CONFIDENCE_THRESHOLD
+        self.rules_file = Path(settings.DATA_DIR) / settings.HTS_RULES_FILE
+        self._lock = threading.Lock()
+        self._rules: Optional[List[Dict[str, Any]]] = None
+        self._all_mask = 0
+        self._conditions: Dict[str, List[Tuple[Tuple[str, ...], int]]] = {}
+        self._wildcards: Dict[str, int] = {}
+        self._keyword_bits: Dict[str, int] = {}
+        self._keyword_wildcard = 0
+        self._value_masks: Dict[str, Dict[str, int]] = {}
+        self._matches: Dict[int, RuleMatch] = {}
+        self.answered = 0
+        self.escalated = 0
+
+    def _load_rules(self) -> None:
+        """Read the rules file and compile it into the decision table"""
+        if self._rules is not None:
+            return
+
+        with self._lock:
+            if self._rules is not None:
+                return
+
+            rules = []
+            if self.rules_file.exists():
+                try:
+                    with open(self.rules_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    rules = data.get("rules", []) if isinstance(data, dict) else data
+                    rules = [self._compile_rule(rule) for rule in rules]
+                except Exception as e:
+                    raise RuntimeError(f"Failed to load HTS rules: {str(e)}")
+            else:
+                print(f"HTS rules file not found: {self.rules_file} (every classification uses the LLM)")
+
+            self._conditions = {attribute: [] for attribute in RULE_ATTRIBUTES}
+            self._wildcards = {attribute: 0 for attribute in RULE_ATTRIBUTES}
+            self._keyword_bits = {}
+            self._keyword_wildcard = 0
+
+            for position, rule in enumerate(rules):
+                bit = 1 << position
+                for attribute in RULE_ATTRIBUTES:
+                    patterns = rule["when"].get(attribute)
+                    if patterns:
+                        self._conditions[attribute].append((patterns, bit))
+                    else:
+                        self._wildcards[attribute] |= bit
+                keywords = rule["when"].get("keywords")
+                if keywords:
+                    for keyword in keywords:
+                        self._keyword_bits[keyword] = self._keyword_bits.get(keyword, 0) | bit
+                else:
+                    self._keyword_wildcard |= bit
+
+            self._all_mask = (1 << len(rules)) - 1
+            self._value_masks = {attribute: {} for attribute in RULE_ATTRIBUTES}
+            self._matches = {}
+            self._rules = rules
+
+    def _compile_rule(self, rule: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalize one rule and build its suggestion objects"""
+        when = rule.get("when", {})
+        unknown = set(when) - set(RULE_ATTRIBUTES) - {"keywords"}
+        if unknown:
+            raise ValueError(f"Rule {rule.get('id')} tests unknown attributes: {sorted(unknown)}")
+
+        suggestions = []
+        for item in rule.get("suggestions", []):
+            suggestion = HTSCodeSuggestion(**item)
+            validation = hts_schedule_service.validate(suggestion.code)
+            if validation["schedule_loaded"] and not validation["is_valid"]:
+                print(f"HTS rule {rule.get('id')} suggests {suggestion.code}, which is not in the schedule")
+            suggestions.append(suggestion)
+
+        return {
+            "id": rule.get("id", ""),
+            "when": {
+                attribute: tuple(str(value).lower() for value in values)
+                for attribute, values in when.items()
+            },
+            "suggestions": suggestions,
+            # More specific rules are listed first when several match
+            "specificity": len(when),
+        }
+
+    def preload(self, products: Optional[List[Product]] = None) -> None:
+        """Compile the rules and fill the decision table for known products"""
+        self._load_rules()
+        for product in products or []:
+            self._mask_for(product)
+
+    def _value_mask(self, attribute: str, value: str) -> int:
+        """Rules satisfied by one attribute value (computed once per distinct value)"""
+        column = self._value_masks[attribute]
+        mask = column.get(value)
+        if mask is None:
+            mask = self._wildcards[attribute]
+            for patterns, bit in self._conditions[attribute]:
+                if any(pattern in value for pattern in patterns):
+                    mask |= bit
+            column[value] = mask
+        return mask
+
+    def _mask_for(self, product: Product) -> int:
+        """Bitmask of the rules a product satisfies"""
+        attributes = product_attributes(product)
+        mask = self._all_mask
+        for attribute in RULE_ATTRIBUTES:
+            mask &= self._value_mask(attribute, attributes[attribute])
+            if not mask:
+                return 0
+
+        keyword_mask = self._keyword_wildcard
+        for keyword in product.metadata.keywords:
+            keyword_mask |= self._keyword_bits.get(keyword.lower(), 0)
+        return mask & keyword_mask
+
+    def _match_for_mask(self, mask: int) -> RuleMatch:
+        """Merged suggestions of a set of rules (memoized per rule set)"""
+        match = self._matches.get(mask)
+        if match is not None:
+            return match
+
+        matched = [rule for position, rule in enumerate(self._rules) if mask >> position & 1]
+        matched.sort(key=lambda rule: -rule["specificity"])
+
+        best: Dict[str, HTSCodeSuggestion] = {}
+        for rule in matched:
+            for suggestion in rule["suggestions"]:
+                current = best.get(suggestion.code)
+                if current is None or suggestion.confidence > current.confidence:
+                    best[suggestion.code] = suggestion
+
+        suggestions = sorted(best.values(), key=lambda suggestion: -suggestion.confidence)[:MAX_RULE_SUGGESTIONS]
+        match = RuleMatch(
+            suggestions=suggestions,
+            confidence=suggestions[0].confidence if suggestions else 0.0,
+            rule_ids=[rule["id"] for rule in matched]
+        )
+        self._matches[mask] = match
+        return match
+
+    def evaluate(self, product: Product) -> RuleMatch:
+        """Suggestions of every rule the product matches, best first"""
+        self._load_rules()
+        mask = self._mask_for(product)
+        if not mask:
+            return NO_MATCH
+        return self._match_for_mask(mask)
+
+    def classify(self, product: Product) -> Optional[List[HTSCodeSuggestion]]:
+        """Rule suggestions if they are confident enough to skip the LLM, else None"""
+        if not self.enabled:
+            return None
+
+        match = self.evaluate(product)
+        if match.suggestions and match.confidence >= self.threshold:
+            self.answered += 1
+            HTS_RULE_DECISIONS.labels("answered").inc()
+            return list(match.suggestions)
+
+        self.escalated += 1
+        HTS_RULE_DECISIONS.labels("escalated").inc()
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._load_rules()
+        decisions = self.answered + self.escalated
+        return {
+            "enabled": self.enabled,
+            "rules": len(self._rules),
+            "confidence_threshold": self.threshold,
+            "answered": self.answered,
+            "escalated": self.escalated,
+            "answer_rate": round(self.answered / decisions, 4) if decisions else 0.0,
+            "distinct_values": {attribute: len(column) for attribute, column in self._value_masks.items()},
+            "rule_sets": len(self._matches)
+        }
+
+
+# Singleton instance
+hts_rules_service = HTSRulesService()
@@ -0,0 +1,275 @@
+"""
+HTS schedule service - local tariff schedule index for code validation and lookup
+"""
+
+import csv
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+
+# Hierarchy level by number of digits in a code
+LEVELS = {
+    2: "chapter",
+    4: "heading",
+    6: "subheading",
+    8: "tariff_line",
+    10: "statistical_suffix",
+}
+
+CODE_PATTERN = re.compile(r'^\d+$')
+
+# Column names used by the USITC JSON and CSV exports
+CODE_COLUMNS = ("htsno", "HTS Number")
+INDENT_COLUMNS = ("indent", "Indent")
+DESCRIPTION_COLUMNS = ("description", "Description")
+# Set on excerpt entries whose next-level child codes are all listed
+COMPLETE_COLUMNS = ("children_complete",)
+
+
+def normalize_hts_code(hts_code: str) -> Optional[str]:
+    """Digits of an HTS code (dots and spaces stripped), or None if malformed"""
+    digits = re.sub(r'[.\s]', '', hts_code or '')
+    if not CODE_PATTERN.match(digits) or len(digits) not in LEVELS:
+        return None
+    return digits
+
+
+def format_hts_code(digits: str) -> str:
+    """Dotted form of a code: 7307, 7307.19, 7307.19.30, 7307.19.3000"""
+    if len(digits) <= 4:
+        return digits
+    parts = [digits[:4], digits[4:6], digits[6:]]
+    return ".".join(part for part in parts if part)
+
+
+class _TrieNode:
+    __slots__ = ("children", "entry")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.entry: Optional[Dict[str, Any]] = None
+
+
+class HTSScheduleService:
+    """
+    Service for looking up codes in the local HTS schedule
+
+    The schedule is held as a digit trie, so existence checks and the
+    chapter/heading/subheading resolution of a code walk at most ten nodes.
+    The bundled file is an excerpt covering the chapters this catalog uses;
+    entries marked "children_complete" list all of their next-level codes.
+    Point HTS_SCHEDULE_FILE at a full USITC JSON or CSV export (with
+    HTS_SCHEDULE_COMPLETE) for complete coverage.
+    """
+
+    def __init__(self):
+        self.schedule_file = Path(settings.DATA_DIR) / settings.HTS_SCHEDULE_FILE
+        self.complete = settings.HTS_SCHEDULE_COMPLETE
+        self._root: Optional[_TrieNode] = None
+        self._entry_count = 0
+
+    def _load_schedule(self) -> None:
+        """Load the schedule file into the trie"""
+        if self._root is not None:
+            return
+
+        root = _TrieNode()
+        count = 0
+        if self.schedule_file.exists():
+            try:
+                for row in self._read_rows():
+                    code = self._column(row, CODE_COLUMNS)
+                    digits = normalize_hts_code(code) if code else None
+                    # Rows without a number are group captions ("Cast fittings:")
+                    if digits is None:
+                        continue
+                    node = root
+                    for digit in digits:
+                        node = node.children.setdefault(digit, _TrieNode())
+                    if node.entry is None:
+                        count += 1
+                    node.entry = {
+                        "code": format_hts_code(digits),
+                        "level": LEVELS[len(digits)],
+                        "indent": int(self._column(row, INDENT_COLUMNS) or 0),
+                        "description": (self._column(row, DESCRIPTION_COLUMNS) or "").strip().rstrip(":"),
+                        "children_complete": (self._column(row, COMPLETE_COLUMNS) or "").lower() in ("1", "true", "yes")
+                    }
+            except Exception as e:
+                raise RuntimeError(f"Failed to load HTS schedule: {str(e)}")
+        else:
+            print(f"HTS schedule file not found: {self.schedule_file} (validation is format-only)")
+
+        self._root = root
+        self._entry_count = count
+
+    def _read_rows(self) -> Iterable[Dict[str, Any]]:
+        if self.schedule_file.suffix.lower() == ".csv":
+            with open(self.schedule_file, 'r', encoding='utf-8-sig', newline='') as f:
+                yield from csv.DictReader(f)
+            return
+
+        with open(self.schedule_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        yield from (data.get("entries", []) if isinstance(data, dict) else data)
+
+    @staticmethod
+    def _column(row: Dict[str, Any], names) -> Optional[str]:
+        for name in names:
+            value = row.get(name)
+            if value not in (None, ""):
+                return str(value)
+        return None
+
+    def preload(self) -> None:
+        """Build the index eagerly (e.g. in a pre-fork parent process)"""
+        self._load_schedule()
+
+    @property
+    def loaded(self) -> bool:
+        """Whether a schedule with at least one code is available"""
+        self._load_schedule()
+        return self._entry_count > 0
+
+    def _walk(self, digits: str) -> List[_TrieNode]:
+        """Nodes along the path of a code, stopping where the schedule ends"""
+        self._load_schedule()
+        path = []
+        node = self._root
+        for digit in digits:
+            node = node.children.get(digit)
+            if node is None:
+                break
+            path.append(node)
+        return path
+
+    def lookup(self, hts_code: str) -> Optional[Dict[str, Any]]:
+        """Schedule entry for an exact code, or None"""
+        digits = normalize_hts_code(hts_code)
+        if digits is None:
+            return None
+        path = self._walk(digits)
+        if len(path) != len(digits):
+            return None
+        return path[-1].entry
+
+    def validate(self, hts_code: str) -> Dict[str, Any]:
+        """
+        Check a code against the schedule and resolve its hierarchy
+
+        A code is valid when it is in the schedule. A code the schedule does
+        not list is rejected when its chapter is missing, or when the deepest
+        listed entry above it declares its children complete (7307.19.50,
+        since 7307.19 lists all of .30 and .90). Anywhere else the excerpt
+        simply stops above the code, which is kept as valid but flagged
+        "unverified".
+        """
+        result: Dict[str, Any] = {
+            "hts_code": hts_code,
+            "is_valid": False,
+            "format": "NNNN.NN.NNNN"
+        }
+
+        digits = normalize_hts_code(hts_code)
+        if digits is None:
+            result["error"] = "HTS code must be 2, 4, 6, 8 or 10 digits (e.g., 7307.19.3000)"
+            return result
+
+        result["normalized"] = format_hts_code(digits)
+
+        if not self.loaded:
+            # Without a schedule only the format can be checked
+            result["is_valid"] = len(digits) == 10
+            result["schedule_loaded"] = False
+            if not result["is_valid"]:
+                result["error"] = "HTS code must be in format NNNN.NN.NNNN (e.g., 7307.99.1000)"
+            return result
+
+        path = self._walk(digits)
+        hierarchy = {}
+        deepest = None
+        for node in path:
+            if node.entry is not None:
+                hierarchy[node.entry["level"]] = {
+                    "code": node.entry["code"],
+                    "description": node.entry["description"]
+                }
+                deepest = node
+
+        exact = len(path) == len(digits) and path[-1].entry is not None
+        # Exports do not always carry chapter rows: any listed code in the chapter counts
+        chapter_listed = len(path) >= 2
+        # The deepest listed entry above the code vouches for its children
+        contradicted = not exact and (
+            not chapter_listed or (deepest is not None and (self.complete or deepest.entry["children_complete"]))
+        )
+
+        result["is_valid"] = not contradicted
+        result["unverified"] = not exact and not contradicted
+        result["schedule_loaded"] = True
+        result["matched_level"] = deepest.entry["level"] if deepest else None
+        result["description"] = deepest.entry["description"] if deepest else None
+        result["hierarchy"] = hierarchy
+        if result["unverified"]:
+            result["note"] = f"Not listed in the loaded schedule below {deepest.entry['code']}; code kept unverified"
+        elif not chapter_listed:
+            result["error"] = f"Chapter {digits[:2]} is not in the HTS schedule"
+        elif contradicted:
+            result["error"] = f"Code not found in HTS schedule; closest match is {deepest.entry['code']}"
+        return result
+
+    def similar_codes(self, hts_code: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Codes from neighbouring nodes: siblings and children of the deepest
+        match first, widening one level at a time until `limit` are found
+        """
+        digits = normalize_hts_code(hts_code)
+        if digits is None or not self.loaded:
+            return []
+
+        path = [self._root] + self._walk(digits)
+        own_code = format_hts_code(digits)
+        similar: List[Dict[str, Any]] = []
+        # The code itself and its own chapter/heading/subheading are not "similar"
+        seen = {own_code} | {node.entry["code"] for node in path if node.entry is not None}
+
+        # Start at the parent of an exact match (or the deepest node reached
+        # for an unknown code) and move up
+        ancestors = path[:-1] if len(path) == len(digits) + 1 else path
+        for ancestor in reversed(ancestors):
+            for entry in self._subtree_entries(ancestor):
+                if entry["code"] in seen:
+                    continue
+                seen.add(entry["code"])
+                similar.append({"code": entry["code"], "description": entry["description"]})
+                if len(similar) >= limit:
+                    return similar
+        return similar
+
+    @staticmethod
+    def _subtree_entries(node: _TrieNode) -> Iterable[Dict[str, Any]]:
+        """Entries under a node, shallowest first, in code order"""
+        level = [node]
+        while level:
+            next_level = []
+            for current in level:
+                for digit in sorted(current.children):
+                    child = current.children[digit]
+                    if child.entry is not None:
+                        yield child.entry
+                    next_level.append(child)
+            level = next_level
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "schedule_file": str(self.schedule_file),
+            "loaded": self.loaded,
+            "codes": self._entry_count
+        }
+
+
+# Singleton instance
+hts_schedule_service = HTSScheduleService()
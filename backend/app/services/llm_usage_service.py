@@ -0,0 +1,213 @@
+"""
+LLM usage service - per-call accounting and per-minute request/token budgets
+"""
+
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import LLM_BUDGET_USAGE, LLM_CALL_DURATION, LLM_CALLS, LLM_TOKENS
+
+BUDGET_WINDOW_SECONDS = 60.0
+
+# Cache status of the request an LLM call serves: "miss" (looked up, not
+# found), "bypass" (refresh requested) or "none" (operation is not cached).
+# Set by the service entry points; tasks inherit it, so nested calls see it.
+llm_cache_status: ContextVar[str] = ContextVar("llm_cache_status", default="none")
+
+
+class LLMBudgetExceededError(RuntimeError):
+    """Raised instead of calling the provider when the per-minute budget is spent"""
+
+
+class LLMCall(NamedTuple):
+    """A single accounted LLM call"""
+    timestamp: float
+    operation: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency_ms: int
+    outcome: str  # ok, parse_error, error, shed or fallback
+    cache: str
+
+
+class LLMUsageService:
+    """
+    Service accounting every LLM call and enforcing per-minute budgets
+
+    Admission reserves one request and the call's worst-case tokens (prompt
+    estimate plus max_tokens, which is also what providers count against
+    rate limits) in a sliding one-minute window; the reservation is
+    corrected to the actual usage once the call returns. A call that would
+    exceed LLM_REQUESTS_PER_MINUTE or LLM_TOKENS_PER_MINUTE is shed. Past
+    LLM_BUDGET_DEGRADE_RATIO of either budget the service reports itself
+    degraded so callers can drop optional calls first.
+    """
+
+    def __init__(self):
+        self.requests_per_minute = settings.LLM_REQUESTS_PER_MINUTE
+        self.tokens_per_minute = settings.LLM_TOKENS_PER_MINUTE
+        self.degrade_ratio = settings.LLM_BUDGET_DEGRADE_RATIO
+        self._lock = threading.Lock()
+        # Admitted calls in the budget window: [timestamp, tokens]
+        self._window: Deque[List[float]] = deque()
+        self._window_tokens = 0.0
+        self._recent: Deque[LLMCall] = deque(maxlen=settings.LLM_USAGE_RECENT_CALLS)
+        self._totals: Dict[Tuple[str, str, str], Dict[str, float]] = {}
+        self._cache: Dict[Tuple[str, str], int] = {}
+
+    def _prune(self, now: float) -> None:
+        while self._window and self._window[0][0] <= now - BUDGET_WINDOW_SECONDS:
+            self._window_tokens -= self._window.popleft()[1]
+
+    def _usage_ratio(self) -> float:
+        ratios = [0.0]
+        if self.requests_per_minute > 0:
+            ratios.append(len(self._window) / self.requests_per_minute)
+        if self.tokens_per_minute > 0:
+            ratios.append(self._window_tokens / self.tokens_per_minute)
+        return max(ratios)
+
+    def _export_budget(self) -> None:
+        LLM_BUDGET_USAGE.labels("requests").set(len(self._window))
+        LLM_BUDGET_USAGE.labels("tokens").set(self._window_tokens)
+
+    def admit(self, operation: str, model: str, estimated_tokens: int) -> List[float]:
+        """Reserve budget for one call; raises LLMBudgetExceededError when it is spent"""
+        with self._lock:
+            now = time.time()
+            self._prune(now)
+            over_requests = self.requests_per_minute > 0 and len(self._window) + 1 > self.requests_per_minute
+            over_tokens = (self.tokens_per_minute > 0
+                           and self._window_tokens + estimated_tokens > self.tokens_per_minute)
+            if over_requests or over_tokens:
+                shed = True
+            else:
+                shed = False
+                reservation = [now, float(estimated_tokens)]
+                self._window.append(reservation)
+                self._window_tokens += estimated_tokens
+            self._export_budget()
+
+        if shed:
+            self.record(operation, model, 0, 0, 0.0, "shed")
+            kind = "request" if over_requests else "token"
+            raise LLMBudgetExceededError(f"LLM {kind} budget per minute exhausted")
+        return reservation
+
+    def settle(self, reservation: List[float], actual_tokens: Optional[int]) -> None:
+        """Replace a reservation's worst-case tokens with the tokens actually used"""
+        if actual_tokens is None:
+            return
+        with self._lock:
+            # Already aged out of the window: nothing left to correct
+            if reservation[0] > time.time() - BUDGET_WINDOW_SECONDS:
+                self._window_tokens += actual_tokens - reservation[1]
+                reservation[1] = float(actual_tokens)
+                self._export_budget()
+
+    def release(self, reservation: List[float]) -> None:
+        """Return the reservation of a call that never reached the provider"""
+        with self._lock:
+            try:
+                self._window.remove(reservation)
+            except ValueError:
+                # Already aged out of the window
+                return
+            self._window_tokens -= reservation[1]
+            self._export_budget()
+
+    @property
+    def degraded(self) -> bool:
+        """Whether usage is past the degrade ratio of either per-minute budget"""
+        with self._lock:
+            self._prune(time.time())
+            return self._usage_ratio() >= self.degrade_ratio
+
+    def record(self, operation: str, model: str, prompt_tokens: int, completion_tokens: int,
+               latency_seconds: float, outcome: str) -> None:
+        """Account one call (or one fallback answer, with no model and no tokens)"""
+        cache = llm_cache_status.get()
+        call = LLMCall(
+            timestamp=time.time(),
+            operation=operation,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_ms=int(latency_seconds * 1000),
+            outcome=outcome,
+            cache=cache
+        )
+        with self._lock:
+            self._recent.append(call)
+            totals = self._totals.setdefault((operation, model, outcome), {
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "latency_seconds_total": 0.0, "latency_seconds_max": 0.0
+            })
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["latency_seconds_total"] += latency_seconds
+            totals["latency_seconds_max"] = max(totals["latency_seconds_max"], latency_seconds)
+            self._cache[(operation, cache)] = self._cache.get((operation, cache), 0) + 1
+
+        LLM_CALLS.labels(operation, model, outcome).inc()
+        if prompt_tokens:
+            LLM_TOKENS.labels(operation, model, "prompt").inc(prompt_tokens)
+        if completion_tokens:
+            LLM_TOKENS.labels(operation, model, "completion").inc(completion_tokens)
+        if outcome in ("ok", "parse_error", "error"):
+            LLM_CALL_DURATION.labels(operation, model).observe(latency_seconds)
+
+    def record_cache_hit(self, operation: str) -> None:
+        """Count a request answered from a cache without any LLM call"""
+        with self._lock:
+            self._cache[(operation, "hit")] = self._cache.get((operation, "hit"), 0) + 1
+
+    def get_stats(self, recent: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            self._prune(time.time())
+            totals = [
+                {
+                    "operation": operation,
+                    "model": model,
+                    "outcome": outcome,
+                    "calls": int(values["calls"]),
+                    "prompt_tokens": int(values["prompt_tokens"]),
+                    "completion_tokens": int(values["completion_tokens"]),
+                    "latency_seconds_avg": round(values["latency_seconds_total"] / values["calls"], 4),
+                    "latency_seconds_max": round(values["latency_seconds_max"], 4)
+                }
+                for (operation, model, outcome), values in sorted(self._totals.items())
+            ]
+            cache: Dict[str, Dict[str, int]] = {}
+            for (operation, status), count in sorted(self._cache.items()):
+                cache.setdefault(operation, {})[status] = count
+            budget = {
+                "window_seconds": BUDGET_WINDOW_SECONDS,
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "requests_in_window": len(self._window),
+                "tokens_in_window": int(self._window_tokens),
+                "usage_ratio": round(self._usage_ratio(), 4),
+                "degrade_ratio": self.degrade_ratio
+            }
+            budget["degraded"] = budget["usage_ratio"] >= self.degrade_ratio
+            recent_calls = [call._asdict() for call in list(self._recent)[-recent:]] if recent > 0 else []
+
+        return {
+            "totals": totals,
+            "prompt_tokens": sum(row["prompt_tokens"] for row in totals),
+            "completion_tokens": sum(row["completion_tokens"] for row in totals),
+            "cache": cache,
+            "budget": budget,
+            "recent_calls": recent_calls
+        }
+
+
+# Singleton instance
+llm_usage_service = LLMUsageService()
@@ -2,14 +2,84 @@
 OpenAI service - handles AI-powered search and HTS code generation
 """
 
+import asyncio
 import json
 import time
-from typing import List, Dict, Any, Optional
+from contextlib import AsyncExitStack, nullcontext
+from itertools import islice
+from typing import List, Dict, Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Iterator, Optional, Tuple
 from datetime import datetime
 
-from app.models.product import Product, HTSCodeSuggestion, SearchResult
-from app.core.security import get_openai_client
+from app.models.product import Product, HTSCodeSuggestion, HTSCodeResponse, SearchResult
+from app.core.admission import AdmissionRejectedError
+from app.core.config import settings
+from app.core.metrics import (
+    HTS_BATCH_ITEMS, HTS_SUGGESTIONS_CHECKED, LLM_CIRCUIT_STATE, LLM_HEDGES, LLM_RETRIES,
+    LLM_SHORT_CIRCUITED, LLM_SINGLEFLIGHT_CALLS
+)
+from app.core.resilience import CircuitBreaker, CircuitOpenError, Hedger, call_with_resilience
+from app.core.routing import LOW_CONFIDENCE, ModelRouter
+from app.core.security import get_openai_client, get_openai_semaphore
 from app.services.product_service import product_service
+from app.services.query_cache_service import query_cache_service
+from app.services.hts_cache_service import hts_cache_service
+from app.services.hts_index_service import hts_index_service
+from app.services.hts_rules_service import hts_rules_service
+from app.services.hts_schedule_service import hts_schedule_service
+from app.services.llm_usage_service import llm_cache_status, llm_usage_service
+from app.services.search_service import search_service
+from app.utils.helpers import estimate_tokens
+from app.utils.json_stream import JSONArrayStreamParser
+from app.utils.singleflight import SingleFlight
+
+try:
+    import openai
+    # Transient provider errors worth retrying (timeouts, connection resets, 429, 5xx)
+    RETRYABLE_ERRORS = (
+        asyncio.TimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    )
+except ImportError:
+    RETRYABLE_ERRORS = (asyncio.TimeoutError,)
+
+# Models tried cheapest first; answers are cached under the whole tier list so
+# changing the routing regenerates them
+HTS_MODEL_TIERS = list(settings.HTS_MODEL_TIERS)
+HTS_MODEL = "+".join(HTS_MODEL_TIERS)
+HTS_SYSTEM_PROMPT = "You are an expert in HTS codes for industrial products. Return only valid JSON."
+# Bump whenever the HTS prompt templates (single or batched) or the checks applied
+# to their answers change so cached answers are regenerated
+HTS_PROMPT_VERSION = "2"
+# Match reason of results ranked by the model (local results explain their own match)
+AI_MATCH_REASON = "AI-enhanced match"
+
+
+class InvalidHTSCodesError(ValueError):
+    """Raised when none of the model's suggested codes are in the tariff schedule"""
+
+
+def hts_prompt_fields(product: Product) -> Dict[str, str]:
+    """Product fields that feed the HTS prompt (and therefore the cache key)"""
+    return {
+        "title": product.title,
+        "product_code": product.product_code,
+        "material_type": product.specifications.material.type,
+        "material_standard": product.specifications.material.standard,
+        "joint_type": product.joint_type,
+        "body_design": product.body_design,
+        "size_range": product.specifications.size_range,
+        "primary_standard": product.primary_standard,
+        "lining": product.construction.lining,
+        "coating_interior": product.construction.coating.interior,
+        "coating_exterior": product.construction.coating.exterior,
+    }
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a search query"""
+    return " ".join(query.lower().split())
 
 
 class OpenAIService:
@@ -17,42 +87,437 @@ class OpenAIService:
     
     def __init__(self):
         self.product_service = product_service
+        self._hts_flight = SingleFlight("hts", LLM_SINGLEFLIGHT_CALLS)
+        self._search_flight = SingleFlight("search", LLM_SINGLEFLIGHT_CALLS)
+        self.hts_router = ModelRouter("hts", HTS_MODEL_TIERS, {
+            InvalidHTSCodesError: "invalid_codes",
+            ValueError: "parse_error",  # Includes JSON decode and suggestion validation errors
+            TypeError: "parse_error"
+        })
+        # Codes last indexed per product (rule, cached and model answers), so repeats skip the write
+        self._indexed: Dict[str, Tuple[str, ...]] = {}
+        # Optional hook awaited before every provider request (e.g. a batch job's requests-per-minute cap)
+        self.request_limiter: Optional[Callable[[], Awaitable[None]]] = None
+        self.breaker = CircuitBreaker(
+            "openai",
+            failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.CIRCUIT_BREAKER_RESET_SECONDS,
+            state_gauge=LLM_CIRCUIT_STATE
+        )
+        self.hedger = Hedger(
+            "openai",
+            percentile=settings.LLM_HEDGE_PERCENTILE,
+            max_rate=settings.LLM_HEDGE_MAX_RATE,
+            min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+            window=settings.LLM_HEDGE_WINDOW,
+            min_delay=settings.LLM_HEDGE_MIN_DELAY_SECONDS,
+            counter=LLM_HEDGES
+        )
+        # Route-level latency budgets each call's deadlines are derived from
+        self._budgets = {
+            "hts": settings.LLM_HTS_BUDGET_SECONDS,
+            "hts_stream": settings.LLM_HTS_BUDGET_SECONDS,
+            "search": settings.LLM_SEARCH_BUDGET_SECONDS,
+            "hts_batch": settings.LLM_HTS_BATCH_BUDGET_SECONDS
+        }
     
-    async def enhanced_search(self, query: str, limit: int = 10) -> List[SearchResult]:
-        """Use OpenAI to enhance search with natural language understanding"""
+    async def _chat_completion(self, operation: str, **kwargs):
+        """
+        Run a chat completion on the shared async client, bounded by the
+        per-minute usage budget, the concurrency gate, the operation's latency
+        budget and the circuit breaker
+        
+        With LLM_HEDGING_ENABLED each non-streamed attempt is hedged once it
+        is slower than usual for its operation and model, unless usage is near
+        the budget. Failed calls are accounted here; successful ones by the
+        caller, which knows whether the answer parsed (see _complete_and_parse).
+        A stream is returned wrapped by _held_stream, which keeps the
+        concurrency slot and reports to the breaker until it is read or closed.
+        
+        Every provider request (first attempt, retry or hedge) reserves its
+        own share of the per-minute budget. A reservation is settled to the
+        reported usage, or to the prompt estimate for a request that failed
+        or lost a hedge; streamed answers keep their worst-case reservation.
+        Each one also waits on request_limiter when set; the first waits
+        before the latency budget starts.
+        """
+        client = get_openai_client()
+        model = kwargs["model"]
+        stream = bool(kwargs.get("stream"))
+        prompt_tokens = estimate_tokens(" ".join(message["content"] for message in kwargs["messages"]))
+        estimated_tokens = prompt_tokens + kwargs.get("max_tokens", 0)
+        if self.request_limiter is not None:
+            await self.request_limiter()
+        # The first request is admitted up front so an exhausted budget sheds before any retry logic
+        reservations = [llm_usage_service.admit(operation, model, estimated_tokens)]
+        deadline = time.monotonic() + self._budgets[operation]
+        
+        async def create(timeout: float):
+            if reservations:
+                reservation = reservations.pop()
+            else:
+                # Retries and hedges wait on the limiter like the first request did
+                if self.request_limiter is not None:
+                    await self.request_limiter()
+                reservation = llm_usage_service.admit(operation, model, estimated_tokens)
+            try:
+                response = await client.chat.completions.create(timeout=timeout, **kwargs)
+            except BaseException:
+                llm_usage_service.settle(reservation, prompt_tokens)
+                raise
+            if not stream and response.usage is not None:
+                llm_usage_service.settle(reservation, response.usage.total_tokens)
+            return response
+        
+        async def request(timeout: float):
+            semaphore = get_openai_semaphore()
+            if not stream:
+                async with semaphore:
+                    return await create(timeout)
+            
+            # The slot is handed over to _held_stream, which releases it
+            await semaphore.acquire()
+            try:
+                response = await create(timeout)
+            except BaseException:
+                semaphore.release()
+                raise
+            return self._held_stream(response, semaphore, deadline)
+        
+        hedge = settings.LLM_HEDGING_ENABLED and not stream
+        
+        async def attempt(timeout: float):
+            if not hedge:
+                return await request(timeout)
+            return await self.hedger.run(
+                f"{operation}:{model}", lambda: request(timeout), allow=not llm_usage_service.degraded
+            )
+        
+        start = time.perf_counter()
         try:
-            client = get_openai_client()
+            response = await call_with_resilience(
+                attempt,
+                breaker=self.breaker,
+                budget_seconds=self._budgets[operation],
+                max_attempts=settings.LLM_MAX_ATTEMPTS,
+                base_delay=settings.LLM_RETRY_BASE_DELAY_SECONDS,
+                max_delay=settings.LLM_RETRY_MAX_DELAY_SECONDS,
+                retryable=RETRYABLE_ERRORS,
+                on_retry=lambda attempt_number, error: LLM_RETRIES.labels(operation).inc(),
+                report_success=not stream
+            )
+        except Exception as e:
+            if isinstance(e, CircuitOpenError):
+                LLM_SHORT_CIRCUITED.labels(operation).inc()
+            llm_usage_service.record(operation, model, 0, 0, time.perf_counter() - start, "error")
+            raise
+        finally:
+            # Short-circuited before the first request was sent
+            for reservation in reservations:
+                llm_usage_service.release(reservation)
+        
+        return response
+    
+    async def _held_stream(self, stream, semaphore: asyncio.Semaphore, deadline: float) -> AsyncIterator[Any]:
+        """
+        Iterate a streamed completion, holding its concurrency slot until it ends
+        
+        The operation's latency budget covers the whole stream, not just its
+        first byte. The outcome goes to the breaker when the stream ends: a
+        provider error or a stream outlasting the budget is a failure, a
+        stream read to its end (or closed once the reader has what it needs)
+        a success, and a cancelled reader neither.
+        """
+        chunks = stream.__aiter__()
+        outcome = "released"
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError("Stream exceeded its latency budget")
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+                yield chunk
+            outcome = "success"
+        except GeneratorExit:
+            outcome = "success"
+            raise
+        except RETRYABLE_ERRORS:
+            outcome = "failure"
+            raise
+        finally:
+            try:
+                await stream.close()
+            finally:
+                semaphore.release()
+                if outcome == "success":
+                    self.breaker.record_success()
+                elif outcome == "failure":
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release_probe()
+    
+    async def _complete_and_parse(self, operation: str, parse: Callable[[str], Any], **kwargs) -> Tuple[Any, Any]:
+        """
+        Run a completion and parse its text; returns (parsed, usage)
+        
+        The call is accounted with its tokens, latency and whether the answer
+        parsed. Parse errors are re-raised with the call's usage attached.
+        """
+        start = time.perf_counter()
+        response = await self._chat_completion(operation, **kwargs)
+        usage = response.usage
+        outcome = "ok"
+        try:
+            return parse(response.choices[0].message.content.strip()), usage
+        except Exception as e:
+            outcome = "parse_error"
+            e.usage = usage
+            raise
+        finally:
+            llm_usage_service.record(
+                operation, kwargs["model"],
+                getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0,
+                time.perf_counter() - start, outcome
+            )
+    
+    async def enhanced_search(self, query: str, limit: int = 10, fanout: bool = False,
+                              admission: Optional[AsyncContextManager] = None) -> List[SearchResult]:
+        """
+        Use OpenAI to enhance search with natural language understanding
+        
+        By default the model reranks the top local candidates; with `fanout`
+        it ranks the whole catalog in parallel chunks instead. A ranking that
+        needs the model is made inside `admission`; when that sheds the
+        request the local ranking is returned.
+        """
+        namespace = "fanout" if fanout else "rank"
+        try:
+            # Same or near-duplicate queries reuse an earlier ranking; identical
+            # concurrent queries share one retrieve + rerank call
+            product_ids = query_cache_service.get(query, namespace)
+            if product_ids is not None:
+                llm_usage_service.record_cache_hit("search")
+            elif llm_usage_service.degraded:
+                # Reranking is optional: near the usage budget it is the first to go
+                product_ids = []
+            else:
+                llm_cache_status.set("miss")
+                async with admission or nullcontext():
+                    product_ids = await self._search_flight.do(
+                        f"{namespace}:{normalize_query(query)}", lambda: self._rank_and_remember(query, fanout)
+                    )
             
-            # Get all products for context
-            products = self.product_service.get_all_products()
+            # Build results
+            results = []
+            for product_id in product_ids:
+                product = self.product_service.get_product_by_id(product_id)
+                if product:
+                    results.append(SearchResult(
+                        product=product,
+                        score=100 - (len(results) * 5),  # Decreasing score by rank
+                        match_reason=AI_MATCH_REASON
+                    ))
+                if len(results) >= limit:
+                    break
             
-            # Create a simplified product list for AI processing
-            product_summaries = []
-            for product in products:
-                summary = {
-                    "id": product.id,
-                    "title": product.title,
-                    "product_code": product.product_code,
-                    "joint_type": product.joint_type,
-                    "body_design": product.body_design,
-                    "size_range": product.specifications.size_range,
-                    "keywords": product.metadata.keywords[:5]  # Limit keywords
-                }
-                product_summaries.append(summary)
+            if results:
+                return results
             
-            # Create prompt for AI search
-            prompt = f"""
+        except AdmissionRejectedError:
+            pass
+        except Exception as e:
+            print(f"OpenAI search error: {e}")
+        
+        # Fallback to basic search
+        llm_usage_service.record("search", "", 0, 0, 0.0, "fallback")
+        results, _ = search_service.search_products(query, limit)
+        return results
+    
+    async def _rank_and_remember(self, query: str, fanout: bool = False) -> List[str]:
+        """Rank products for a query and cache the ranking if the model produced it"""
+        if fanout:
+            product_ids, ranked = await self._rank_fanout(query)
+        else:
+            product_ids, ranked = await self._rank_products(query)
+        # A retrieval-order fallback is not worth reusing for similar queries
+        if ranked:
+            query_cache_service.put(query, product_ids, "fanout" if fanout else "rank")
+        return product_ids
+    
+    def _product_summary(self, product: Product) -> Dict[str, Any]:
+        """Compact product summary sent to the model for reranking"""
+        return {
+            "id": product.id,
+            "title": product.title,
+            "product_code": product.product_code,
+            "joint_type": product.joint_type,
+            "body_design": product.body_design,
+            "size_range": product.specifications.size_range,
+            "keywords": product.metadata.keywords[:5]  # Limit keywords
+        }
+    
+    def _chunk_summaries(self, products: List[Product], token_budget: int) -> Iterator[List[Dict[str, Any]]]:
+        """Split summaries, in order, into consecutive chunks of at most `token_budget` tokens each"""
+        summaries = []
+        used_tokens = 0
+        for product in products:
+            summary = self._product_summary(product)
+            cost = estimate_tokens(json.dumps(summary))
+            if summaries and used_tokens + cost > token_budget:
+                yield summaries
+                summaries = []
+                used_tokens = 0
+            summaries.append(summary)
+            used_tokens += cost
+        if summaries:
+            yield summaries
+    
+    def _pack_summaries(self, products: List[Product], token_budget: int) -> List[Dict[str, Any]]:
+        """Take summaries in rank order until the prompt token budget is spent"""
+        return next(self._chunk_summaries(products, token_budget), [])
+    
+    async def _rank_products(self, query: str) -> Tuple[List[str], bool]:
+        """
+        Retrieve-then-rerank: pick top-K candidates locally, then let the model
+        order only those, so prompt size is independent of catalog size
+        
+        Returns the ranked ids and whether the model ranked them.
+        """
+        candidates = search_service.retrieve_candidates(query, settings.AI_SEARCH_CANDIDATES)
+        if not candidates:
+            return [], False
+        
+        candidate_products = [product for product, _ in candidates]
+        product_summaries = self._pack_summaries(candidate_products, settings.AI_SEARCH_PROMPT_TOKEN_BUDGET)
+        ranked_ids = await self._rank_summaries(query, product_summaries)
+        if ranked_ids:
+            return ranked_ids, True
+        
+        # Model returned nothing usable: keep the local retrieval order
+        return [summary["id"] for summary in product_summaries], False
+    
+    async def _rank_fanout(self, query: str) -> Tuple[List[str], bool]:
+        """
+        Fan-out ranking: the model ranks the whole catalog in token-bounded chunks
+        
+        Products are ordered by local relevance (lexical matches first) and
+        split into prompt-sized chunks that are ranked concurrently, at most
+        AI_SEARCH_FANOUT_CONCURRENCY at a time, so wall time stays close to
+        one call while the chunks fit in a single wave. A chunk whose call
+        fails contributes its lexical matches in local order instead.
+        
+        Positions in different chunks are not comparable, so the top
+        AI_SEARCH_FANOUT_FINAL_TOP_K of every chunk are ranked against each
+        other by one final call; the rest (or everything, if that call fails)
+        follows the relevance-weighted merge of the chunk rankings.
+        
+        Returns the merged ids and whether the model ranked any chunk.
+        """
+        products = self.product_service.get_all_products()
+        local_scores = {
+            product.id: score
+            for product, score in search_service.retrieve_candidates(query, len(products))
+        }
+        # Stable sort: lexical matches by score, then the rest in catalog order
+        ordered = sorted(products, key=lambda product: -local_scores.get(product.id, 0.0))
+        chunks = list(islice(
+            self._chunk_summaries(ordered, settings.AI_SEARCH_PROMPT_TOKEN_BUDGET),
+            settings.AI_SEARCH_FANOUT_MAX_CHUNKS
+        ))
+        gate = asyncio.Semaphore(max(1, settings.AI_SEARCH_FANOUT_CONCURRENCY))
+        
+        async def rank_chunk(summaries: List[Dict[str, Any]]) -> Tuple[List[str], bool]:
+            async with gate:
+                try:
+                    return await self._rank_summaries(query, summaries), True
+                except Exception as e:
+                    print(f"OpenAI fan-out chunk error: {e}")
+                    return [summary["id"] for summary in summaries if summary["id"] in local_scores], False
+        
+        rankings = await asyncio.gather(*(rank_chunk(chunk) for chunk in chunks))
+        ranked = any(from_model for _, from_model in rankings)
+        merged = self._merge_rankings(rankings, local_scores)
+        
+        top_k = settings.AI_SEARCH_FANOUT_FINAL_TOP_K
+        finalists = {
+            product_id
+            for ranked_ids, from_model in rankings if from_model
+            for product_id in ranked_ids[:top_k]
+        }
+        if len(chunks) < 2 or len(finalists) < 2:
+            return merged, ranked
+        
+        # Finalists in merged order, so the prompt budget keeps the strongest
+        by_id = {product.id: product for product in products}
+        final_products = [by_id[product_id] for product_id in merged if product_id in finalists]
+        try:
+            final_ids = await self._rank_summaries(
+                query, self._pack_summaries(final_products, settings.AI_SEARCH_PROMPT_TOKEN_BUDGET)
+            )
+        except Exception as e:
+            print(f"OpenAI fan-out final ranking error: {e}")
+            return merged, ranked
+        if not final_ids:
+            return merged, ranked
+        
+        placed = set(final_ids)
+        return final_ids + [product_id for product_id in merged if product_id not in placed], ranked
+    
+    @staticmethod
+    def _merge_rankings(rankings: List[Tuple[List[str], bool]], local_scores: Dict[str, float]) -> List[str]:
+        """
+        Merge per-chunk rankings into one global order
+        
+        Model-ranked products come before locally ordered ones. Chunks are
+        weighted by their best local relevance and a product scores its
+        chunk's weight divided by its position in the chunk, so the head of a
+        chunk of lexical matches outranks the head of a chunk without any.
+        Ties go to the more relevant chunk, then the earlier position, then
+        the product id, so the merge is deterministic.
+        """
+        relevance = [
+            max((local_scores.get(product_id, 0.0) for product_id in ranked_ids), default=0.0)
+            for ranked_ids, _ in rankings
+        ]
+        chunk_order = {
+            chunk: order
+            for order, chunk in enumerate(sorted(range(len(rankings)), key=lambda chunk: (-relevance[chunk], chunk)))
+        }
+        keys: Dict[str, Tuple[int, float, int, int, str]] = {}
+        for chunk, (ranked_ids, from_model) in enumerate(rankings):
+            for position, product_id in enumerate(ranked_ids):
+                key = (
+                    0 if from_model else 1,
+                    -relevance[chunk] / (position + 1),
+                    chunk_order[chunk],
+                    position,
+                    product_id
+                )
+                if product_id not in keys or key < keys[product_id]:
+                    keys[product_id] = key
+        return sorted(keys, key=keys.__getitem__)
+    
+    async def _rank_summaries(self, query: str, product_summaries: List[Dict[str, Any]]) -> List[str]:
+        """Have the model rank one list of product summaries; returns only offered ids"""
+        # Create prompt for AI search
+        prompt = f"""
             Given this user search query: "{query}"
             
-            And this list of products: {json.dumps(product_summaries[:20])}  # Limit for token management
+            And this list of candidate products: {json.dumps(product_summaries)}
             
             Please identify the most relevant products and return a JSON array of product IDs ranked by relevance.
-            Consider natural language patterns, synonyms, and intent.
+            Consider natural language patterns, synonyms, and intent. Leave out products that do not match.
             
             Return only a JSON array of product IDs, like: ["product-id-1", "product-id-2"]
             """
-            
-            response = await client.chat.completions.create(
+        
+        try:
+            ranked_ids, _ = await self._complete_and_parse(
+                "search",
+                json.loads,
                 model="gpt-4o-mini",  # Use cheaper model for search
                 messages=[
                     {"role": "system", "content": "You are a product search assistant. Return only valid JSON."},
@@ -61,56 +526,33 @@ class OpenAIService:
                 max_tokens=500,
                 temperature=0.1
             )
-            
-            # Parse AI response
-            ai_response = response.choices[0].message.content.strip()
-            try:
-                product_ids = json.loads(ai_response)
-            except json.JSONDecodeError:
-                # Fallback to extracting IDs from response
-                product_ids = self._extract_product_ids(ai_response, products)
-            
-            # Build results
-            results = []
-            products_dict = {p.id: p for p in products}
-            
-            for i, product_id in enumerate(product_ids[:limit]):
-                if product_id in products_dict:
-                    results.append(SearchResult(
-                        product=products_dict[product_id],
-                        score=100 - (i * 5),  # Decreasing score by rank
-                        match_reason="AI-enhanced match"
-                    ))
-            
-            return results
-            
-        except Exception as e:
-            print(f"OpenAI search error: {e}")
-            # Fallback to basic search
-            from app.services.search_service import search_service
-            results, _ = search_service.search_products(query, limit)
-            return results
+        except json.JSONDecodeError as e:
+            # Fallback to extracting IDs from response
+            ranked_ids = self._extract_product_ids(e.doc, product_summaries)
+        
+        # Only accept IDs we actually offered, each once
+        offered = {summary["id"] for summary in product_summaries}
+        return [pid for pid in dict.fromkeys(ranked_ids) if isinstance(pid, str) and pid in offered]
     
-    async def generate_hts_codes(self, product: Product) -> List[HTSCodeSuggestion]:
-        """Generate HTS code suggestions for a product"""
-        try:
-            client = get_openai_client()
-            
-            # Create detailed product description for HTS analysis
-            product_info = f"""
-            Product: {product.title}
-            Product Code: {product.product_code}
-            Material: {product.specifications.material.type} ({product.specifications.material.standard})
-            Joint Type: {product.joint_type}
-            Body Design: {product.body_design}
-            Size Range: {product.specifications.size_range}
-            Primary Standard: {product.primary_standard}
+    def _build_hts_prompt(self, product: Product) -> str:
+        """Build the HTS classification prompt from the product's prompt fields"""
+        fields = hts_prompt_fields(product)
+        
+        # Create detailed product description for HTS analysis
+        product_info = f"""
+            Product: {fields['title']}
+            Product Code: {fields['product_code']}
+            Material: {fields['material_type']} ({fields['material_standard']})
+            Joint Type: {fields['joint_type']}
+            Body Design: {fields['body_design']}
+            Size Range: {fields['size_range']}
+            Primary Standard: {fields['primary_standard']}
             Application: Water and sewer pipe fittings
-            Construction: {product.construction.lining}
-            Coatings: Interior - {product.construction.coating.interior}, Exterior - {product.construction.coating.exterior}
+            Construction: {fields['lining']}
+            Coatings: Interior - {fields['coating_interior']}, Exterior - {fields['coating_exterior']}
             """
-            
-            prompt = f"""
+        
+        return f"""
             Based on the following product specification, suggest the most appropriate HTS (Harmonized Tariff Schedule) codes:
 
             {product_info}
@@ -131,58 +573,538 @@ class OpenAIService:
                 }}
             ]
             """
+    
+    def _parse_hts_suggestions(self, ai_response: str) -> List[HTSCodeSuggestion]:
+        """Parse the model's JSON array into suggestions (raises ValueError on bad output)"""
+        suggestions_data = json.loads(ai_response)
+        if not isinstance(suggestions_data, list):
+            raise ValueError("Expected a JSON array of suggestions")
+        return self._check_against_schedule([HTSCodeSuggestion(**item) for item in suggestions_data])
+    
+    def _check_against_schedule(self, suggestions: List[HTSCodeSuggestion]) -> List[HTSCodeSuggestion]:
+        """
+        Drop suggested codes the HTS schedule rules out (raises ValueError if none are left)
+        
+        Codes below where the loaded schedule stops cannot be checked and are
+        kept; only codes contradicted by the schedule's own listing are dropped.
+        """
+        checked = []
+        for suggestion in suggestions:
+            validation = hts_schedule_service.validate(suggestion.code)
+            if validation["is_valid"]:
+                HTS_SUGGESTIONS_CHECKED.labels("unverified" if validation.get("unverified") else "valid").inc()
+                checked.append(suggestion.model_copy(update={"code": validation["normalized"]}))
+            else:
+                HTS_SUGGESTIONS_CHECKED.labels("rejected").inc()
+                print(f"Rejected HTS suggestion {suggestion.code}: {validation.get('error')}")
+        
+        if suggestions and not checked:
+            raise InvalidHTSCodesError("None of the suggested HTS codes exist in the tariff schedule")
+        return checked
+    
+    async def _request_hts_codes(self, product: Product, model: str) -> Tuple[List[HTSCodeSuggestion], Any]:
+        """Ask one model for HTS codes; returns (suggestions, usage) and raises on provider or parse errors"""
+        return await self._complete_and_parse(
+            "hts",
+            self._parse_hts_suggestions,
+            model=model,
+            messages=[
+                {"role": "system", "content": HTS_SYSTEM_PROMPT},
+                {"role": "user", "content": self._build_hts_prompt(product)}
+            ],
+            max_tokens=1000,
+            temperature=0.2
+        )
+    
+    @staticmethod
+    def _confident_enough(suggestions: List[HTSCodeSuggestion]) -> bool:
+        """Whether an answer is good enough to stop at the current model tier"""
+        return max(suggestion.confidence for suggestion in suggestions) >= settings.HTS_ESCALATION_CONFIDENCE
+    
+    async def _route_hts_codes(self, product: Product, first_tier: int = 0) -> List[HTSCodeSuggestion]:
+        """Ask the model tiers in turn, escalating on low confidence, bad JSON or unknown codes"""
+        suggestions, _ = await self.hts_router.run(
+            lambda model: self._request_hts_codes(product, model),
+            accept=self._confident_enough,
+            first_tier=first_tier,
+            # Near the usage budget, settle for the first tier's answer
+            max_tiers=1 if llm_usage_service.degraded else None
+        )
+        return suggestions
+    
+    async def generate_hts_codes(self, product: Product) -> List[HTSCodeSuggestion]:
+        """Generate HTS code suggestions for a product"""
+        response = await self.classify_product(product, use_cache=False)
+        return response.suggestions
+    
+    async def classify_product(self, product: Product, use_cache: bool = True,
+                               admission: Optional[AsyncContextManager] = None) -> HTSCodeResponse:
+        """
+        Get HTS codes for a product from the rules, the persistent cache or the model
+        
+        The model is only called inside `admission`. When that sheds the
+        request the rule suggestions are returned at any confidence, or the
+        AdmissionRejectedError propagates if there are none.
+        """
+        rule_suggestions = hts_rules_service.classify(product)
+        if rule_suggestions:
+            return await self._rule_response(product, rule_suggestions)
+        
+        cache_key = hts_cache_service.make_key(hts_prompt_fields(product), HTS_MODEL, HTS_PROMPT_VERSION)
+        llm_cache_status.set("miss" if use_cache else "bypass")
+        
+        if use_cache:
+            cached = await asyncio.to_thread(hts_cache_service.get, cache_key)
+            if cached:
+                llm_usage_service.record_cache_hit("hts")
+                suggestions, generated_at = cached
+                await self._ensure_indexed(product.id, suggestions, generated_at)
+                return HTSCodeResponse(
+                    product_id=product.id,
+                    suggestions=suggestions,
+                    generated_at=generated_at,
+                    cached=True,
+                    source="cache"
+                )
+        
+        try:
+            async with admission or nullcontext():
+                return await self._classify_uncached(product, cache_key)
+        except AdmissionRejectedError:
+            suggestions = self._fallback_hts_codes(product)
+            if not suggestions:
+                raise
+            llm_usage_service.record("hts", "", 0, 0, 0.0, "fallback")
+            return HTSCodeResponse(
+                product_id=product.id,
+                suggestions=suggestions,
+                generated_at=datetime.now().isoformat(),
+                cached=False,
+                source="fallback"
+            )
+    
+    async def _classify_uncached(self, product: Product, cache_key: str, first_tier: int = 0) -> HTSCodeResponse:
+        """Classify with the model tiers, falling back to the rule suggestions on failure"""
+        # Concurrent requests for the same product content share one LLM call
+        suggestions, generated_at = await self._hts_flight.do(
+            cache_key, lambda: self._generate_and_cache(product, cache_key, first_tier)
+        )
+        
+        source = "llm"
+        if suggestions is None:
+            llm_usage_service.record("hts", "", 0, 0, 0.0, "fallback")
+            suggestions = self._fallback_hts_codes(product)
+            source = "fallback"
+        
+        return HTSCodeResponse(
+            product_id=product.id,
+            suggestions=suggestions,
+            generated_at=generated_at,
+            cached=False,
+            source=source
+        )
+    
+    async def _rule_response(self, product: Product, suggestions: List[HTSCodeSuggestion]) -> HTSCodeResponse:
+        """Answer from confident rule suggestions, keeping the code index current"""
+        generated_at = datetime.now().isoformat()
+        await self._ensure_indexed(product.id, suggestions, generated_at)
+        
+        return HTSCodeResponse(
+            product_id=product.id,
+            suggestions=suggestions,
+            generated_at=generated_at,
+            cached=False,
+            source="rules"
+        )
+    
+    async def _ensure_indexed(self, product_id: str, suggestions: List[HTSCodeSuggestion], generated_at: str) -> None:
+        """
+        Index a product's codes unless this process already indexed the same ones
+        
+        Cached answers are indexed when served, so answers cached before the
+        index existed (or by another deployment) become searchable by code.
+        The multi-row write runs in a thread, off the event loop.
+        """
+        codes = tuple(suggestion.code for suggestion in suggestions)
+        if self._indexed.get(product_id) != codes:
+            # Marked first so concurrent requests for the product do not write it twice
+            self._indexed[product_id] = codes
+            await asyncio.to_thread(hts_index_service.record, product_id, suggestions, generated_at)
+    
+    async def _generate_and_cache(self, product: Product, cache_key: str,
+                                  first_tier: int = 0) -> Tuple[Optional[List[HTSCodeSuggestion]], str]:
+        """Call the model and cache a successful answer; returns (None, ...) on failure"""
+        generated_at = datetime.now().isoformat()
+        try:
+            suggestions = await self._route_hts_codes(product, first_tier)
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"Failed to parse HTS response: {e}")
+            return None, generated_at
+        except Exception as e:
+            print(f"OpenAI HTS generation error: {e}")
+            return None, generated_at
+        
+        # Fallback answers are never stored so the next request retries the model
+        await self._store_classification(product, cache_key, suggestions, generated_at)
+        return suggestions, generated_at
+    
+    async def _store_classification(self, product: Product, cache_key: str,
+                                    suggestions: List[HTSCodeSuggestion], generated_at: str) -> None:
+        """Cache a model answer and add its codes to the code-to-product index"""
+        # SQLite can wait on another worker's write lock: keep it off the event loop
+        await asyncio.to_thread(
+            hts_cache_service.put,
+            cache_key, product.id, suggestions, HTS_MODEL, HTS_PROMPT_VERSION, generated_at
+        )
+        self._indexed[product.id] = tuple(suggestion.code for suggestion in suggestions)
+        await asyncio.to_thread(hts_index_service.record, product.id, suggestions, generated_at)
+    
+    async def stream_hts_codes(self, product: Product, use_cache: bool = True,
+                               admission: Optional[AsyncContextManager] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Yield ("meta" | "suggestion" | "done", payload) events for a product's HTS codes
+        
+        Confident rule answers and cached answers are replayed at once.
+        Otherwise the model's answer is streamed and each suggestion is
+        emitted as soon as its JSON object is complete and its code is in
+        the schedule. Suggestions already shown cannot be taken back, so a
+        tier escalates only when it produced nothing usable. The answer is
+        stored only if the stream finishes cleanly; if no tier yields
+        anything the fallback suggestions are emitted instead. `admission` is
+        entered before the first event: when it sheds the request the fallback
+        suggestions are streamed, or the AdmissionRejectedError propagates
+        from the first step if there are none.
+        """
+        rule_suggestions = hts_rules_service.classify(product)
+        if rule_suggestions:
+            response = await self._rule_response(product, rule_suggestions)
+            yield "meta", {"product_id": product.id, "generated_at": response.generated_at, "cached": False}
+            for suggestion in response.suggestions:
+                yield "suggestion", suggestion.model_dump()
+            yield "done", {"product_id": product.id, "count": len(response.suggestions), "source": "rules"}
+            return
+        
+        cache_key = hts_cache_service.make_key(hts_prompt_fields(product), HTS_MODEL, HTS_PROMPT_VERSION)
+        llm_cache_status.set("miss" if use_cache else "bypass")
+        
+        if use_cache:
+            cached = await asyncio.to_thread(hts_cache_service.get, cache_key)
+            if cached:
+                llm_usage_service.record_cache_hit("hts_stream")
+                suggestions, generated_at = cached
+                await self._ensure_indexed(product.id, suggestions, generated_at)
+                yield "meta", {"product_id": product.id, "generated_at": generated_at, "cached": True}
+                for suggestion in suggestions:
+                    yield "suggestion", suggestion.model_dump()
+                yield "done", {"product_id": product.id, "count": len(suggestions), "source": "cache"}
+                return
+        
+        tiers = list(enumerate(HTS_MODEL_TIERS))
+        slot = AsyncExitStack()
+        try:
+            # Admitted before the first event, so a shed request can still be answered with a 429
+            await slot.enter_async_context(admission or nullcontext())
+        except AdmissionRejectedError:
+            if not self._fallback_hts_codes(product):
+                raise
+            # Shed before any model call: the fallback suggestions are emitted below
+            tiers = []
+        
+        suggestions = []
+        complete = False
+        async with slot:
+            generated_at = datetime.now().isoformat()
+            yield "meta", {"product_id": product.id, "generated_at": generated_at, "cached": False}
             
-            response = await client.chat.completions.create(
-                model="gpt-4o",  # Use more capable model for HTS codes
+            for position, model in tiers:
+                start = time.perf_counter()
+                reason = "invalid_codes"
+                try:
+                    async for suggestion in self._stream_hts_suggestions(product, model):
+                        suggestions.append(suggestion)
+                        yield "suggestion", suggestion.model_dump()
+                    complete = True
+                except (ValueError, TypeError) as e:
+                    print(f"Unusable HTS stream from {model}: {e}")
+                    reason = "parse_error"
+                except Exception as e:
+                    print(f"OpenAI HTS streaming error: {e}")
+                    self.hts_router.record_call(model, time.perf_counter() - start, None)
+                    break
+                
+                self.hts_router.record_call(model, time.perf_counter() - start, None)
+                if suggestions or position == len(HTS_MODEL_TIERS) - 1:
+                    break
+                self.hts_router.record_escalation(model, reason)
+        
+        if complete and suggestions:
+            await self._store_classification(product, cache_key, suggestions, generated_at)
+            source = "llm"
+        elif suggestions:
+            # Interrupted mid-answer: what was shown stays, but is not stored
+            source = "partial"
+        else:
+            llm_usage_service.record("hts_stream", "", 0, 0, 0.0, "fallback")
+            suggestions = self._fallback_hts_codes(product)
+            for suggestion in suggestions:
+                yield "suggestion", suggestion.model_dump()
+            source = "fallback"
+        
+        yield "done", {"product_id": product.id, "count": len(suggestions), "source": source}
+    
+    async def _stream_hts_suggestions(self, product: Product, model: str) -> AsyncIterator[HTSCodeSuggestion]:
+        """Stream one model's answer, yielding each checked suggestion as it completes"""
+        start = time.perf_counter()
+        prompt = self._build_hts_prompt(product)
+        stream = await self._chat_completion(
+            "hts_stream",
+            model=model,
+            messages=[
+                {"role": "system", "content": HTS_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=1000,
+            temperature=0.2,
+            stream=True
+        )
+        
+        parser = JSONArrayStreamParser()
+        # Streams carry no usage block, so tokens are estimated from the text
+        received = []
+        outcome = "error"
+        try:
+            async for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                
+                received.append(chunk.choices[0].delta.content)
+                for item in parser.feed(chunk.choices[0].delta.content):
+                    if not isinstance(item, dict):
+                        continue
+                    try:
+                        checked = self._check_against_schedule([HTSCodeSuggestion(**item)])
+                    except (TypeError, ValueError) as e:
+                        print(f"Skipped streamed HTS suggestion: {e}")
+                        continue
+                    for suggestion in checked:
+                        yield suggestion
+                if parser.finished:
+                    break
+            
+            if not parser.finished:
+                outcome = "parse_error"
+                raise ValueError("HTS stream ended before the JSON array was closed")
+            outcome = "ok"
+        finally:
+            await stream.aclose()
+            llm_usage_service.record(
+                "hts_stream", model, estimate_tokens(HTS_SYSTEM_PROMPT + prompt), estimate_tokens("".join(received)),
+                time.perf_counter() - start, outcome
+            )
+    
+    def _build_hts_batch_prompt(self, products: List[Product]) -> str:
+        """Build one HTS prompt covering several products, keyed by product id"""
+        product_blocks = []
+        for product in products:
+            fields = hts_prompt_fields(product)
+            product_blocks.append(f"""
+            Product ID: {product.id}
+            Product: {fields['title']}
+            Product Code: {fields['product_code']}
+            Material: {fields['material_type']} ({fields['material_standard']})
+            Joint Type: {fields['joint_type']}
+            Body Design: {fields['body_design']}
+            Size Range: {fields['size_range']}
+            Primary Standard: {fields['primary_standard']}
+            Construction: {fields['lining']}
+            Coatings: Interior - {fields['coating_interior']}, Exterior - {fields['coating_exterior']}
+            """)
+        
+        return f"""
+            Based on the following product specifications, suggest the most appropriate HTS (Harmonized Tariff Schedule) codes for each product:
+            {"".join(product_blocks)}
+            Please provide 2-3 HTS code suggestions with confidence levels and reasoning for every product. Consider that these are:
+            - Pipe fittings made of ductile iron
+            - Used for water/sewer applications
+            - Manufactured to AWWA standards
+            - Industrial/commercial grade products
+
+            Return your response as a JSON object keyed by Product ID with this format:
+            {{
+                "PRODUCT-ID-HERE": [
+                    {{
+                        "code": "HTS.CODE.HERE",
+                        "description": "Description of what this code covers",
+                        "confidence": 0.85,
+                        "reasoning": "Why this code is appropriate"
+                    }}
+                ]
+            }}
+            """
+    
+    def _parse_hts_batch(self, ai_response: str, products: List[Product]) -> Dict[str, List[HTSCodeSuggestion]]:
+        """
+        Split a batched answer back per product
+        
+        Only ids that were asked for are accepted; a product whose entry is
+        missing or malformed is simply left out so the caller can retry it alone.
+        """
+        data = json.loads(ai_response)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object keyed by product id")
+        
+        parsed = {}
+        for product in products:
+            entry = data.get(product.id)
+            if not isinstance(entry, list) or not entry:
+                continue
+            try:
+                parsed[product.id] = self._check_against_schedule([HTSCodeSuggestion(**item) for item in entry])
+            except (TypeError, ValueError) as e:
+                print(f"Invalid batched HTS entry for {product.id}: {e}")
+        return parsed
+    
+    async def _request_hts_batch(self, products: List[Product]) -> Dict[str, List[HTSCodeSuggestion]]:
+        """Ask the cheapest model tier for HTS codes for several products in one call"""
+        model = HTS_MODEL_TIERS[0]
+        start = time.perf_counter()
+        usage = None
+        try:
+            batched, usage = await self._complete_and_parse(
+                "hts_batch",
+                lambda ai_response: self._parse_hts_batch(ai_response, products),
+                model=model,
                 messages=[
-                    {"role": "system", "content": "You are an expert in HTS codes for industrial products. Return only valid JSON."},
-                    {"role": "user", "content": prompt}
+                    {"role": "system", "content": HTS_SYSTEM_PROMPT},
+                    {"role": "user", "content": self._build_hts_batch_prompt(products)}
                 ],
-                max_tokens=1000,
-                temperature=0.2
+                max_tokens=settings.HTS_BATCH_MAX_TOKENS_PER_PRODUCT * len(products),
+                temperature=0.2,
+                response_format={"type": "json_object"}
             )
+        except Exception as e:
+            usage = getattr(e, "usage", None)
+            raise
+        finally:
+            self.hts_router.record_call(model, time.perf_counter() - start, usage)
+        return batched
+    
+    async def classify_products_batch(self, products: List[Product], use_cache: bool = True) -> Dict[str, HTSCodeResponse]:
+        """
+        Classify several products with as few LLM calls as possible
+        
+        Products with a confident rule answer or a cached answer are
+        answered directly; the rest go to the cheapest model tier in prompts
+        of HTS_BATCH_SIZE products. Any product the batched answer does not
+        cover (missing, malformed, or the whole call failed) falls back to a
+        single-product classification, and a product answered with low
+        confidence is retried alone starting at the next tier.
+        """
+        responses: Dict[str, HTSCodeResponse] = {}
+        pending: List[Tuple[Product, str]] = []
+        
+        llm_cache_status.set("miss" if use_cache else "bypass")
+        for product in products:
+            rule_suggestions = hts_rules_service.classify(product)
+            if rule_suggestions:
+                responses[product.id] = await self._rule_response(product, rule_suggestions)
+                continue
             
-            # Parse response
-            ai_response = response.choices[0].message.content.strip()
+            cache_key = hts_cache_service.make_key(hts_prompt_fields(product), HTS_MODEL, HTS_PROMPT_VERSION)
+            cached = await asyncio.to_thread(hts_cache_service.get, cache_key) if use_cache else None
+            if cached:
+                llm_usage_service.record_cache_hit("hts_batch")
+                suggestions, generated_at = cached
+                await self._ensure_indexed(product.id, suggestions, generated_at)
+                responses[product.id] = HTSCodeResponse(
+                    product_id=product.id,
+                    suggestions=suggestions,
+                    generated_at=generated_at,
+                    cached=True,
+                    source="cache"
+                )
+            else:
+                pending.append((product, cache_key))
+        
+        batch_size = max(1, settings.HTS_BATCH_SIZE)
+        if len(pending) < 2 or batch_size == 1:
+            single_responses = await asyncio.gather(
+                *(self._classify_uncached(product, cache_key) for product, cache_key in pending)
+            )
+            for response in single_responses:
+                responses[response.product_id] = response
+            return responses
+        
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            chunk_products = [product for product, _ in chunk]
+            generated_at = datetime.now().isoformat()
             try:
-                suggestions_data = json.loads(ai_response)
-                suggestions = [HTSCodeSuggestion(**item) for item in suggestions_data]
-                return suggestions
+                batched = await self._request_hts_batch(chunk_products)
             except (json.JSONDecodeError, ValueError) as e:
-                print(f"Failed to parse HTS response: {e}")
-                return self._fallback_hts_codes(product)
-                
-        except Exception as e:
-            print(f"OpenAI HTS generation error: {e}")
-            return self._fallback_hts_codes(product)
+                print(f"Failed to parse batched HTS response: {e}")
+                batched = {}
+            except Exception as e:
+                print(f"OpenAI batched HTS generation error: {e}")
+                batched = {}
+            
+            retry_alone = []
+            for product, cache_key in chunk:
+                suggestions = batched.get(product.id)
+                escalate = len(HTS_MODEL_TIERS) > 1 and not llm_usage_service.degraded
+                if suggestions and escalate and not self._confident_enough(suggestions):
+                    HTS_BATCH_ITEMS.labels("escalated").inc()
+                    self.hts_router.record_escalation(HTS_MODEL_TIERS[0], LOW_CONFIDENCE)
+                    retry_alone.append((product, cache_key, 1))
+                elif suggestions:
+                    HTS_BATCH_ITEMS.labels("batched").inc()
+                    await self._store_classification(product, cache_key, suggestions, generated_at)
+                    responses[product.id] = HTSCodeResponse(
+                        product_id=product.id,
+                        suggestions=suggestions,
+                        generated_at=generated_at,
+                        cached=False
+                    )
+                else:
+                    HTS_BATCH_ITEMS.labels("fallback").inc()
+                    retry_alone.append((product, cache_key, 0))
+            
+            fallback_responses = await asyncio.gather(
+                *(self._classify_uncached(product, cache_key, first_tier)
+                  for product, cache_key, first_tier in retry_alone)
+            )
+            for response in fallback_responses:
+                responses[response.product_id] = response
+        
+        return responses
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Resilience, query cache, rules and coalescing statistics for monitoring"""
+        return {
+            "circuit_breaker": self.breaker.get_stats(),
+            "latency_budgets_seconds": self._budgets,
+            "query_cache": query_cache_service.get_stats(),
+            "rules": hts_rules_service.get_stats(),
+            "model_routing": self.hts_router.get_stats(),
+            "hedging": {"enabled": settings.LLM_HEDGING_ENABLED, **self.hedger.get_stats()},
+            "usage_budget": llm_usage_service.get_stats(recent=0)["budget"],
+            "singleflight": {
+                "hts": self._hts_flight.get_stats(),
+                "search": self._search_flight.get_stats()
+            }
+        }
     
-    def _extract_product_ids(self, response: str, products: List[Product]) -> List[str]:
+    def _extract_product_ids(self, response: str, product_summaries: List[Dict[str, Any]]) -> List[str]:
         """Extract product IDs from AI response as fallback"""
         product_ids = []
-        for product in products:
-            if product.id in response:
-                product_ids.append(product.id)
+        for summary in product_summaries:
+            if summary["id"] in response:
+                product_ids.append(summary["id"])
         return product_ids[:10]
     
     def _fallback_hts_codes(self, product: Product) -> List[HTSCodeSuggestion]:
-        """Provide fallback HTS codes when AI fails"""
-        # Basic fallback based on product type
-        if "ductile iron" in product.specifications.material.type.lower():
-            return [
-                HTSCodeSuggestion(
-                    code="7307.99.1000",
-                    description="Other tube or pipe fittings of iron or steel",
-                    confidence=0.7,
-                    reasoning="General category for iron pipe fittings"
-                ),
-                HTSCodeSuggestion(
-                    code="8481.80.9090",
-                    description="Other valves and similar articles",
-                    confidence=0.5,
-                    reasoning="Alternative classification for pipe connection components"
-                )
-            ]
-        return []
+        """Provide fallback HTS codes when AI fails: the matching rules' suggestions at any confidence"""
+        return list(hts_rules_service.evaluate(product).suggestions)
 
 
 # Singleton instance
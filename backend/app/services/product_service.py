@@ -17,6 +17,7 @@ class ProductService:
     def __init__(self):
         self._products: Optional[List[Product]] = None
         self._products_by_id: Optional[Dict[str, Product]] = None
+        self._catalog_version = 0
         self.data_file = Path(settings.DATA_DIR) / settings.PRODUCTS_FILE
     
     def _load_products(self) -> None:
@@ -34,10 +35,27 @@ class ProductService:
             catalog = ProductCatalog(**data['product_catalog'])
             self._products = catalog.products
             self._products_by_id = {product.id: product for product in self._products}
+            self._catalog_version += 1
             
         except Exception as e:
             raise RuntimeError(f"Failed to load product data: {str(e)}")
     
+    def preload(self) -> None:
+        """Load and index the catalog eagerly (e.g. in a pre-fork parent process)"""
+        self._load_products()
+    
+    def reload(self) -> None:
+        """Re-read the catalog from disk (bumps the catalog version)"""
+        self._products = None
+        self._products_by_id = None
+        self._load_products()
+    
+    @property
+    def catalog_version(self) -> int:
+        """Incremented on every (re)load so derived indexes and caches can invalidate"""
+        self._load_products()
+        return self._catalog_version
+    
     def get_all_products(self) -> List[Product]:
         """Get all products"""
         self._load_products()
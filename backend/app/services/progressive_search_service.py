@@ -0,0 +1,149 @@
+"""
+Progressive search service - AI rankings computed in the background behind a token
+"""
+
+import asyncio
+import base64
+import json
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.admission import ai_search_gate
+from app.core.config import settings
+from app.core.metrics import SEARCH_PROGRESSIVE
+from app.models.product import SearchResult
+from app.services.openai_service import AI_MATCH_REASON, openai_service
+from app.services.product_service import product_service
+from app.utils.helpers import validate_filters
+
+
+class ProgressiveSearchService:
+    """
+    Service running AI search in the background while local results are served
+
+    `start` schedules `enhanced_search` as a task (admitted through the AI
+    search gate) and returns a token the client polls with `wait`. The
+    token carries the search parameters themselves, so a poll that lands on
+    another worker process (or arrives after the pending ranking was
+    evicted) starts the same ranking there instead of failing. Filters of
+    the local search travel in the token too and are applied to the AI
+    ranking, so the upgrade never brings back filtered-out products.
+    Pending rankings are kept for PROGRESSIVE_SEARCH_TTL_SECONDS and at most
+    PROGRESSIVE_SEARCH_MAX_PENDING of them, oldest evicted first.
+    """
+
+    def __init__(self):
+        self.ttl_seconds = settings.PROGRESSIVE_SEARCH_TTL_SECONDS
+        self.max_pending = settings.PROGRESSIVE_SEARCH_MAX_PENDING
+        # token -> (started at, ranking task)
+        self._pending: "OrderedDict[str, Tuple[float, asyncio.Task]]" = OrderedDict()
+        self.started = 0
+        self.recovered = 0
+
+    @staticmethod
+    def _encode(query: str, limit: int, fanout: bool, filters: Dict[str, Any]) -> str:
+        params = {"q": query, "l": limit, "f": fanout}
+        if filters:
+            params["x"] = filters
+        payload = json.dumps(params, separators=(",", ":"), sort_keys=True)
+        encoded = base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+        return f"{encoded}.{secrets.token_hex(4)}"
+
+    @staticmethod
+    def _decode(token: str) -> Tuple[str, int, bool, Dict[str, Any]]:
+        """Search parameters of a token; raises ValueError for malformed tokens"""
+        try:
+            encoded = token.split(".", 1)[0]
+            payload = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+            query, limit, fanout = str(payload["q"]), int(payload["l"]), bool(payload["f"])
+            filters = validate_filters(dict(payload.get("x") or {}))
+        except Exception:
+            raise ValueError("Malformed search token")
+        if not query or not 1 <= limit <= 50:
+            raise ValueError("Malformed search token")
+        return query, limit, fanout, filters
+
+    def _prune(self, now: float) -> None:
+        while self._pending:
+            token, (started_at, task) = next(iter(self._pending.items()))
+            if len(self._pending) <= self.max_pending and started_at > now - self.ttl_seconds:
+                break
+            del self._pending[token]
+            if not task.done():
+                task.cancel()
+            SEARCH_PROGRESSIVE.labels("evicted").inc()
+
+    @staticmethod
+    async def _rank(query: str, limit: int, fanout: bool, filters: Dict[str, Any], client: str) -> List[SearchResult]:
+        admission = ai_search_gate.admit(client)
+        if not filters:
+            return await openai_service.enhanced_search(query, limit, fanout=fanout, admission=admission)
+
+        # Rank as usual (the ranking is cached per query, not per filter), then keep the allowed products
+        allowed = {product.id for product in product_service.filter_products(filters)}
+        results = await openai_service.enhanced_search(
+            query, len(product_service.get_all_products()), fanout=fanout, admission=admission
+        )
+        kept = [result for result in results if result.product.id in allowed][:limit]
+        if kept and kept[0].match_reason == AI_MATCH_REASON:
+            # Re-number the AI scores so filtered-out ranks leave no gaps
+            kept = [result.model_copy(update={"score": 100 - rank * 5}) for rank, result in enumerate(kept)]
+        return kept
+
+    def _schedule(self, token: str, query: str, limit: int, fanout: bool, filters: Dict[str, Any],
+                  client: str) -> asyncio.Task:
+        now = time.time()
+        task = asyncio.create_task(self._rank(query, limit, fanout, filters, client))
+        self._pending[token] = (now, task)
+        self._prune(now)
+        return task
+
+    def start(self, query: str, limit: int, fanout: bool, filters: Dict[str, Any], client: str) -> str:
+        """Start ranking a query in the background; returns the token to poll"""
+        token = self._encode(query, limit, fanout, filters)
+        self._schedule(token, query, limit, fanout, filters, client)
+        self.started += 1
+        SEARCH_PROGRESSIVE.labels("started").inc()
+        return token
+
+    async def wait(self, token: str, timeout: float, client: str) -> Optional[List[SearchResult]]:
+        """
+        AI results for a token, waiting up to `timeout` seconds for them
+
+        Returns None while the ranking is still running.
+        """
+        entry = self._pending.get(token)
+        if entry is None:
+            query, limit, fanout, filters = self._decode(token)
+            task = self._schedule(token, query, limit, fanout, filters, client)
+            self.recovered += 1
+            SEARCH_PROGRESSIVE.labels("recovered").inc()
+        else:
+            task = entry[1]
+
+        if not task.done() and timeout > 0:
+            # asyncio.wait leaves the task running when the poll times out
+            await asyncio.wait({task}, timeout=timeout)
+        if not task.done() or task.cancelled():
+            # An evicted ranking is started afresh by the next poll
+            SEARCH_PROGRESSIVE.labels("pending").inc()
+            return None
+
+        SEARCH_PROGRESSIVE.labels("ready").inc()
+        return task.result()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pending": sum(1 for _, task in self._pending.values() if not task.done()),
+            "kept": len(self._pending),
+            "started": self.started,
+            "recovered": self.recovered,
+            "ttl_seconds": self.ttl_seconds,
+            "max_pending": self.max_pending
+        }
+
+
+# Singleton instance
+progressive_search_service = ProgressiveSearchService()
@@ -0,0 +1,218 @@
+"""
+Query cache service - semantic cache of AI search rankings keyed by query meaning
+"""
+
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import SEARCH_QUERY_CACHE
+from app.services.product_service import product_service
+from app.services.search_service import STOPWORDS
+
+# Standards/product codes (c153, a21.53) stay whole; other runs split into words and numbers
+QUERY_TOKEN_PATTERN = re.compile(r"[a-z]+\d+(?:\.\d+)?[a-z0-9]*|[a-z]+|\d+(?:\.\d+)?")
+UNIT_SUFFIX_PATTERN = re.compile(r"(\d)(?:in|inch|inches)\b")
+
+NUMBER_WORDS = {
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6", "seven": "7",
+    "eight": "8", "nine": "9", "ten": "10", "eleven": "11", "twelve": "12", "fourteen": "14",
+    "sixteen": "16", "eighteen": "18", "twenty": "20", "thirty": "30", "forty": "40",
+}
+
+# Catalog abbreviations expanded to the words the full names use
+ABBREVIATIONS = {
+    "mj": ["mechanical", "joint"],
+    "po": ["push", "on"],
+    "pushon": ["push", "on"],
+    "fl": ["flanged"],
+    "flg": ["flanged"],
+    "flange": ["flanged"],
+    "di": ["ductile", "iron"],
+    "cml": ["cement", "mortar", "lining"],
+}
+
+# Fitting and product types: a query for one never reuses another's ranking, however
+# close the rest of the wording ("12 mj tee" vs "12 mj cap"). "flange" is folded into
+# "flanged" above, so that form stands for both.
+PRODUCT_TYPE_WORDS = {
+    "tee", "cap", "plug", "sleeve", "cross", "elbow", "bend", "reducer", "flanged", "wye",
+    "coupling", "adapter", "offset", "outlet", "nipple", "union", "bushing", "saddle",
+    "gland", "gasket", "valve", "hydrant", "pipe", "connector", "restraint", "spool",
+}
+
+# Tokens with digits (sizes, pressure classes, standards) change the answer, so they weigh more
+NUMBER_WEIGHT = 2.0
+WORD_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.3
+
+
+def canonical_tokens(query: str) -> List[str]:
+    """Sorted, de-duplicated query tokens with number words, abbreviations and plurals normalized"""
+    text = UNIT_SUFFIX_PATTERN.sub(r"\1 inch", query.lower().replace('"', " inch "))
+    tokens = []
+    for token in QUERY_TOKEN_PATTERN.findall(text):
+        token = NUMBER_WORDS.get(token, token)
+        for word in ABBREVIATIONS.get(token, [token]):
+            if word in STOPWORDS:
+                continue
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+            tokens.append(word)
+    return sorted(set(tokens))
+
+
+def vectorize(tokens: List[str]) -> Dict[str, float]:
+    """L2-normalized sparse vector of word and character-trigram features"""
+    vector: Dict[str, float] = {}
+    for token in tokens:
+        if any(char.isdigit() for char in token):
+            vector[f"n:{token}"] = NUMBER_WEIGHT
+            continue
+        vector[f"w:{token}"] = WORD_WEIGHT
+        padded = f"#{token}#"
+        for i in range(len(padded) - 2):
+            feature = f"t:{padded[i:i + 3]}"
+            vector[feature] = vector.get(feature, 0.0) + TRIGRAM_WEIGHT
+
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if norm == 0:
+        return {}
+    return {feature: weight / norm for feature, weight in vector.items()}
+
+
+def signature(tokens: List[str]) -> Tuple[str, ...]:
+    """Tokens that must match exactly before a cached ranking is considered: numbers and product types"""
+    return tuple(
+        token for token in tokens
+        if token in PRODUCT_TYPE_WORDS or any(char.isdigit() for char in token)
+    )
+
+
+class QueryCacheService:
+    """
+    Service caching ranked product ids for AI search queries
+
+    Queries are reduced to canonical tokens, so reordered or re-spelled
+    variants share one exact key. Other near-duplicates are found through an
+    inverted index over sparse feature vectors: only entries sharing a
+    feature with the query (in the same namespace, e.g. one per ranking
+    mode) and the same signature (sizes, classes, standards and product
+    types) are scored, and the best cosine similarity at or above the
+    threshold is a hit. Entries are evicted least recently used
+    and the whole cache is dropped when the catalog version changes.
+    """
+
+    def __init__(self):
+        self.enabled = settings.SEMANTIC_CACHE_ENABLED
+        self.max_entries = settings.SEMANTIC_CACHE_SIZE
+        self.threshold = settings.SEMANTIC_CACHE_THRESHOLD
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Dict[str, float], List[str], Tuple[str, ...]]]" = OrderedDict()
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._catalog_version: Optional[int] = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _check_version(self) -> None:
+        version = product_service.catalog_version
+        if version != self._catalog_version:
+            self._entries.clear()
+            self._postings.clear()
+            self._catalog_version = version
+
+    def get(self, query: str, namespace: str = "rank") -> Optional[List[str]]:
+        """Ranked product ids of the same or a sufficiently similar earlier query"""
+        if not self.enabled:
+            return None
+
+        tokens = canonical_tokens(query)
+        if not tokens:
+            return None
+        prefix = f"{namespace}|"
+        key = prefix + " ".join(tokens)
+
+        with self._lock:
+            self._check_version()
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                SEARCH_QUERY_CACHE.labels("exact").inc()
+                return list(entry[1])
+
+            vector = vectorize(tokens)
+            required = signature(tokens)
+            scores: Dict[str, float] = {}
+            for feature, weight in vector.items():
+                for other_key, other_weight in self._postings.get(feature, {}).items():
+                    if not other_key.startswith(prefix) or self._entries[other_key][2] != required:
+                        continue
+                    scores[other_key] = scores.get(other_key, 0.0) + weight * other_weight
+
+            best_key = max(scores, key=scores.get) if scores else None
+            if best_key is not None and scores[best_key] >= self.threshold:
+                self._entries.move_to_end(best_key)
+                self.semantic_hits += 1
+                SEARCH_QUERY_CACHE.labels("semantic").inc()
+                return list(self._entries[best_key][1])
+
+            self.misses += 1
+            SEARCH_QUERY_CACHE.labels("miss").inc()
+            return None
+
+    def put(self, query: str, product_ids: List[str], namespace: str = "rank") -> None:
+        """Remember the ranking for a query, evicting the least recently used entry if full"""
+        if not self.enabled or not product_ids:
+            return
+
+        tokens = canonical_tokens(query)
+        if not tokens:
+            return
+        key = f"{namespace}|" + " ".join(tokens)
+
+        with self._lock:
+            self._check_version()
+            if key in self._entries:
+                self._remove(key)
+
+            vector = vectorize(tokens)
+            self._entries[key] = (vector, list(product_ids), signature(tokens))
+            for feature, weight in vector.items():
+                self._postings.setdefault(feature, {})[key] = weight
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        vector, _, _ = self._entries.pop(key)
+        for feature in vector:
+            posting = self._postings.get(feature)
+            if posting is not None:
+                posting.pop(key, None)
+                if not posting:
+                    del self._postings[feature]
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "catalog_version": self._catalog_version
+        }
+
+
+# Singleton instance
+query_cache_service = QueryCacheService()
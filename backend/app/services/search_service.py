@@ -2,22 +2,52 @@
 Search service - handles product search functionality
 """
 
+import math
 import re
 import time
-from typing import List, Dict, Any, Tuple
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
 from difflib import SequenceMatcher
 
+from app.core.metrics import SEARCH_PHASE_DURATION
 from app.models.product import Product, SearchResult
 from app.services.product_service import product_service
 
 
+# Words that carry no product meaning in natural-language queries
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "for", "to", "in", "on", "with", "by", "at", "from",
+    "is", "are", "be", "do", "does", "what", "which", "that", "this", "these", "those", "any",
+    "have", "has", "i", "we", "you", "need", "want", "looking", "find", "show", "me", "products",
+    "product", "some", "can", "use", "used", "inch", "inches"
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[./-][a-z0-9]+)*")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
 class SearchService:
     """Service for searching products"""
     
     def __init__(self):
         self.product_service = product_service
+        # BM25 token index, rebuilt when the catalog version changes
+        self._index_version: Optional[int] = None
+        self._index_products: List[Product] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._idf: Dict[str, float] = {}
+        self._doc_lengths: List[int] = []
+        self._avg_doc_length = 0.0
     
-    def search_products(self, query: str, limit: int = 10, filters: Dict[str, Any] = None) -> Tuple[List[SearchResult], int]:
+    def search_products(self, query: str, limit: Optional[int] = 10, filters: Dict[str, Any] = None) -> Tuple[List[SearchResult], int]:
         """
         Search products using keyword matching and similarity scoring
         Returns (results, search_time_ms)
@@ -25,32 +55,113 @@ class SearchService:
         start_time = time.time()
         
         # Get all products or filtered subset
-        if filters:
-            products = self.product_service.filter_products(filters)
-        else:
-            products = self.product_service.get_all_products()
+        with SEARCH_PHASE_DURATION.labels("filter").time():
+            if filters:
+                products = self.product_service.filter_products(filters)
+            else:
+                products = self.product_service.get_all_products()
         
         # Perform search
-        scored_results = []
         query_lower = query.lower().strip()
-        
-        for product in products:
-            score, match_reason = self._calculate_relevance_score(product, query_lower)
-            if score > 0:
-                scored_results.append(SearchResult(
-                    product=product,
-                    score=score,
-                    match_reason=match_reason
-                ))
+        with SEARCH_PHASE_DURATION.labels("score").time():
+            scored = []
+            for product in products:
+                score, match_reason = self._calculate_relevance_score(product, query_lower)
+                if score > 0:
+                    scored.append((score, match_reason, product))
         
         # Sort by score (descending) and limit results
-        scored_results.sort(key=lambda x: x.score, reverse=True)
-        limited_results = scored_results[:limit]
+        with SEARCH_PHASE_DURATION.labels("sort").time():
+            scored.sort(key=lambda item: item[0], reverse=True)
+            scored = scored[:limit]
+        
+        # Only build result models for the rows we return
+        with SEARCH_PHASE_DURATION.labels("serialize").time():
+            limited_results = [
+                SearchResult(product=product, score=score, match_reason=match_reason)
+                for score, match_reason, product in scored
+            ]
         
         search_time_ms = int((time.time() - start_time) * 1000)
         
         return limited_results, search_time_ms
     
+    def _product_tokens(self, product: Product) -> List[str]:
+        """Indexed tokens for a product; identifying fields are counted twice"""
+        strong = " ".join([
+            product.title, product.product_code, product.joint_type,
+            product.body_design, " ".join(product.metadata.keywords)
+        ])
+        weak = " ".join([
+            product.primary_standard,
+            product.specifications.size_range,
+            product.specifications.material.type,
+            product.metadata.subcategory,
+            product.metadata.search_text
+        ])
+        strong_tokens = tokenize(strong)
+        return strong_tokens + strong_tokens + tokenize(weak)
+    
+    def build_index(self) -> None:
+        """Build the BM25 inverted index for the current catalog"""
+        version = self.product_service.catalog_version
+        if self._index_version == version:
+            return
+        
+        products = self.product_service.get_all_products()
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths = []
+        
+        for doc_id, product in enumerate(products):
+            term_counts = Counter(self._product_tokens(product))
+            doc_lengths.append(sum(term_counts.values()))
+            for term, count in term_counts.items():
+                postings.setdefault(term, []).append((doc_id, count))
+        
+        total_docs = len(products)
+        self._idf = {
+            term: math.log(1 + (total_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+        self._postings = postings
+        self._doc_lengths = doc_lengths
+        self._avg_doc_length = (sum(doc_lengths) / total_docs) if total_docs else 0.0
+        self._index_products = products
+        self._index_version = version
+    
+    def retrieve_candidates(self, query: str, k: int = 30) -> List[Tuple[Product, float]]:
+        """
+        Top-k candidate products for a free-text query
+        Combines BM25 over query tokens with the phrase scorer, so multi-word
+        natural-language queries still find partial matches. Cost depends on
+        the postings of the query terms, not on a full scoring pass.
+        """
+        self.build_index()
+        
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self._postings[term]:
+                length_norm = 1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / self._avg_doc_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+        
+        if not scores:
+            return []
+        
+        # Re-score only the lexical hits with the phrase scorer to break ties
+        query_lower = query.lower().strip()
+        top_ids = sorted(scores, key=scores.__getitem__, reverse=True)[:k * 2]
+        candidates = []
+        for doc_id in top_ids:
+            product = self._index_products[doc_id]
+            phrase_score, _ = self._calculate_relevance_score(product, query_lower)
+            candidates.append((product, scores[doc_id] * 10 + phrase_score))
+        
+        candidates.sort(key=lambda item: item[1], reverse=True)
+        return candidates[:k]
+    
     def _calculate_relevance_score(self, product: Product, query: str) -> Tuple[float, str]:
         """Calculate relevance score for a product against a query"""
         score = 0.0
@@ -0,0 +1,251 @@
+"""
+Similarity service - precomputed item-to-item neighbours for "similar products"
+"""
+
+import asyncio
+import heapq
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.models.product import Product
+from app.services.product_service import product_service
+from app.services.search_service import tokenize
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+# Attribute groups compared between products and the weight of each shared value
+ATTRIBUTE_WEIGHTS = {
+    "joint type": 3.0,
+    "body design": 3.0,
+    "standards": 2.0,
+    "compatible pipes": 1.5,
+    "material": 1.0,
+    "gaskets": 1.0,
+    "certifications": 1.0,
+}
+
+
+def product_attributes(product: Product) -> Dict[str, Set[str]]:
+    """Normalized attribute values per attribute group"""
+    certifications = product.certifications
+    certified = {
+        name for name, flag in (
+            ("nsf61", certifications.nsf61),
+            ("nsf61 annex g", certifications.nsf61_annex_g),
+            ("nsf372", certifications.nsf372),
+            ("ul listed", certifications.ul_listed.strip().lower() not in ("", "no", "n/a")),
+            ("fm approved", certifications.fm_approved.strip().lower() not in ("", "no", "n/a")),
+        ) if flag
+    }
+    gaskets = product.construction.gaskets
+    values = {
+        "joint type": {product.joint_type},
+        "body design": {product.body_design},
+        "standards": {product.primary_standard, *product.installation.standards, *product.testing.standards},
+        "compatible pipes": set(product.installation.compatible_pipes),
+        "material": {product.specifications.material.type},
+        "gaskets": {gaskets.standard, *gaskets.optional},
+        "certifications": certified,
+    }
+    return {
+        group: {" ".join(value.lower().split()) for value in group_values if value and value.strip()}
+        for group, group_values in values.items()
+    }
+
+
+def _text_tokens(product: Product) -> List[str]:
+    return tokenize(" ".join([
+        product.title,
+        product.metadata.subcategory,
+        " ".join(product.metadata.keywords),
+        product.metadata.search_text,
+    ]))
+
+
+def _normalize(vector: Dict[str, float], scale: float) -> Dict[str, float]:
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if norm == 0:
+        return {}
+    return {feature: weight * scale / norm for feature, weight in vector.items()}
+
+
+class _NeighbourTable(NamedTuple):
+    version: int
+    neighbours: Dict[str, List[Tuple[str, float]]]
+    attributes: Dict[str, Dict[str, Set[str]]]
+
+
+class SimilarityService:
+    """
+    Service answering "similar products" from a precomputed neighbour table
+
+    Each product becomes one sparse vector of two L2-normalized parts:
+    weighted attribute values (joint type, body design, standards, pipes,
+    gaskets, certifications...) and TF-IDF text features, scaled so that
+    the dot product of two vectors is SIMILARITY_ATTRIBUTE_WEIGHT times the
+    attribute cosine plus the rest times the text cosine. Features found in
+    a single product cannot contribute to any pair and are dropped after
+    normalization.
+
+    All pairwise similarities are computed once per catalog version and the
+    top SIMILARITY_TOP_K neighbours of every product are kept, so lookups
+    are a dict access. With numpy and scipy the scores come from sparse
+    (CSR) matrix products over row blocks of SIMILARITY_BLOCK_SIZE, so memory
+    grows with the non-zero features rather than products times vocabulary;
+    without them, from a sparse accumulation over the products sharing each
+    feature.
+
+    The table is built at startup and rebuilt in a worker thread when the
+    catalog version changes; lookups keep using the previous table until
+    the new one is swapped in.
+    """
+
+    def __init__(self):
+        self.product_service = product_service
+        self.top_k = settings.SIMILARITY_TOP_K
+        self.block_size = max(1, settings.SIMILARITY_BLOCK_SIZE)
+        self.attribute_weight = settings.SIMILARITY_ATTRIBUTE_WEIGHT
+        self._table: Optional[_NeighbourTable] = None
+        self._build_lock = threading.Lock()
+        self._rebuild: Optional[asyncio.Task] = None
+
+    def _vectors(self, products: List[Product],
+                 product_values: Dict[str, Dict[str, Set[str]]]) -> List[Dict[str, float]]:
+        """Combined attribute and text vectors, restricted to features shared by two or more products"""
+        documents = [Counter(_text_tokens(product)) for product in products]
+        document_frequency = Counter(term for document in documents for term in document)
+        total = len(products)
+
+        vectors = []
+        for product, document in zip(products, documents):
+            attributes = {
+                f"{group}:{value}": ATTRIBUTE_WEIGHTS[group]
+                for group, values in product_values[product.id].items()
+                for value in values
+            }
+            text = {
+                f"text:{term}": (1 + math.log(count)) * (math.log((1 + total) / (1 + document_frequency[term])) + 1)
+                for term, count in document.items()
+            }
+            vector = _normalize(attributes, math.sqrt(self.attribute_weight))
+            vector.update(_normalize(text, math.sqrt(1 - self.attribute_weight)))
+            vectors.append(vector)
+
+        shared = Counter(feature for vector in vectors for feature in vector)
+        return [
+            {feature: weight for feature, weight in vector.items() if shared[feature] > 1}
+            for vector in vectors
+        ]
+
+    def _top_k_sparse(self, vectors: List[Dict[str, float]]) -> List[List[Tuple[int, float]]]:
+        features = {feature: column for column, feature in enumerate(sorted({f for v in vectors for f in v}))}
+        indptr = [0]
+        indices: List[int] = []
+        data: List[float] = []
+        for vector in vectors:
+            for feature, weight in vector.items():
+                indices.append(features[feature])
+                data.append(weight)
+            indptr.append(len(indices))
+        matrix = sparse.csr_matrix(
+            (np.array(data, dtype=np.float64), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(vectors), max(1, len(features)))
+        )
+        transposed = matrix.T.tocsr()
+
+        k = min(self.top_k, len(vectors) - 1)
+        neighbours = []
+        for start in range(0, len(vectors), self.block_size):
+            # Only a block of rows is densified: block_size x products scores
+            block = (matrix[start:start + self.block_size] @ transposed).toarray()
+            rows = np.arange(block.shape[0])
+            block[rows, rows + start] = -np.inf
+            # k-th best score per row; everything tied with it stays a candidate
+            # so ties are broken by product order as in the pure-Python path
+            kth = -np.partition(-block, k - 1, axis=1)[:, k - 1]
+            for row in rows:
+                scores = block[row]
+                top = np.flatnonzero(scores >= kth[row]) if kth[row] > 0 else np.flatnonzero(scores > 0)
+                ranked = sorted(top, key=lambda column: (-scores[column], column))[:k]
+                neighbours.append([(int(column), float(scores[column])) for column in ranked])
+        return neighbours
+
+    def _top_k_python(self, vectors: List[Dict[str, float]]) -> List[List[Tuple[int, float]]]:
+        postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        for row, vector in enumerate(vectors):
+            for feature, weight in vector.items():
+                rows, weights = postings.setdefault(feature, ([], []))
+                rows.append(row)
+                weights.append(weight)
+
+        neighbours = []
+        for row, vector in enumerate(vectors):
+            scores = [0.0] * len(vectors)
+            for feature, weight in vector.items():
+                rows, weights = postings[feature]
+                for other, other_weight in zip(rows, weights):
+                    scores[other] += weight * other_weight
+            scores[row] = 0.0
+            ranked = heapq.nsmallest(
+                self.top_k, ((other, score) for other, score in enumerate(scores) if score > 0),
+                key=lambda item: (-item[1], item[0])
+            )
+            neighbours.append(ranked)
+        return neighbours
+
+    def build_index(self) -> None:
+        """Precompute the neighbour table for the current catalog (blocking; safe to run in a thread)"""
+        with self._build_lock:
+            version = self.product_service.catalog_version
+            if self._table is not None and self._table.version == version:
+                return
+
+            products = self.product_service.get_all_products()
+            attributes = {product.id: product_attributes(product) for product in products}
+            neighbours: Dict[str, List[Tuple[str, float]]] = {}
+            if len(products) > 1:
+                vectors = self._vectors(products, attributes)
+                top_k = self._top_k_sparse(vectors) if sparse is not None else self._top_k_python(vectors)
+                for product, ranked in zip(products, top_k):
+                    neighbours[product.id] = [(products[other].id, score) for other, score in ranked if score > 0]
+
+            # One assignment, so readers see either the old table or the new one
+            self._table = _NeighbourTable(version, neighbours, attributes)
+
+    async def refresh(self) -> None:
+        """Rebuild the table in a worker thread if the catalog changed; waits only when there is no table yet"""
+        table = self._table
+        if table is not None and table.version == self.product_service.catalog_version:
+            return
+        if self._rebuild is None or self._rebuild.done():
+            self._rebuild = asyncio.create_task(asyncio.to_thread(self.build_index))
+        if table is None:
+            await asyncio.shield(self._rebuild)
+
+    def shared_attributes(self, product_id: str, other_id: str) -> List[str]:
+        """Attribute groups two products have a value in common for"""
+        table_attributes = self._table.attributes if self._table else {}
+        attributes = table_attributes.get(product_id, {})
+        other = table_attributes.get(other_id, {})
+        return [group for group in ATTRIBUTE_WEIGHTS if attributes.get(group, set()) & other.get(group, set())]
+
+    async def get_similar(self, product_id: str, limit: int = 5) -> List[Tuple[Product, float]]:
+        """Most similar products with their similarity (0-1), best first"""
+        await self.refresh()
+        results = []
+        for other_id, score in self._table.neighbours.get(product_id, [])[:limit]:
+            product = self.product_service.get_product_by_id(other_id)
+            if product:
+                results.append((product, score))
+        return results
+
+
+# Singleton instance
+similarity_service = SimilarityService()
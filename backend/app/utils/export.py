@@ -0,0 +1,98 @@
+"""
+Streaming export helpers - serialize products one row at a time
+"""
+
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List
+
+from app.models.product import Product, SearchResult
+
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+PRODUCT_CSV_COLUMNS = [
+    "id",
+    "product_code",
+    "title",
+    "joint_type",
+    "body_design",
+    "primary_standard",
+    "size_range",
+    "material_type",
+    "material_standard",
+    "pressure_ratings",
+    "category",
+    "subcategory",
+    "keywords",
+]
+
+SEARCH_CSV_COLUMNS = ["rank", "score", "match_reason"] + PRODUCT_CSV_COLUMNS
+
+
+def flatten_product(product: Product) -> Dict[str, Any]:
+    """Flatten a product into a single CSV row"""
+    return {
+        "id": product.id,
+        "product_code": product.product_code,
+        "title": product.title,
+        "joint_type": product.joint_type,
+        "body_design": product.body_design,
+        "primary_standard": product.primary_standard,
+        "size_range": product.specifications.size_range,
+        "material_type": product.specifications.material.type,
+        "material_standard": product.specifications.material.standard,
+        "pressure_ratings": "; ".join(
+            f"{rating.sizes}: {rating.psi} PSI" for rating in product.specifications.pressure_ratings
+        ),
+        "category": product.metadata.category,
+        "subcategory": product.metadata.subcategory,
+        "keywords": "; ".join(product.metadata.keywords),
+    }
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]], columns: List[str]) -> Iterator[str]:
+    """Yield a CSV header and then one encoded line per row"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate(0)
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+
+def iter_ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Yield one JSON document per line"""
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def iter_products_export(products: Iterable[Product], export_format: str) -> Iterator[str]:
+    """Stream products as NDJSON (full documents) or CSV (flattened rows)"""
+    if export_format == "csv":
+        return iter_csv((flatten_product(p) for p in products), PRODUCT_CSV_COLUMNS)
+    return iter_ndjson(p.model_dump(mode="json") for p in products)
+
+
+def iter_search_results_export(results: Iterable[SearchResult], export_format: str) -> Iterator[str]:
+    """Stream ranked search results as NDJSON or CSV"""
+    if export_format == "csv":
+        rows = (
+            {"rank": rank, "score": r.score, "match_reason": r.match_reason, **flatten_product(r.product)}
+            for rank, r in enumerate(results, start=1)
+        )
+        return iter_csv(rows, SEARCH_CSV_COLUMNS)
+    records = (
+        {"rank": rank, **r.model_dump(mode="json")}
+        for rank, r in enumerate(results, start=1)
+    )
+    return iter_ndjson(records)
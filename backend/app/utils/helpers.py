@@ -17,6 +17,11 @@ def clean_query(query: str) -> str:
     return query
 
 
+def estimate_tokens(text: str) -> int:
+    """Rough token count for prompt budgeting (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
 def extract_size_from_query(query: str) -> Optional[str]:
     """Extract size specification from query"""
     # Look for patterns like 6", 12", 24"
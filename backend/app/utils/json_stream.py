@@ -0,0 +1,65 @@
+"""
+Incremental parsing of JSON arrays that arrive in chunks (e.g. streamed LLM output)
+"""
+
+import json
+from typing import Any, List
+
+
+class JSONArrayStreamParser:
+    """
+    Emit each top-level element of a JSON array as soon as it is complete
+
+    Text before the opening bracket (code fences, prose) is ignored. Only
+    the element currently being received is buffered, and only objects and
+    arrays are emitted; bare scalars and malformed elements are skipped.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._current: List[str] = []
+        self.finished = False
+
+    def feed(self, text: str) -> List[Any]:
+        """Consume a chunk and return the elements it completed"""
+        completed = []
+        for char in text:
+            if self.finished:
+                break
+
+            if self._depth == 0:
+                if char == '[':
+                    self._depth = 1
+                continue
+
+            if self._depth >= 2:
+                self._current.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '[{':
+                if self._depth == 1:
+                    self._current = [char]
+                self._depth += 1
+            elif char in ']}':
+                self._depth -= 1
+                if self._depth == 1 and self._current:
+                    try:
+                        completed.append(json.loads("".join(self._current)))
+                    except json.JSONDecodeError:
+                        pass
+                    self._current = []
+                elif self._depth == 0:
+                    self.finished = True
+        return completed
@@ -0,0 +1,63 @@
+"""
+Single-flight request coalescing for async calls
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Share one in-flight awaitable between concurrent callers with the same key
+
+    The first caller (the leader) starts the work as a task; callers arriving
+    while it runs await the same task. Followers are shielded, so one caller
+    disconnecting never cancels the work for the others. The key is released
+    as soon as the task finishes, so later callers start a fresh call.
+    """
+
+    def __init__(self, name: str, counter=None):
+        self.name = name
+        # Optional metric family labelled (name, role) with role leader/follower
+        self.counter = counter
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run func() once per key at a time and return its result to every caller"""
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._release(key, task))
+            role = "leader"
+        else:
+            self.followers += 1
+            role = "follower"
+        if self.counter is not None:
+            self.counter.labels(self.name, role).inc()
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.followers
+        return {
+            "name": self.name,
+            "calls": total,
+            "executions": self.leaders,
+            "coalesced": self.followers,
+            "coalesced_rate": round(self.followers / total, 4) if total else 0.0,
+            "inflight": self.inflight
+        }
@@ -0,0 +1,57 @@
+"""
+SQLite helpers shared by the local persistent stores
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+class ProcessLocalSQLite:
+    """
+    Lazily opened SQLite connection, reopened after fork
+
+    Connections must not be shared across processes, so each pre-forked
+    worker gets its own. WAL mode lets the workers read while one writes.
+    Callers hold `lock` around statements since the connection is shared
+    by the event loop and threadpool threads of one process.
+    """
+
+    def __init__(self, db_file: str, schema: str):
+        self.db_file = Path(db_file)
+        self.schema = schema
+        self.lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+
+    def connection(self) -> sqlite3.Connection:
+        """Get this process's connection, creating the database on first use"""
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_file), check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.executescript(self.schema)
+
+        self._conn = conn
+        self._conn_pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Hold the lock and run the block in one transaction, rolling back on error"""
+        with self.lock:
+            conn = self.connection()
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
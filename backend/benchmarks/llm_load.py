@@ -0,0 +1,247 @@
+"""
+LLM path load benchmark - HTS and AI search throughput and latency against the offline stand-in
+
+Starts the LLM stand-in and the real app as subprocesses, with the app's
+OpenAI client pointed at the stand-in, then drives closed-loop load for each
+scenario at each concurrency level.
+
+Run from the backend directory:
+
+    python -m benchmarks.llm_load --scenario hts --scenario search --concurrency 1,8,32 \\
+        --duration 10 --latency lognormal:800:0.5 --error-rate 0.01
+
+Scenarios:
+    hts         GET /api/v1/hts-codes/{id}?refresh=true (one LLM classification per request)
+    hts_stream  GET /api/v1/hts-codes/{id}/stream?refresh=true (also reports time to first suggestion)
+    search      GET /api/v1/search/?q=...&enhanced=true (retrieve + LLM rerank)
+    bulk        POST /api/v1/hts-codes/bulk for the whole catalog, polled until the job finishes
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.common import percentile, wait_for_server  # noqa: E402
+
+SCENARIOS = ("hts", "hts_stream", "search", "bulk")
+
+DEFAULT_QUERIES = [
+    "mechanical joint fittings for water mains",
+    "compact ductile iron fittings",
+    "flanged fittings",
+    "push on joint fittings",
+    "C153 short body",
+    "fittings with cement mortar lining",
+]
+
+
+async def _request(client: httpx.AsyncClient, scenario: str, n: int, product_ids: List[str],
+                   queries: List[str], unique_queries: bool) -> Optional[float]:
+    """Issue one scenario request; returns the time to first suggestion for streams"""
+    if scenario == "hts":
+        response = await client.get(f"/api/v1/hts-codes/{product_ids[n % len(product_ids)]}",
+                                    params={"refresh": True})
+        response.raise_for_status()
+        return None
+
+    if scenario == "hts_stream":
+        start = time.perf_counter()
+        first_suggestion = None
+        async with client.stream("GET", f"/api/v1/hts-codes/{product_ids[n % len(product_ids)]}/stream",
+                                 params={"refresh": True}) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if first_suggestion is None and line == "event: suggestion":
+                    first_suggestion = time.perf_counter() - start
+        return first_suggestion
+
+    if scenario == "search":
+        query = queries[n % len(queries)]
+        if unique_queries:
+            query = f"{query} {n}"
+        response = await client.get("/api/v1/search/", params={"q": query, "enhanced": True})
+        response.raise_for_status()
+        return None
+
+    response = await client.post("/api/v1/hts-codes/bulk", params={"all_products": True})
+    response.raise_for_status()
+    status_url = response.json()["check_status_url"]
+    while True:
+        status = (await client.get(status_url)).json()
+        if status["status"] in ("completed", "cancelled", "failed", "interrupted"):
+            if status["status"] != "completed" or status["failed"]:
+                raise RuntimeError(f"Bulk job ended {status['status']} with {status['failed']} failures")
+            return None
+        await asyncio.sleep(0.05)
+
+
+async def _drive(base_url: str, scenario: str, concurrency: int, duration: float,
+                 product_ids: List[str], queries: List[str], unique_queries: bool) -> Dict:
+    """Closed-loop load: `concurrency` tasks issue requests back to back until the deadline"""
+    latencies: List[float] = []
+    first_suggestions: List[float] = []
+    errors = 0
+    counter = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def worker():
+            nonlocal errors, counter
+            while time.perf_counter() < deadline:
+                n = counter
+                counter += 1
+                start = time.perf_counter()
+                try:
+                    first = await _request(client, scenario, n, product_ids, queries, unique_queries)
+                    if first is not None:
+                        first_suggestions.append(first)
+                except (httpx.HTTPError, RuntimeError, KeyError):
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {"latencies": latencies, "first_suggestions": first_suggestions, "errors": errors, "elapsed": elapsed}
+
+
+def _start_standin(args, port: int) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "benchmarks.llm_standin", "--port", str(port),
+        "--latency", args.latency, "--error-rate", str(args.error_rate),
+        "--rate-limit-rate", str(args.rate_limit_rate), "--seed", str(args.seed)
+    ]
+    for model_latency in args.model_latency or []:
+        command += ["--model-latency", model_latency]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _start_app(args, port: int, standin_port: int, data_dir: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        DEBUG="false",
+        OPENAI_API_KEY="sk-standin",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{standin_port}/v1",
+        HTS_CACHE_ENABLED="true" if args.with_cache else "false",
+        # Rules answer the whole bundled catalog without the model; keep them off to measure the LLM path
+        HTS_RULES_ENABLED="false",
+        # All load comes from one client address; per-client limits would cap it
+        ADMISSION_CLIENT_RATE_PER_MINUTE="0",
+        HTS_CACHE_FILE=os.path.join(data_dir, "hts_cache.sqlite3"),
+        HTS_INDEX_FILE=os.path.join(data_dir, "hts_index.sqlite3"),
+        HTS_JOBS_FILE=os.path.join(data_dir, "hts_jobs.sqlite3"),
+        PREFORK_MEMORY_REPORT_SECONDS="0",
+    )
+    for assignment in args.app_env or []:
+        key, _, value = assignment.partition("=")
+        env[key] = value
+    return subprocess.Popen(
+        [sys.executable, "main.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.app_workers)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def _stop(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def summarize(scenario: str, concurrency: int, result: Dict, llm_calls: int) -> Dict:
+    latencies = result["latencies"]
+    row = {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": result["errors"],
+        "throughput_rps": round(len(latencies) / result["elapsed"], 2) if result["elapsed"] else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "llm_calls": llm_calls,
+    }
+    if result["first_suggestions"]:
+        row["first_suggestion_p50_ms"] = round(percentile(result["first_suggestions"], 50) * 1000, 1)
+        row["first_suggestion_p95_ms"] = round(percentile(result["first_suggestions"], 95) * 1000, 1)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LLM-backed endpoints against the offline stand-in")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, dest="scenarios",
+                        help="Scenario to run (repeatable); defaults to hts and search")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per level")
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--standin-port", type=int, default=9100)
+    parser.add_argument("--app-workers", type=int, default=1)
+    parser.add_argument("--app-env", action="append", metavar="KEY=VALUE",
+                        help="Extra app setting (repeatable), e.g. OPENAI_MAX_CONCURRENCY=64")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the HTS cache enabled")
+    parser.add_argument("--unique-queries", action="store_true",
+                        help="Make every search query distinct so none are coalesced")
+    parser.add_argument("--latency", default="lognormal:800:0.5", help="Stand-in latency distribution")
+    parser.add_argument("--model-latency", action="append", metavar="MODEL=DIST")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    scenarios = args.scenarios or ["hts", "search"]
+    levels = [int(level) for level in args.concurrency.split(",")]
+    base_url = f"http://127.0.0.1:{args.port}"
+    standin_url = f"http://127.0.0.1:{args.standin_port}"
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="llm_bench_") as data_dir:
+        standin = _start_standin(args, args.standin_port)
+        app = _start_app(args, args.port, args.standin_port, data_dir)
+        try:
+            wait_for_server(f"{standin_url}/stats")
+            wait_for_server(f"{base_url}/health")
+            product_ids = [product["id"] for product in httpx.get(f"{base_url}/api/v1/products/").json()]
+
+            for scenario in scenarios:
+                for concurrency in levels:
+                    if args.warmup > 0:
+                        asyncio.run(_drive(base_url, scenario, concurrency, args.warmup,
+                                           product_ids, DEFAULT_QUERIES, args.unique_queries))
+                    httpx.post(f"{standin_url}/stats/reset")
+                    result = asyncio.run(_drive(base_url, scenario, concurrency, args.duration,
+                                                product_ids, DEFAULT_QUERIES, args.unique_queries))
+                    llm_calls = httpx.get(f"{standin_url}/stats").json().get("requests", 0)
+                    row = summarize(scenario, concurrency, result, llm_calls)
+                    rows.append(row)
+                    print(row, flush=True)
+        finally:
+            _stop(app)
+            _stop(standin)
+
+    print()
+    print(f"{'scenario':>10} {'conc':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'requests':>9} {'errors':>7} {'llm calls':>10}")
+    for row in rows:
+        print(
+            f"{row['scenario']:>10} {row['concurrency']:>5} {row['throughput_rps']:>8} {row['p50_ms']:>9} "
+            f"{row['p95_ms']:>9} {row['p99_ms']:>9} {row['requests']:>9} {row['errors']:>7} {row['llm_calls']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
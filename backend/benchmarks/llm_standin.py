@@ -0,0 +1,231 @@
+"""
+Offline OpenAI-compatible stand-in server for load tests and benchmarks
+
+Serves POST /v1/chat/completions (plain and streaming) with deterministic
+canned answers for the prompts this app sends: single and batched HTS
+classification, and AI search reranking. Latency follows a configurable
+distribution and a configurable share of calls fail with 5xx or 429.
+
+Run from the backend directory:
+
+    python -m benchmarks.llm_standin --port 9100 --latency lognormal:800:0.5 \\
+        --model-latency gpt-4o-mini=lognormal:300:0.4 --error-rate 0.02
+
+then point the app at it with OPENAI_BASE_URL=http://127.0.0.1:9100/v1.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Codes in the bundled HTS schedule, so canned answers pass validation
+CANNED_HTS_SUGGESTIONS = [
+    {"code": "7307.19.3000", "description": "Ductile iron cast fittings",
+     "confidence": 0.9, "reasoning": "Cast pipe fitting of ductile iron"},
+    {"code": "7307.11.0000", "description": "Cast fittings of nonmalleable cast iron",
+     "confidence": 0.6, "reasoning": "Alternative cast-iron fitting classification"},
+    {"code": "7307.19.9000", "description": "Other cast fittings of iron or steel",
+     "confidence": 0.4, "reasoning": "Residual cast fittings line"},
+]
+
+PRODUCT_ID_PATTERN = re.compile(r'Product ID: (\S+)')
+CANDIDATE_ID_PATTERN = re.compile(r'"id": "([^"]+)"')
+
+
+class LatencyDistribution:
+    """Latency sampler parsed from 'fixed:MS', 'uniform:LO:HI', 'normal:MEAN:STD' or 'lognormal:MEDIAN:SIGMA'"""
+
+    def __init__(self, spec: str):
+        kind, *params = spec.split(":")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise ValueError(f"Invalid latency distribution: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        """One latency in seconds"""
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(*self.params)
+        elif self.kind == "normal":
+            ms = rng.gauss(*self.params)
+        else:
+            median, sigma = self.params
+            ms = median * rng.lognormvariate(0, sigma)
+        return max(0.0, ms) / 1000
+
+
+@dataclass
+class StandinConfig:
+    latency: LatencyDistribution = field(default_factory=lambda: LatencyDistribution("fixed:0"))
+    model_latency: Dict[str, LatencyDistribution] = field(default_factory=dict)
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    seed: int = 0
+    # Optional recorded answers: [{"match": "substring of the prompt", "content": "..."}]
+    recordings: List[Dict[str, str]] = field(default_factory=list)
+
+
+def canned_content(prompt: str, recordings: List[Dict[str, str]]) -> str:
+    """Deterministic answer for a prompt"""
+    for recording in recordings:
+        if recording["match"] in prompt:
+            return recording["content"]
+
+    batch_ids = PRODUCT_ID_PATTERN.findall(prompt)
+    if batch_ids:
+        return json.dumps({product_id: _hts_answer(product_id) for product_id in batch_ids})
+
+    if "Harmonized Tariff Schedule" in prompt:
+        return json.dumps(_hts_answer(prompt))
+
+    # Search rerank: return the offered candidates in a stable, prompt-dependent order
+    candidate_ids = list(dict.fromkeys(CANDIDATE_ID_PATTERN.findall(prompt)))
+    candidate_ids.sort(key=lambda product_id: hashlib.md5((prompt + product_id).encode()).hexdigest())
+    return json.dumps(candidate_ids[:10])
+
+
+def _hts_answer(seed_text: str) -> List[Dict]:
+    """Two of the canned suggestions, picked by a hash of the prompt or product id"""
+    offset = int(hashlib.md5(seed_text.encode()).hexdigest(), 16) % len(CANNED_HTS_SUGGESTIONS)
+    return (CANNED_HTS_SUGGESTIONS[offset:] + CANNED_HTS_SUGGESTIONS[:offset])[:2]
+
+
+def create_standin_app(config: StandinConfig) -> FastAPI:
+    """Build the stand-in ASGI app"""
+    app = FastAPI(title="LLM stand-in")
+    rng = random.Random(config.seed)
+    stats: Counter = Counter()
+
+    def completion_body(model: str, content: str, prompt: str) -> Dict:
+        prompt_tokens = len(prompt) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        return {
+            "id": f"chatcmpl-standin-{stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        }
+
+    def chunk_body(model: str, delta: Dict, finish_reason: Optional[str] = None) -> str:
+        body = {
+            "id": f"chatcmpl-standin-{stats['requests']}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        return f"data: {json.dumps(body)}\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        stats["requests"] += 1
+        stats[f"model:{model}"] += 1
+
+        latency = config.model_latency.get(model, config.latency).sample(rng)
+        roll = rng.random()
+
+        if roll < config.error_rate:
+            await asyncio.sleep(latency)
+            stats["injected_5xx"] += 1
+            return JSONResponse(status_code=500, content={"error": {"message": "Injected server error",
+                                                                      "type": "server_error"}})
+        if roll < config.error_rate + config.rate_limit_rate:
+            stats["injected_429"] += 1
+            return JSONResponse(status_code=429, headers={"retry-after": "1"},
+                                content={"error": {"message": "Injected rate limit", "type": "rate_limit"}})
+
+        content = canned_content(prompt, config.recordings)
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return completion_body(model, content, prompt)
+
+        async def events():
+            # First token after 20% of the latency, the rest spread evenly
+            pieces = [content[i:i + 24] for i in range(0, len(content), 24)] or [""]
+            await asyncio.sleep(latency * 0.2)
+            yield chunk_body(model, {"role": "assistant", "content": ""})
+            for piece in pieces:
+                yield chunk_body(model, {"content": piece})
+                await asyncio.sleep(latency * 0.8 / len(pieces))
+            yield chunk_body(model, {}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def get_stats():
+        """Requests served by model and injected failures"""
+        return dict(stats)
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        stats.clear()
+        return {"reset": True}
+
+    return app
+
+
+def parse_model_latency(values: List[str]) -> Dict[str, LatencyDistribution]:
+    model_latency = {}
+    for value in values or []:
+        model, _, spec = value.partition("=")
+        model_latency[model] = LatencyDistribution(spec)
+    return model_latency
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="lognormal:800:0.5",
+                        help="Default latency distribution (fixed:MS, uniform:LO:HI, normal:MEAN:STD, lognormal:MEDIAN:SIGMA)")
+    parser.add_argument("--model-latency", action="append", metavar="MODEL=DIST",
+                        help="Per-model latency distribution (repeatable)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of calls answered with HTTP 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--recordings", help="JSON file of recorded answers: [{\"match\": ..., \"content\": ...}]")
+    args = parser.parse_args()
+
+    recordings = []
+    if args.recordings:
+        with open(args.recordings, 'r', encoding='utf-8') as f:
+            recordings = json.load(f)
+
+    config = StandinConfig(
+        latency=LatencyDistribution(args.latency),
+        model_latency=parse_model_latency(args.model_latency),
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+        recordings=recordings
+    )
+    uvicorn.run(create_standin_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
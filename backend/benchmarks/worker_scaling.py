@@ -0,0 +1,154 @@
+"""
+Worker scaling benchmark - throughput of the pre-fork server from 1 to N workers
+
+Run from the backend directory:
+
+    python -m benchmarks.worker_scaling --max-workers 4 --duration 10
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.core.prefork import get_process_memory  # noqa: E402
+from benchmarks.common import percentile, wait_for_server  # noqa: E402
+
+
+async def _drive(base_url: str, paths: List[str], concurrency: int, duration: float) -> Dict:
+    """Closed-loop load: `concurrency` tasks issue requests back to back until the deadline"""
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def worker(offset: int):
+            nonlocal errors
+            i = offset
+            while time.perf_counter() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+
+    return {"latencies": latencies, "errors": errors}
+
+
+def _load_process(base_url: str, paths: List[str], concurrency: int, duration: float, queue) -> None:
+    queue.put(asyncio.run(_drive(base_url, paths, concurrency, duration)))
+
+
+def _worker_pids(parent_pid: int) -> List[int]:
+    children_file = Path(f"/proc/{parent_pid}/task/{parent_pid}/children")
+    if not children_file.exists():
+        return []
+    return [int(pid) for pid in children_file.read_text().split()]
+
+
+def run_benchmark(workers: int, port: int, paths: List[str], load_processes: int,
+                  concurrency: int, duration: float, warmup: float) -> Dict:
+    """Start the server with `workers` processes, drive load and collect stats"""
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, DEBUG="false", PREFORK_MEMORY_REPORT_SECONDS="0")
+    server = subprocess.Popen(
+        [sys.executable, "main.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    try:
+        wait_for_server(f"{base_url}/health")
+        if warmup > 0:
+            asyncio.run(_drive(base_url, paths, concurrency, warmup))
+
+        queue = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=_load_process, args=(base_url, paths, concurrency, duration, queue))
+            for _ in range(load_processes)
+        ]
+        for proc in procs:
+            proc.start()
+        results = [queue.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+        pids = _worker_pids(server.pid) if workers > 1 else [server.pid]
+        memory = [get_process_memory(pid) for pid in pids]
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    latencies = [lat for result in results for lat in result["latencies"]]
+    errors = sum(result["errors"] for result in results)
+    uss = [m["uss_kb"] for m in memory if m]
+
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "avg_worker_uss_kb": int(sum(uss) / len(uss)) if uss else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pre-fork worker scaling")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per worker count")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--load-processes", type=int, default=2, help="Client processes generating load")
+    parser.add_argument("--concurrency", type=int, default=32, help="In-flight requests per client process")
+    parser.add_argument("--path", action="append", dest="paths",
+                        help="Request path (repeatable); defaults to a mix of search and product lookups")
+    args = parser.parse_args()
+
+    paths = args.paths or [
+        "/api/v1/search/?q=mechanical%20joint",
+        "/api/v1/search/?q=C153",
+        "/api/v1/products/c153-ductile-iron-mj",
+        "/api/v1/products/filters/options",
+    ]
+
+    rows = []
+    for workers in range(1, args.max_workers + 1):
+        row = run_benchmark(workers, args.port, paths, args.load_processes,
+                            args.concurrency, args.duration, args.warmup)
+        rows.append(row)
+        print(row, flush=True)
+
+    baseline = rows[0]["throughput_rps"] or 1
+    print()
+    print(f"{'workers':>7} {'req/s':>10} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8} {'USS/worker KiB':>15} {'errors':>7}")
+    for row in rows:
+        print(
+            f"{row['workers']:>7} {row['throughput_rps']:>10} {row['throughput_rps'] / baseline:>8.2f} "
+            f"{row['p50_ms']:>8} {row['p99_ms']:>8} {row['avg_worker_uss_kb']:>15} {row['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
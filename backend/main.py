@@ -3,18 +3,52 @@ SIGMA Product Catalog FastAPI Application
 Main entry point for the API server
 """
 
+import argparse
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.core.config import settings
-from app.routers import products, search, hts_codes
+from app.core.metrics import MetricsMiddleware, metrics
+from app.core.prefork import get_process_memory, serve_prefork
+from app.core.security import close_openai_client
+from app.routers import products, search, hts_codes, llm
+from app.services.analytics_service import analytics_service
+from app.services.hts_job_service import hts_job_service
+from app.services.similarity_service import similarity_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup/shutdown hooks"""
+    # Neighbour table off the event loop (a no-op when the pre-fork parent built it)
+    await asyncio.to_thread(similarity_service.build_index)
+
+    snapshot_task = None
+    if settings.ANALYTICS_SNAPSHOT_FILE:
+        analytics_service.load_snapshot()
+        snapshot_task = asyncio.create_task(analytics_service.run_snapshots())
+
+    yield
+
+    if snapshot_task:
+        snapshot_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await snapshot_task
+    await hts_job_service.shutdown()
+    # Release pooled OpenAI connections
+    await close_openai_client()
 
 
 def create_app() -> FastAPI:
     """Create and configure FastAPI application"""
     
     app = FastAPI(
+        lifespan=lifespan,
         title=settings.PROJECT_NAME,
         version=settings.PROJECT_VERSION,
         description="Product catalog API with AI-powered search and HTS code suggestions",
@@ -31,6 +65,10 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # Per-route latency, status and payload size metrics
+    if settings.METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware)
+
     # Include routers
     app.include_router(
         products.router,
@@ -50,6 +88,12 @@ def create_app() -> FastAPI:
         tags=["hts-codes"]
     )
 
+    app.include_router(
+        llm.router,
+        prefix="/api/v1/llm",
+        tags=["llm"]
+    )
+
     @app.get("/", tags=["root"])
     async def root():
         """Root endpoint"""
@@ -64,15 +108,35 @@ def create_app() -> FastAPI:
         """Health check endpoint"""
         return {"status": "healthy", "service": "sigma-product-catalog"}
 
+    @app.get("/health/memory", tags=["health"])
+    async def memory_usage():
+        """Memory usage of the worker process serving this request"""
+        return get_process_memory()
+
+    @app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+    async def get_metrics():
+        """Prometheus text exposition of in-process metrics"""
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
     return app
 
 
 app = create_app()
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=settings.DEBUG
-    )
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the SIGMA Product Catalog API")
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=settings.WORKERS,
+                        help="Number of pre-forked worker processes (1 = single process)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        serve_prefork(app, host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            reload=settings.DEBUG
+        )
@@ -0,0 +1,309 @@
+"""
+Offline HTS precomputation for the whole catalog
+
+Classifies every product (or only products whose content changed since the
+last run) so suggestions are ready before anyone asks for them:
+
+1. Rule pass: a process pool evaluates the HTS rules and validates their
+   codes against the schedule for every product.
+2. LLM pass: products without a confident rule answer go to the model
+   through an async worker pool (batched prompts, rate limited).
+
+Every result is appended to a JSONL file; model answers are also stored
+in the HTS cache (and code index) the API serves from. A checkpoint maps
+product id -> content fingerprint (the HTS cache key) of every product
+classified so far, so an interrupted run continues with --resume and a
+later run can skip unchanged products with --changed-only.
+
+Run from the backend directory:
+
+    python precompute_hts.py --output app/data/hts_precomputed.jsonl --concurrency 4 --llm-rpm 120
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.security import close_openai_client
+from app.models.product import Product, HTSCodeResponse
+from app.services.hts_cache_service import hts_cache_service
+from app.services.hts_rules_service import hts_rules_service
+from app.services.openai_service import openai_service, hts_prompt_fields, HTS_MODEL, HTS_PROMPT_VERSION
+from app.services.product_service import product_service
+
+DEFAULT_OUTPUT = str(Path(settings.DATA_DIR) / "hts_precomputed.jsonl")
+RULE_CHUNK_SIZE = 256
+
+
+def fingerprint(product: Product) -> str:
+    """Content fingerprint of a product: its HTS cache key"""
+    return hts_cache_service.make_key(hts_prompt_fields(product), HTS_MODEL, HTS_PROMPT_VERSION)
+
+
+def rule_pass(product_dicts: List[Dict[str, Any]]) -> List[Tuple[str, Optional[List[Dict[str, Any]]]]]:
+    """
+    Process pool task: confident, schedule-checked rule answers for a chunk of products
+
+    Returns (product_id, suggestions) pairs; suggestions is None when the
+    product needs the model.
+    """
+    from app.services.hts_schedule_service import hts_schedule_service
+
+    results = []
+    for product_dict in product_dicts:
+        product = Product(**product_dict)
+        suggestions = hts_rules_service.classify(product)
+        if suggestions:
+            suggestions = [s for s in suggestions if hts_schedule_service.validate(s.code)["is_valid"]]
+        results.append((product.id, [s.model_dump() for s in suggestions] if suggestions else None))
+    return results
+
+
+class RateLimiter:
+    """Async token bucket: at most `rate_per_minute` acquisitions per minute, with bursts of `burst`"""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class Checkpoint:
+    """Product id -> fingerprint of completed classifications, saved atomically"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.fingerprints: Dict[str, str] = {}
+
+    def load(self) -> None:
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.fingerprints = json.load(f).get("fingerprints", {})
+
+    def is_current(self, product: Product, product_fingerprint: str) -> bool:
+        return self.fingerprints.get(product.id) == product_fingerprint
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"saved_at": datetime.now().isoformat(), "fingerprints": self.fingerprints}, f)
+        os.replace(temp_path, self.path)
+
+
+class Precomputation:
+    """One precomputation run: rule pass, LLM pass, output and checkpointing"""
+
+    def __init__(self, args):
+        self.args = args
+        self.output_path = Path(args.output)
+        self.checkpoint = Checkpoint(Path(args.checkpoint or f"{args.output}.checkpoint"))
+        self.limiter = RateLimiter(args.llm_rpm, burst=args.concurrency)
+        self.counts: Dict[str, int] = {"rules": 0, "cache": 0, "llm": 0, "fallback": 0, "failed": 0, "skipped": 0}
+        self.timings: Dict[str, float] = {}
+        self.llm_calls = 0
+        self.llm_requests = 0
+        self._since_save = 0
+        self._output = None
+
+    def select_products(self) -> List[Tuple[Product, str]]:
+        """Products to classify with their fingerprints"""
+        products = product_service.get_all_products()
+        if self.args.product:
+            wanted = set(self.args.product)
+            products = [product for product in products if product.id in wanted]
+
+        selected = []
+        for product in products:
+            product_fingerprint = fingerprint(product)
+            if (self.args.resume or self.args.changed_only) and self.checkpoint.is_current(product, product_fingerprint):
+                self.counts["skipped"] += 1
+                continue
+            selected.append((product, product_fingerprint))
+        return selected
+
+    def record(self, product: Product, product_fingerprint: str, response: HTSCodeResponse, duration_ms: int) -> None:
+        """Append one result and checkpoint it unless it is a fallback answer"""
+        source = response.source
+        self.counts[source] = self.counts.get(source, 0) + 1
+        self._output.write(json.dumps({
+            "product_id": product.id,
+            "fingerprint": product_fingerprint,
+            "source": source,
+            "generated_at": response.generated_at,
+            "duration_ms": duration_ms,
+            "suggestions": [s.model_dump() for s in response.suggestions]
+        }, ensure_ascii=False) + "\n")
+        self._output.flush()
+
+        # Fallback answers are written but retried by the next --resume
+        if source != "fallback":
+            self.checkpoint.fingerprints[product.id] = product_fingerprint
+            self._since_save += 1
+            if self._since_save >= self.args.checkpoint_every:
+                self.checkpoint.save()
+                self._since_save = 0
+
+    def run_rule_pass(self, selected: List[Tuple[Product, str]]) -> List[Tuple[Product, str]]:
+        """Answer what the rules can; return the products that still need the model"""
+        start = time.perf_counter()
+        dicts = [product.model_dump() for product, _ in selected]
+        chunks = [dicts[i:i + RULE_CHUNK_SIZE] for i in range(0, len(dicts), RULE_CHUNK_SIZE)]
+
+        if self.args.processes > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=self.args.processes) as pool:
+                chunk_results = list(pool.map(rule_pass, chunks))
+        else:
+            chunk_results = [rule_pass(chunk) for chunk in chunks]
+        answers = {product_id: suggestions for results in chunk_results for product_id, suggestions in results}
+
+        remaining = []
+        generated_at = datetime.now().isoformat()
+        for product, product_fingerprint in selected:
+            suggestions = answers.get(product.id)
+            if suggestions:
+                response = HTSCodeResponse(product_id=product.id, suggestions=suggestions,
+                                           generated_at=generated_at, source="rules")
+                self.record(product, product_fingerprint, response, 0)
+            else:
+                remaining.append((product, product_fingerprint))
+
+        self.timings["rule_pass_seconds"] = time.perf_counter() - start
+        return remaining
+
+    async def limit_request(self) -> None:
+        """Rate-limit hook awaited by the OpenAI service before each provider request"""
+        await self.limiter.acquire()
+        self.llm_requests += 1
+
+    async def run_llm_pass(self, remaining: List[Tuple[Product, str]]) -> None:
+        """Classify the remaining products in batches through the rate-limited worker pool"""
+        start = time.perf_counter()
+        batch_size = max(1, settings.HTS_BATCH_SIZE)
+        queue: asyncio.Queue = asyncio.Queue()
+        for i in range(0, len(remaining), batch_size):
+            queue.put_nowait(remaining[i:i + batch_size])
+
+        async def worker():
+            while True:
+                try:
+                    chunk = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                self.llm_calls += 1
+                chunk_start = time.perf_counter()
+                try:
+                    responses = await openai_service.classify_products_batch(
+                        [product for product, _ in chunk], use_cache=not self.args.refresh
+                    )
+                except Exception as e:
+                    print(f"Batch of {len(chunk)} products failed: {e}")
+                    self.counts["failed"] += len(chunk)
+                    continue
+                duration_ms = int((time.perf_counter() - chunk_start) * 1000)
+                for product, product_fingerprint in chunk:
+                    response = responses.get(product.id)
+                    if response is None:
+                        self.counts["failed"] += 1
+                    else:
+                        self.record(product, product_fingerprint, response, duration_ms)
+                print(f"  classified {len(chunk)} products in {duration_ms}ms", flush=True)
+
+        # Every model request a batch makes (follow-ups, escalations, retries, hedges) takes a token
+        openai_service.request_limiter = self.limit_request
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, self.args.concurrency))))
+        finally:
+            openai_service.request_limiter = None
+            await close_openai_client()
+        self.timings["llm_pass_seconds"] = time.perf_counter() - start
+
+    def run(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        if self.args.resume or self.args.changed_only:
+            self.checkpoint.load()
+
+        selected = self.select_products()
+        print(f"Classifying {len(selected)} products ({self.counts['skipped']} unchanged and skipped)", flush=True)
+
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        # Incremental runs add to the results of earlier ones instead of replacing them
+        append = self.args.resume or self.args.changed_only
+        self._output = open(self.output_path, 'a' if append else 'w', encoding='utf-8')
+        try:
+            remaining = self.run_rule_pass(selected)
+            print(f"Rules answered {len(selected) - len(remaining)}; {len(remaining)} need the model", flush=True)
+            if remaining:
+                asyncio.run(self.run_llm_pass(remaining))
+        finally:
+            self._output.close()
+            self.checkpoint.save()
+
+        elapsed = time.perf_counter() - start
+        classified = len(selected) - self.counts["failed"]
+        return {
+            "products": len(selected) + self.counts["skipped"],
+            "classified": classified,
+            **self.counts,
+            "llm_batches": self.llm_calls,
+            "llm_requests": self.llm_requests,
+            "elapsed_seconds": round(elapsed, 3),
+            "products_per_second": round(classified / elapsed, 2) if elapsed else 0.0,
+            **{name: round(seconds, 3) for name, seconds in self.timings.items()},
+            "output": str(self.output_path),
+            "checkpoint": str(self.checkpoint.path)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute HTS suggestions for the whole catalog")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSONL file of results")
+    parser.add_argument("--checkpoint", help="Checkpoint file (defaults to <output>.checkpoint)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run: append to the output and skip checkpointed products")
+    parser.add_argument("--changed-only", action="store_true",
+                        help="Only classify products whose content changed since they were checkpointed "
+                             "(appends to the output; the last line per product is current)")
+    parser.add_argument("--product", action="append", help="Restrict to a product id (repeatable)")
+    parser.add_argument("--refresh", action="store_true", help="Bypass the HTS cache and ask the model again")
+    parser.add_argument("--concurrency", type=int, default=settings.HTS_BULK_CONCURRENCY,
+                        help="Concurrent LLM batches in flight")
+    parser.add_argument("--llm-rpm", type=float, default=60.0,
+                        help="Maximum LLM requests per minute, retries and follow-ups included (0 = unlimited)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="Processes for the rule and validation pass")
+    parser.add_argument("--checkpoint-every", type=int, default=25, help="Save the checkpoint every N products")
+    args = parser.parse_args()
+
+    report = Precomputation(args).run()
+
+    print()
+    print("HTS precomputation report")
+    for name, value in report.items():
+        print(f"  {name:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 HTS Codes components for Streamlit frontend
 """
 
+import time
+
 import streamlit as st
 import pandas as pd
 from typing import Dict, List, Any
@@ -68,57 +70,81 @@ def hts_codes_interface():
             validate_hts_code(hts_input)
 
 
-def generate_hts_codes(product_id: str):
-    """Generate HTS codes for a specific product"""
+def generate_hts_codes(product_id: str, refresh: bool = False):
+    """Generate HTS codes for a specific product, showing suggestions as they stream in"""
     api_client = get_api_client()
 
-    with show_loading():
-        hts_result = api_client.get_hts_codes(product_id)
-
-    if hts_result["success"]:
-        data = hts_result["data"]
-
+    header = st.empty()
+    header.info("Generating HTS codes...")
+    suggestions_area = st.container()
+
+    data = {"suggestions": []}
+    done = None
+    for event, payload in api_client.stream_hts_codes(product_id, refresh=refresh):
+        if event == "meta":
+            data.update(payload)
+        elif event == "suggestion":
+            with suggestions_area:
+                if not data["suggestions"]:
+                    st.markdown("### HTS Code Suggestions")
+                create_hts_display([payload], use_expanders=True, start=len(data["suggestions"]) + 1)
+            data["suggestions"].append(payload)
+        elif event == "done":
+            done = payload
+        elif event == "error":
+            header.empty()
+            display_api_error(payload["error"])
+            return
+
+    if done is None:
+        header.empty()
+        display_api_error("HTS stream ended unexpectedly")
+        return
+
+    with header.container():
         st.success(f"Generated HTS codes for product: {data['product_id']}")
-        st.info(f"Generated at: {data['generated_at']}")
-
-        if data["suggestions"]:
-            st.markdown("### HTS Code Suggestions")
-            # Use the expander version since this is not nested
-            create_hts_display(data["suggestions"], use_expanders=True)
-
-            # Export options
-            st.markdown("### Export Options")
-
-            col1, col2, col3 = st.columns(3)
-
-            with col1:
-                if st.button("Copy to Clipboard"):
-                    hts_text = "\n".join([
-                        f"{s['code']}: {s['description']} (Confidence: {s['confidence']:.1%})"
-                        for s in data["suggestions"]
-                    ])
-                    st.text_area("HTS Codes:", value=hts_text, height=100)
-
-            with col2:
-                df = pd.DataFrame(data["suggestions"])
-                csv = df.to_csv(index=False)
-                st.download_button(
-                    label="Download CSV",
-                    data=csv,
-                    file_name=f"hts_codes_{product_id}.csv",
-                    mime="text/csv"
-                )
-
-            with col3:
-                if st.button("Regenerate"):
-                    st.cache_data.clear()
-                    generate_hts_codes(product_id)
-
+        if data.get("cached"):
+            st.info(f"Served from cache (generated at: {data['generated_at']})")
         else:
-            st.warning("No HTS code suggestions were generated for this product.")
+            st.info(f"Generated at: {data['generated_at']}")
+        if done["source"] == "rules":
+            st.info("Classified by the HTS rule table (no AI call needed).")
+        elif done["source"] == "fallback":
+            st.warning("AI classification was unavailable; showing fallback codes.")
+        elif done["source"] == "partial":
+            st.warning("Generation was interrupted; the suggestions may be incomplete.")
+
+    if data["suggestions"]:
+        # Export options
+        st.markdown("### Export Options")
+
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            if st.button("Copy to Clipboard"):
+                hts_text = "\n".join([
+                    f"{s['code']}: {s['description']} (Confidence: {s['confidence']:.1%})"
+                    for s in data["suggestions"]
+                ])
+                st.text_area("HTS Codes:", value=hts_text, height=100)
+
+        with col2:
+            df = pd.DataFrame(data["suggestions"])
+            csv = df.to_csv(index=False)
+            st.download_button(
+                label="Download CSV",
+                data=csv,
+                file_name=f"hts_codes_{product_id}.csv",
+                mime="text/csv"
+            )
+
+        with col3:
+            if st.button("Regenerate"):
+                st.cache_data.clear()
+                generate_hts_codes(product_id, refresh=True)
 
     else:
-        display_api_error(hts_result["error"])
+        st.warning("No HTS code suggestions were generated for this product.")
 
 
 def validate_hts_code(hts_code: str):
@@ -139,6 +165,10 @@ def validate_hts_code(hts_code: str):
             st.warning(data.get("error", "Invalid format"))
             st.info(f"Expected format: {data['format']}")
 
+        # Chapter / heading / subheading resolved from the tariff schedule
+        for level, entry in data.get("hierarchy", {}).items():
+            st.write(f"**{level.replace('_', ' ').title()}** {entry['code']}: {entry['description']}")
+
     else:
         display_api_error(validation_result["error"])
 
@@ -190,52 +220,70 @@ def bulk_hts_interface():
         selected_products = st.multiselect(
             "Select Products for Bulk HTS Generation:",
             options=list(product_options.keys()),
-            help="Choose multiple products (max 20)"
+            help="Choose multiple products; they are classified in parallel on the server"
         )
 
         if selected_products:
-            if len(selected_products) > 20:
-                st.error("Maximum 20 products allowed for bulk processing")
-            else:
-                st.success(f"Selected {len(selected_products)} products")
-
-                if st.button("Start Bulk Generation"):
-                    product_ids = [product_options[name] for name in selected_products]
-
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-
-                    results = []
-
-                    for i, product_id in enumerate(product_ids):
-                        status_text.text(f"Processing {i+1}/{len(product_ids)}: {selected_products[i]}")
-
-                        hts_result = api_client.get_hts_codes(product_id)
-
-                        if hts_result["success"]:
-                            results.append({
-                                "product": selected_products[i],
-                                "product_id": product_id,
-                                "suggestions": hts_result["data"]["suggestions"]
-                            })
-
-                        progress_bar.progress((i + 1) / len(product_ids))
-
-                    status_text.text("Bulk processing complete!")
-
-                    if results:
-                        st.markdown("### Bulk Generation Results")
-
-                        for result in results:
-                            with st.expander(f"{result['product']}"):
-                                if result["suggestions"]:
-                                    # Use the flat version inside expanders to avoid nesting
-                                    create_hts_display_flat(result["suggestions"])
-                                else:
-                                    st.warning("No suggestions generated")
-
-                        if st.button("Export All Results"):
-                            export_bulk_results(results)
+            st.success(f"Selected {len(selected_products)} products")
+
+            if st.button("Start Bulk Generation"):
+                product_ids = [product_options[name] for name in selected_products]
+                names_by_id = {product_options[name]: name for name in selected_products}
+
+                start_result = api_client.start_bulk_hts(product_ids)
+                if not start_result["success"]:
+                    display_api_error(start_result["error"])
+                    return
+
+                task_id = start_result["data"]["task_id"]
+                progress_bar = st.progress(0)
+                status_text = st.empty()
+
+                # Poll the job engine for real progress
+                while True:
+                    status_result = api_client.get_bulk_hts_status(task_id)
+                    if not status_result["success"]:
+                        display_api_error(status_result["error"])
+                        return
+
+                    job = status_result["data"]
+                    progress_bar.progress(job["percent_complete"] / 100)
+                    status_text.text(f"{job['progress']} ({job['cached']} from cache, {job['failed']} failed)")
+
+                    if job["status"] not in ("queued", "running"):
+                        break
+                    time.sleep(1)
+
+                status_text.text(f"Bulk processing {job['status']}: {job['progress']}")
+
+                results_result = api_client.get_bulk_hts_results(task_id)
+                if not results_result["success"]:
+                    display_api_error(results_result["error"])
+                    return
+
+                results = [
+                    {
+                        "product": names_by_id.get(item["product_id"], item["product_id"]),
+                        "product_id": item["product_id"],
+                        "suggestions": item["suggestions"]
+                    }
+                    for item in results_result["data"]["items"]
+                    if item["status"] == "completed"
+                ]
+
+                if results:
+                    st.markdown("### Bulk Generation Results")
+
+                    for result in results:
+                        with st.expander(f"{result['product']}"):
+                            if result["suggestions"]:
+                                # Use the flat version inside expanders to avoid nesting
+                                create_hts_display_flat(result["suggestions"])
+                            else:
+                                st.warning("No suggestions generated")
+
+                    if st.button("Export All Results"):
+                        export_bulk_results(results)
 
         else:
             st.info("Please select products for bulk HTS generation")
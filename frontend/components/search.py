@@ -143,6 +143,8 @@ def ai_search_tab():
     with col3:
         results_limit = st.selectbox("Results", [5, 10, 15, 20], index=1, key="ai_limit")
         clear_button = st.button("Clear", use_container_width=True, key="ai_clear")
+        whole_catalog = st.checkbox("Whole catalog", key="ai_fanout",
+                                    help="Let the AI rank every product instead of the top keyword matches")
     
     # Handle clear button
     if clear_button:
@@ -166,18 +168,24 @@ def ai_search_tab():
         st.session_state.current_ai_query = ai_query
         st.session_state.current_ai_limit = results_limit
         
-        # Perform AI search
+        # Perform AI search: quick local matches now, the AI ranking when ready
         api_client = get_api_client()
         with show_loading():
             search_result = api_client.search_products(
                 query=ai_query,
                 enhanced=True,
-                limit=results_limit
+                limit=results_limit,
+                fanout=whole_catalog,
+                progressive=True
             )
         
         # Store results
         st.session_state.search_results_data = search_result
         st.session_state.search_type = "ai"
+        if search_result["success"] and search_result["data"].get("ai_token"):
+            st.session_state.ai_search_token = search_result["data"]["ai_token"]
+        else:
+            st.session_state.pop("ai_search_token", None)
         st.rerun()
     
     elif search_button and not ai_query:
@@ -190,12 +198,49 @@ def ai_search_tab():
             st.session_state.get("current_ai_query", ""),
             "ai"
         )
+        upgrade_ai_search_results()
     
     # AI tips when no active search
     elif not st.session_state.get("search_results_data"):
         st.info("Ask natural language questions like: 'What products work with 12 inch pipes?' or 'Show me high pressure fittings'")
 
 
+def upgrade_ai_search_results():
+    """Replace the quick local matches with the AI ranking once it is ready"""
+    token = st.session_state.get("ai_search_token")
+    if not token:
+        return
+    
+    api_client = get_api_client()
+    with st.spinner("Ranking results with AI..."):
+        ai_result = api_client.get_progressive_search_results(token)
+    
+    if not ai_result["success"]:
+        del st.session_state.ai_search_token
+        st.warning(f"AI ranking unavailable, showing quick matches: {ai_result['error']}")
+        return
+    
+    ai_data = ai_result["data"]
+    if ai_data["status"] == "pending":
+        # Still ranking: poll again
+        st.rerun()
+    
+    del st.session_state.ai_search_token
+    if ai_data["results"]:
+        data = st.session_state.search_results_data["data"]
+        st.session_state.search_results_data = {
+            "success": True,
+            "data": {
+                **data,
+                "total_results": ai_data["total_results"],
+                "results": ai_data["results"],
+                "ai_token": None,
+                "ai_ranked": ai_data["ai_ranked"]
+            }
+        }
+    st.rerun()
+
+
 def display_persistent_search_results(search_result: dict, query: str, search_type: str):
     """Display search results that persist across page interactions"""
     
@@ -213,6 +258,10 @@ def display_persistent_search_results(search_result: dict, query: str, search_ty
     with col1:
         if search_type == "basic":
             st.info(f"Found {data['total_results']} products in {data.get('search_time_ms', 0)}ms")
+        elif data.get("ai_token"):
+            st.info(f"Showing {data['total_results']} quick matches found in {data.get('search_time_ms', 0)}ms while the AI ranks them")
+        elif data.get("ai_ranked") is False:
+            st.info(f"AI analysis unavailable, showing {data['total_results']} keyword matches")
         else:
             st.info(f"Found {data['total_results']} products using AI analysis")
     
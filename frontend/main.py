@@ -241,6 +241,8 @@ def show_similar_products(product_id: str):
                         st.write(f"**{similar_product['title']}**")
                         st.caption(f"Code: {similar_product['product_code']} | Joint: {similar_product['joint_type']} | Design: {similar_product['body_design']}")
                         st.caption(f"Size Range: {similar_product['specifications']['size_range']}")
+                        if result.get('match_reason'):
+                            st.caption(f"Similarity: {result.get('score', 0):.0f} | {result['match_reason']}")
                     
                     with col2:
                         if st.button("View Details", key=f"similar_details_{similar_product['id']}"):
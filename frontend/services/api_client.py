@@ -2,9 +2,11 @@
 API client for communicating with FastAPI backend
 """
 
+import json
+
 import requests
 import streamlit as st
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 from config.settings import settings
 
 
@@ -113,6 +115,18 @@ class APIClient:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    def get_progressive_search_results(self, token: str, wait: float = 10.0) -> Dict[str, Any]:
+        """Long-poll the AI ranking of a progressive search"""
+        try:
+            response = self.session.get(
+                f"{self.base_url}/api/v1/search/ai/{token}",
+                params={"wait": wait},
+                timeout=self.timeout + wait
+            )
+            return self._handle_response(response)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
     def get_search_suggestions(self, query: str, limit: int = 8) -> Dict[str, Any]:
         """Get search suggestions"""
         try:
@@ -138,11 +152,76 @@ class APIClient:
             return {"success": False, "error": str(e)}
     
     # HTS Codes API
-    def get_hts_codes(self, product_id: str) -> Dict[str, Any]:
-        """Get HTS codes for product"""
+    def get_hts_codes(self, product_id: str, refresh: bool = False) -> Dict[str, Any]:
+        """Get HTS codes for product (refresh=True bypasses the server cache)"""
         try:
             response = self.session.get(
                 f"{self.base_url}/api/v1/hts-codes/{product_id}",
+                params={"refresh": refresh},
+                timeout=self.timeout
+            )
+            return self._handle_response(response)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def stream_hts_codes(self, product_id: str, refresh: bool = False) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (event, data) server-sent events as HTS suggestions are generated"""
+        try:
+            response = self.session.get(
+                f"{self.base_url}/api/v1/hts-codes/{product_id}/stream",
+                params={"refresh": refresh},
+                stream=True,
+                timeout=self.timeout
+            )
+        except Exception as e:
+            yield "error", {"error": str(e)}
+            return
+        
+        with response:
+            if response.status_code != 200:
+                yield "error", {"error": self._handle_response(response)["error"]}
+                return
+            
+            event = "message"
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        yield event, json.loads(line[len("data:"):])
+                        event = "message"
+            except Exception as e:
+                yield "error", {"error": f"Stream interrupted: {str(e)}"}
+    
+    def start_bulk_hts(self, product_ids: List[str]) -> Dict[str, Any]:
+        """Start a bulk HTS generation job"""
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/v1/hts-codes/bulk",
+                json=product_ids,
+                timeout=self.timeout
+            )
+            return self._handle_response(response)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def get_bulk_hts_status(self, task_id: str) -> Dict[str, Any]:
+        """Get progress of a bulk HTS job"""
+        try:
+            response = self.session.get(
+                f"{self.base_url}/api/v1/hts-codes/bulk-status/{task_id}",
+                timeout=self.timeout
+            )
+            return self._handle_response(response)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def get_bulk_hts_results(self, task_id: str, offset: int = 0, limit: int = 1000) -> Dict[str, Any]:
+        """Get per-product results of a bulk HTS job"""
+        try:
+            response = self.session.get(
+                f"{self.base_url}/api/v1/hts-codes/bulk-results/{task_id}",
+                params={"offset": offset, "limit": limit},
                 timeout=self.timeout
             )
             return self._handle_response(response)
@@ -83,13 +83,13 @@ def create_specifications_table(product: Dict[str, Any]) -> pd.DataFrame:
     return pd.DataFrame(data)
 
 
-def create_hts_display(suggestions: List[Dict[str, Any]], use_expanders: bool = True) -> None:
-    """Display HTS code suggestions with optional expander usage"""
+def create_hts_display(suggestions: List[Dict[str, Any]], use_expanders: bool = True, start: int = 1) -> None:
+    """Display HTS code suggestions with optional expander usage (numbered from `start`)"""
     if not suggestions:
         st.info("No HTS code suggestions available")
         return
     
-    for i, suggestion in enumerate(suggestions, 1):
+    for i, suggestion in enumerate(suggestions, start):
         confidence_level = "High" if suggestion['confidence'] > 0.8 else "Medium" if suggestion['confidence'] > 0.6 else "Low"
         
         if use_expanders: